@@ -0,0 +1,151 @@
+# backend/answer_cache.py
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+import numpy as np
+
+from backend.vector_index import normalize
+
+# Cache settings
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+
+
+# === Helper Function: Document Version ===
+def document_version(doc: dict) -> str:
+    """ Fingerprint of a document's content, used to detect edits. """
+    return hashlib.sha256(doc["content"].encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CachedAnswer:
+    question: np.ndarray          # Normalized question embedding.
+    documents: Dict[int, str]     # Contributing chunk id -> content fingerprint.
+    document_ids: Set[int]        # Parent documents of those chunks.
+    answer: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers keyed by question meaning.
+
+    A lookup hits when a cached question is within `threshold` cosine
+    similarity of the new one *and* retrieval picked the same chunks with
+    the same content. Entries expire after `ttl` seconds, the least recently
+    used entry is dropped beyond `max_entries`, and `invalidate_document`
+    removes every answer a changed document contributed to.
+    """
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: float = ANSWER_CACHE_TTL_SECONDS,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        # Stacked question matrix, rebuilt lazily after the entry set changes.
+        self._keys: List[int] = []
+        self._matrix: Optional[np.ndarray] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def _drop(self, entry_id: int) -> None:
+        del self._entries[entry_id]
+        self._matrix = None
+
+    def _expire(self, now: float) -> None:
+        expired = [key for key, entry in self._entries.items() if now - entry.created_at > self.ttl]
+        for key in expired:
+            self._drop(key)
+
+    def lookup(self, question_embedding, documents: List[dict]) -> Optional[str]:
+        """
+        Cached answer for a question given the documents retrieval selected.
+
+        Args:
+            question_embedding: embedding of the new question.
+            documents: chunks (or documents) that would be placed in the prompt.
+
+        Return: the stored answer, or None on a miss.
+        """
+
+        versions = {doc["id"]: document_version(doc) for doc in documents}
+        query = normalize(question_embedding)
+
+        with self._lock:
+            self._expire(time.time())
+            if not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[key].question for key in self._keys])
+
+            scores = self._matrix @ query
+            for i in np.argsort(-scores):
+                if scores[i] < self.threshold:
+                    break
+                entry = self._entries[self._keys[i]]
+                if entry.documents == versions:
+                    self._entries.move_to_end(self._keys[i])
+                    self.hits += 1
+                    return entry.answer
+
+            self.misses += 1
+            return None
+
+    def store(self, question_embedding, documents: List[dict], answer: str) -> None:
+        """ Remember an answer generated from `documents`. """
+        entry = CachedAnswer(
+            question=normalize(question_embedding),
+            documents={doc["id"]: document_version(doc) for doc in documents},
+            document_ids={doc.get("document_id", doc["id"]) for doc in documents},
+            answer=answer,
+            created_at=time.time()
+        )
+
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            self._matrix = None
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_document(self, doc_id: int) -> int:
+        """ Drop every answer that used `doc_id`. Returns the number removed. """
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if doc_id in entry.document_ids]
+            for key in stale:
+                self._drop(key)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+# Process-wide answer cache
+answer_cache = SemanticAnswerCache()
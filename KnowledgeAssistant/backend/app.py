@@ -1,22 +1,65 @@
 # backend/app.py
 
 
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from backend.db import init_db
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from backend.db import connection_pool, db_executor, document_shards, init_db, save_document_shards
+from backend.answer_cache import answer_cache
+from backend.auth_utils import hash_executor, token_cache
+from backend.embedding_cache import embedding_cache
+from backend.job_queue import ingest_queue
+from backend.metrics import MetricsMiddleware, registry
+from backend.openai_utils import close_client
 from backend.routers.auth import auth_router
 from backend.routers.knowledge import knowledge_router
 
+# Startup / shutdown hooks
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resume queued uploads left over from the previous run.
+    await ingest_queue.start()
+    yield
+    await ingest_queue.stop()
+    # Persist loaded index shards so they only catch up on new rows next time.
+    save_document_shards()
+    await close_client()
+    hash_executor.shutdown(wait=True)
+    db_executor.shutdown(wait=True)
+    connection_pool.close_all()
+
 # Create FastAPI app
 app = FastAPI(
     title="Knowledge Assistant API",
     description="An internal knowledge assistant powered by OpenAI",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Initialize Database
 if not init_db():
     raise Exception("Database initialization failed. Cannot start server.")
 
+# Allow the React frontend to call the API (comma-separated origins)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=os.getenv("CORS_ORIGINS", "http://localhost:3000").split(","),
+    allow_methods=["*"],
+    allow_headers=["*"]
+)
+
+# Request counts, latency and in-flight gauge (outermost, so it times everything)
+app.add_middleware(MetricsMiddleware)
+
+# Cache and index stats reported on every scrape
+registry.register_stats("embedding_cache", embedding_cache.stats)
+registry.register_stats("answer_cache", answer_cache.stats)
+registry.register_stats("token_cache", token_cache.stats)
+registry.register_stats("vector_index", document_shards.stats)
+registry.register_stats("ingest_queue", ingest_queue.stats)
+
 # Routers
 app.include_router(auth_router)
 app.include_router(knowledge_router)
@@ -29,4 +72,9 @@ async def root():
 # === Health Check Endpoint ===
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+# === Metrics Endpoint (Prometheus text format) ===
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -3,9 +3,16 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
 import os
+import time
+import asyncio
+import hashlib
+import functools
+import threading
 import bcrypt
 
 # Load secret key
@@ -16,6 +23,19 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
+# bcrypt worker pool: at most BCRYPT_THREADS hashes run at once, at most BCRYPT_MAX_PENDING wait
+BCRYPT_THREADS = int(os.getenv("BCRYPT_THREADS", str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "64"))
+hash_executor = ThreadPoolExecutor(max_workers=BCRYPT_THREADS, thread_name_prefix="bcrypt")
+
+# Login attempts allowed per username within the window
+LOGIN_RATE_LIMIT = int(os.getenv("LOGIN_RATE_LIMIT", "10"))
+LOGIN_RATE_WINDOW_SECONDS = float(os.getenv("LOGIN_RATE_WINDOW_SECONDS", "60"))
+
+# Validated token claims are reused for this long (0 disables the cache)
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "60"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
 # Returns current time (timezone appropriate)
 def now(utc: bool = True) -> datetime:
     return datetime.now(timezone.utc) if utc else datetime.now()
@@ -29,6 +49,71 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
 
+# Run bcrypt work on the bounded hashing pool (rejects with 503 when the queue is full)
+_pending_hashes = 0
+
+async def run_hash(func: Callable[..., Any], *args) -> Any:
+    global _pending_hashes
+    if _pending_hashes >= BCRYPT_THREADS + BCRYPT_MAX_PENDING:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests in progress. Try again shortly.",
+            headers={"Retry-After": "1"}
+        )
+
+    _pending_hashes += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(hash_executor, functools.partial(func, *args))
+    finally:
+        _pending_hashes -= 1
+
+
+class LoginRateLimiter:
+    """
+    Sliding-window limit on login attempts per username.
+
+    Caps how much bcrypt work (and password guessing) a single account can
+    attract, independently of the global hashing pool.
+    """
+
+    def __init__(self, max_attempts: int = LOGIN_RATE_LIMIT, window: float = LOGIN_RATE_WINDOW_SECONDS):
+        self.max_attempts = max_attempts
+        self.window = window
+        self._attempts: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, username: str) -> float:
+        """ Record an attempt. Returns 0 if allowed, else seconds until the next one is. """
+        now = time.monotonic()
+        key = username.lower()
+        with self._lock:
+            attempts = self._attempts.setdefault(key, deque())
+            while attempts and now - attempts[0] >= self.window:
+                attempts.popleft()
+            if len(attempts) >= self.max_attempts:
+                return self.window - (now - attempts[0])
+            attempts.append(now)
+
+            # Forget usernames whose window has fully passed.
+            if len(self._attempts) > 10000:
+                for name in [name for name, times in self._attempts.items() if not times or now - times[-1] >= self.window]:
+                    del self._attempts[name]
+            return 0.0
+
+    def check(self, username: str) -> None:
+        """ Record an attempt, raising 429 once the username is over its limit. """
+        retry_after = self.hit(username)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts. Try again later.",
+                headers={"Retry-After": str(int(retry_after) + 1)}
+            )
+
+
+login_rate_limiter = LoginRateLimiter()
+
 # JWT token creation
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -42,21 +127,93 @@ def decode_access_token(token: str) -> Optional[dict]:
         return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
-    
-# Get current user from token
-def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
-    payload = decode_access_token(token)
+
+
+class TokenCache:
+    """
+    Short-lived cache of validated token claims, keyed by a hash of the token.
+
+    Entries never outlive the token's own `exp`, so caching cannot extend a
+    token's lifetime; only successfully decoded tokens are stored.
+    """
+
+    def __init__(self, ttl: float = TOKEN_CACHE_TTL_SECONDS, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, claims: dict) -> None:
+        if self.ttl <= 0:
+            return
+        expires_at = min(time.time() + self.ttl, float(claims.get("exp", float("inf"))))
+        with self._lock:
+            self._entries[self._key(token)] = (claims, expires_at)
+            self._entries.move_to_end(self._key(token))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+        }
+
+
+token_cache = TokenCache()
+
+# Verify jwt token, reusing recently validated claims
+def get_token_claims(token: str) -> Optional[dict]:
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = decode_access_token(token)
+        if claims is not None:
+            token_cache.put(token, claims)
+    return claims
+
+# Claims of the current request's token
+async def get_current_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    payload = get_token_claims(token)
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials.",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    username: str = payload.get("sub")
-    if username is None:
+    if payload.get("sub") is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials.",
             headers={"WWW-Authenticate": "Bearer"}
         )
-    return username
\ No newline at end of file
+    return payload
+
+# Get current user from token
+async def get_current_user(claims: dict = Depends(get_current_claims)) -> str:
+    return claims["sub"]
\ No newline at end of file
@@ -0,0 +1,123 @@
+# backend/chunking.py
+
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Tuple
+
+# Chunking settings (tokens)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "400"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "60"))
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """ The cl100k_base tokenizer used by ada-002, or None when tiktoken is unavailable. """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def count_tokens(text: str) -> int:
+    """ Number of embedding-model tokens in `text` (~3 characters per token without tiktoken). """
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 3 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+def _split_tokens(text: str, max_tokens: int) -> List[str]:
+    """ Hard-split text into pieces of at most max_tokens tokens. """
+    encoding = _encoding()
+    if encoding is None:
+        step = max_tokens * 3
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    ids = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """ The first max_tokens tokens of text. """
+    return _split_tokens(text, max_tokens)[0] if text else text
+
+
+@dataclass
+class Chunk:
+    index: int
+    content: str
+    token_count: int
+
+
+def _units(text: str, max_tokens: int) -> List[Tuple[str, int, str]]:
+    """
+    Break text into (piece, tokens, separator) units no larger than max_tokens.
+
+    Paragraphs are kept whole when they fit; otherwise they fall back to
+    sentences, and over-long sentences to fixed token windows.
+    """
+
+    units = []
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            units.append((paragraph, tokens, "\n\n"))
+            continue
+
+        pieces = []
+        for sentence in SENTENCE_END.split(paragraph):
+            if count_tokens(sentence) <= max_tokens:
+                pieces.append(sentence)
+            else:
+                pieces.extend(_split_tokens(sentence, max_tokens))
+        units.extend((piece, count_tokens(piece), " ") for piece in pieces[:-1])
+        units.append((pieces[-1], count_tokens(pieces[-1]), "\n\n"))
+    return units
+
+def chunk_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[Chunk]:
+    """
+    Split a document into overlapping, token-bounded chunks.
+
+    Paragraphs are packed greedily up to `max_tokens`; each new chunk starts
+    with the trailing units of the previous one (up to `overlap_tokens`) so
+    context that straddles a boundary is retrievable from either side.
+
+    Args:
+        text: the document content.
+        max_tokens: upper bound on tokens per chunk.
+        overlap_tokens: tokens carried over between consecutive chunks.
+
+    Return: list of chunks in document order.
+    """
+
+    units = _units(text, max_tokens)
+    chunks: List[Chunk] = []
+    window: List[Tuple[str, int, str]] = []
+    window_tokens = 0
+
+    def emit():
+        content = "".join(piece + sep for piece, _, sep in window).strip()
+        chunks.append(Chunk(index=len(chunks), content=content, token_count=count_tokens(content)))
+
+    for unit in units:
+        if window and window_tokens + unit[1] > max_tokens:
+            emit()
+            # Carry the tail of the previous chunk forward as overlap.
+            overlap, overlap_tokens_used = [], 0
+            for prev in reversed(window):
+                if overlap_tokens_used + prev[1] > overlap_tokens or overlap_tokens_used + prev[1] + unit[1] > max_tokens:
+                    break
+                overlap.insert(0, prev)
+                overlap_tokens_used += prev[1]
+            window, window_tokens = overlap, overlap_tokens_used
+        window.append(unit)
+        window_tokens += unit[1]
+
+    if window:
+        emit()
+    return chunks
@@ -3,17 +3,120 @@
 import sqlite3
 import json
 import os
-from typing import Dict, List, Optional
+import hashlib
+import time
+import random
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from backend.chunking import Chunk, count_tokens
+from backend.metrics import observe_db
+from backend.vector_index import Shard, ShardedIndex, blob_to_embedding, create_index, embedding_to_blob
 
 # Database file location
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(BASE_DIR, "knowledge.db")
+INDEX_DIR = BASE_DIR
 
-# Get connection to SQLite database
-def get_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row # Access rows like dicts.
-    return conn
+# Persist an index shard after this many incremental inserts.
+INDEX_SAVE_EVERY = int(os.getenv("VECTOR_INDEX_SAVE_EVERY", "1000"))
+
+# Uploads whose every chunk matches one existing document at least this closely are near-duplicates.
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.97"))
+
+# Dedicated worker threads for blocking database work (keeps it off the event loop)
+DB_THREADS = int(os.getenv("DB_THREADS", "8"))
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+
+# Run a blocking database function on the database thread pool (timed, including queueing)
+async def run_db(func: Callable[..., Any], *args, **kwargs) -> Any:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+    finally:
+        observe_db(getattr(func, "__qualname__", "unknown"), time.perf_counter() - start)
+
+# SQLite tuning
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")        # Safe with WAL; FULL fsyncs every commit.
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # Page cache per connection.
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_RETRIES = int(os.getenv("SQLITE_BUSY_RETRIES", "5"))
+
+
+class ConnectionPool:
+    """
+    One long-lived SQLite connection per (thread, database file).
+
+    Connections are opened lazily in WAL mode with tuned pragmas, so readers
+    never block the writer and each thread keeps its prepared-statement cache
+    warm across calls instead of reconnecting per query.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, cached_statements=256)
+        conn.row_factory = sqlite3.Row # Access rows like dicts.
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA foreign_keys = ON")
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    def connection(self, path: str) -> sqlite3.Connection:
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(path)
+        if conn is None:
+            conn = connections[path] = self._open(path)
+        return conn
+
+    def close_all(self) -> None:
+        with self._lock:
+            for conn in self._all:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._all.clear()
+        self._local = threading.local()
+
+
+connection_pool = ConnectionPool()
+
+# Get this thread's pooled connection to the SQLite database
+def get_connection(path: Optional[str] = None) -> sqlite3.Connection:
+    return connection_pool.connection(path or DATABASE_PATH)
+
+# Retries a database function when SQLite reports the database as busy/locked
+def retry_on_busy(func: Callable) -> Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        delay = 0.01
+        for attempt in range(SQLITE_BUSY_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                message = str(e).lower()
+                if attempt == SQLITE_BUSY_RETRIES or ("locked" not in message and "busy" not in message):
+                    raise
+                time.sleep(delay + random.uniform(0, delay))
+                delay = min(delay * 2, 1.0)
+    return wrapper
 
 # Verifies 'users' table
 def isvalid_users_table(cursor: sqlite3.Cursor) -> bool:
@@ -40,60 +143,627 @@ def isvalid_documents_table(cursor: sqlite3.Cursor)  -> bool:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER DEFAULT NULL,
                 content TEXT NOT NULL,
-                embedding TEXT NOT NULL,
+                embedding BLOB NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                content_hash TEXT DEFAULT NULL,
                 FOREIGN KEY (user_id) REFERENCES users(id)    
             )
         """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id)")
         return True
 
     except Exception as e:
         print(f"'documents' table creation failed: {e}")
         return False
 
+# Verifies 'chunks' table (retrieval units linked to their parent document)
+def isvalid_chunks_table(cursor: sqlite3.Cursor) -> bool:
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                document_id INTEGER NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                token_count INTEGER NOT NULL,
+                embedding BLOB NOT NULL,
+                FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks(document_id)")
+        return True
+
+    except Exception as e:
+        print(f"'chunks' table creation failed: {e}")
+        return False
+
+# Verifies 'document_shares' table (documents readable by users other than the owner)
+def isvalid_document_shares_table(cursor: sqlite3.Cursor) -> bool:
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS document_shares (
+                document_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                PRIMARY KEY (user_id, document_id),
+                FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE CASCADE,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_shares_document_id ON document_shares(document_id)")
+        return True
+
+    except Exception as e:
+        print(f"'document_shares' table creation failed: {e}")
+        return False
+
+# Verifies 'ingest_jobs' / 'ingest_items' tables (durable upload queue, see backend.job_queue)
+def isvalid_ingest_queue_tables(cursor: sqlite3.Cursor) -> bool:
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_jobs (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                idempotency_key TEXT DEFAULT NULL,
+                request_hash TEXT NOT NULL,
+                shared_with TEXT NOT NULL DEFAULT '[]',
+                total INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_ingest_jobs_idempotency
+            ON ingest_jobs(user_id, idempotency_key) WHERE idempotency_key IS NOT NULL
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                item_index INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                error TEXT DEFAULT NULL,
+                document_id INTEGER DEFAULT NULL,
+                FOREIGN KEY (job_id) REFERENCES ingest_jobs(id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_items_job_id ON ingest_items(job_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ingest_items_pending ON ingest_items(status, next_attempt_at)")
+        return True
+
+    except Exception as e:
+        print(f"Ingest queue table creation failed: {e}")
+        return False
+
+# Verifies 'chunks_fts' full-text index (kept in sync with 'chunks' by triggers)
+def isvalid_chunks_fts_table(cursor: sqlite3.Cursor) -> bool:
+    try:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'")
+        existed = cursor.fetchone() is not None
+
+        # '-' and '_' are token characters so identifiers like ERR-1042 or SKU_77 stay whole.
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                content,
+                content='chunks',
+                content_rowid='id',
+                tokenize="unicode61 remove_diacritics 2 tokenchars '-_'"
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN
+                INSERT INTO chunks_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS chunks_fts_update AFTER UPDATE OF content ON chunks BEGIN
+                INSERT INTO chunks_fts (chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                INSERT INTO chunks_fts (rowid, content) VALUES (new.id, new.content);
+            END
+        """)
+
+        # Index chunks that were stored before the full-text table existed.
+        if not existed:
+            cursor.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+        return True
+
+    except Exception as e:
+        print(f"'chunks_fts' table creation failed: {e}")
+        return False
+
+# Gives documents stored before chunking a single whole-document chunk (reuses their embedding)
+def migrate_documents_to_chunks(cursor: sqlite3.Cursor) -> bool:
+    try:
+        cursor.execute("""
+            SELECT id, content, embedding FROM documents
+            WHERE id NOT IN (SELECT DISTINCT document_id FROM chunks)
+        """)
+        rows = cursor.fetchall()
+
+        cursor.executemany("""
+            INSERT INTO chunks (document_id, chunk_index, content, token_count, embedding)
+            VALUES (?, 0, ?, ?, ?)
+        """, [(row["id"], row["content"], count_tokens(row["content"]), row["embedding"]) for row in rows])
+
+        if rows:
+            print(f"Created chunks for {len(rows)} existing documents.")
+        return True
+
+    except Exception as e:
+        print(f"'chunks' migration failed: {e}")
+        return False
+
+# Converts legacy JSON TEXT embeddings into float32 BLOBs
+def migrate_embeddings_to_blob(cursor: sqlite3.Cursor) -> bool:
+    try:
+        cursor.execute("SELECT id, embedding FROM documents WHERE typeof(embedding) = 'text'")
+        rows = cursor.fetchall()
+
+        cursor.executemany(
+            "UPDATE documents SET embedding = ? WHERE id = ?",
+            [(embedding_to_blob(json.loads(row["embedding"])), row["id"]) for row in rows]
+        )
+
+        if rows:
+            print(f"Migrated {len(rows)} document embeddings to float32 BLOBs.")
+        return True
+
+    except Exception as e:
+        print(f"'documents' embedding migration failed: {e}")
+        return False
+
+# Adds 'documents.content_hash' and its per-owner unique index.
+# Duplicates stored before the index existed are kept, but only the oldest copy gets a hash.
+def migrate_content_hashes(cursor: sqlite3.Cursor) -> bool:
+    try:
+        cursor.execute("PRAGMA table_info(documents)")
+        if "content_hash" not in {row["name"] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT DEFAULT NULL")
+
+        cursor.execute("SELECT id, user_id, content FROM documents WHERE content_hash IS NULL ORDER BY id")
+        rows = cursor.fetchall()
+        cursor.execute("SELECT IFNULL(user_id, 0), content_hash FROM documents WHERE content_hash IS NOT NULL")
+        seen = {(row[0], row[1]) for row in cursor.fetchall()}
+
+        updates = []
+        for row in rows:
+            key = (row["user_id"] or 0, content_hash(row["content"]))
+            if key not in seen:
+                seen.add(key)
+                updates.append((key[1], row["id"]))
+        cursor.executemany("UPDATE documents SET content_hash = ? WHERE id = ?", updates)
+
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_content_hash
+            ON documents(IFNULL(user_id, 0), content_hash) WHERE content_hash IS NOT NULL
+        """)
+
+        if updates:
+            print(f"Hashed {len(updates)} existing documents.")
+        return True
+
+    except Exception as e:
+        print(f"'documents' content hash migration failed: {e}")
+        return False
+
 # Initializes the database
 def init_db() -> bool:
 
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        conn.row_factory = sqlite3.Row
+    with get_connection() as conn:
         cursor = conn.cursor()
 
         users_ok = isvalid_users_table(cursor)
         documents_ok = isvalid_documents_table(cursor)
+        chunks_ok = isvalid_chunks_table(cursor) and isvalid_chunks_fts_table(cursor)
+        shares_ok = isvalid_document_shares_table(cursor)
+        queue_ok = isvalid_ingest_queue_tables(cursor)
+        migration_ok = (
+            documents_ok and chunks_ok
+            and migrate_embeddings_to_blob(cursor)
+            and migrate_documents_to_chunks(cursor)
+            and migrate_content_hashes(cursor)
+        )
 
         conn.commit()
 
-    if not users_ok or not documents_ok:
+    if not users_ok or not documents_ok or not chunks_ok or not shares_ok or not queue_ok or not migration_ok:
         print("Database initialization failed. Check table creation logs.")
         return False
     return True
 
+# === Vector Index Partitions ===
+# Chunks are indexed per owner ("owner", user_id), with ("owner", None) holding
+# unowned (legacy) documents visible to everyone, plus one ("shared", user_id)
+# shard per user for documents other users shared with them.
+def owner_partition(user_id: Optional[int]) -> Tuple[str, Optional[int]]:
+    return ("owner", user_id)
 
-# Saves document to database
-def save_document(content: str, embedding: List[float], user_id: Optional[int] = None) -> bool:
-    try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+def shared_partition(user_id: int) -> Tuple[str, int]:
+    return ("shared", user_id)
 
-            cursor.execute("""
-                INSERT INTO documents (user_id, content, embedding)
-                VALUES (?, ?, ?)
-            """, (user_id, content, json.dumps(embedding)))
+def visible_partitions(user_id: Optional[int]) -> List[Tuple[str, Optional[int]]]:
+    if user_id is None:
+        return [owner_partition(None)]
+    return [owner_partition(user_id), owner_partition(None), shared_partition(user_id)]
+
+# Snapshot file of an owner shard
+def shard_index_path(key: Tuple[str, Optional[int]]) -> str:
+    _, user_id = key
+    name = "public" if user_id is None else f"user{user_id}"
+    return os.path.join(INDEX_DIR, f"knowledge.chunks.{name}.index.npz")
+
+# Builds one shard: owner shards start from their snapshot, drop chunks deleted since it was
+# written and catch up on newer chunks; shared shards are rebuilt from 'document_shares'
+def load_document_shard(key: Tuple[str, Optional[int]], batch_size: int = 10000) -> Shard:
+    kind, user_id = key
+    index = create_index()
+    if kind != "owner" or not index.load(shard_index_path(key)):
+        index.clear()
+    snapshot_through = index.max_id()
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        # Read everything from one snapshot so `loaded_through` matches the rows seen.
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM chunks")
+            loaded_through = cursor.fetchone()[0]
+
+            removed = 0
+            if kind == "owner" and snapshot_through:
+                # Deletes only reach loaded shards and are saved in batches, so snapshots can hold deleted chunks.
+                cursor.execute("""
+                    SELECT c.id FROM documents d
+                    JOIN chunks c ON c.document_id = d.id
+                    WHERE d.user_id IS ? AND c.id <= ?
+                """, (user_id, snapshot_through))
+                live = np.fromiter((row[0] for row in cursor), dtype=np.int64)
+                snapshot_ids = index.ids()
+                removed = index.remove(snapshot_ids[~np.isin(snapshot_ids, live)])
 
+            if kind == "owner":
+                cursor.execute("""
+                    SELECT c.id, c.embedding FROM documents d
+                    JOIN chunks c ON c.document_id = d.id
+                    WHERE d.user_id IS ? AND c.id > ?
+                    ORDER BY c.id
+                """, (user_id, snapshot_through))
+            else:
+                cursor.execute("""
+                    SELECT c.id, c.embedding FROM document_shares s
+                    JOIN chunks c ON c.document_id = s.document_id
+                    WHERE s.user_id = ?
+                    ORDER BY c.id
+                """, (user_id,))
+
+            added = 0
+            while rows := cursor.fetchmany(batch_size):
+                index.add_many(
+                    [row[0] for row in rows],
+                    [blob_to_embedding(row[1]) for row in rows]
+                )
+                added += len(rows)
+        finally:
             conn.commit()
+
+    index.loaded = True
+    return Shard(index=index, loaded_through=loaded_through, last_used=time.monotonic(),
+                 unsaved=added + removed if kind == "owner" else 0)
+
+# Writes an owner shard next to the database (shared shards are cheap to rebuild)
+def save_document_shard(key: Tuple[str, Optional[int]], shard: Shard) -> None:
+    if key[0] == "owner":
+        shard.index.save(shard_index_path(key))
+
+# Process-wide per-partition chunk index
+document_shards = ShardedIndex(load_document_shard, save_document_shard, save_every=INDEX_SAVE_EVERY)
+
+# Persists every loaded shard (called on shutdown)
+def save_document_shards() -> bool:
+    try:
+        document_shards.save_all()
         return True
+
+    except Exception as e:
+        print(f"Failed to save document index: {e}")
+        return False
+
+
+# === Deduplication ===
+class DuplicateDocument(Exception):
+    """ The owner already has a document with this exact content. """
+
+    def __init__(self, document_id: int):
+        super().__init__(f"Identical content is already stored as document {document_id}.")
+        self.document_id = document_id
+
+class DocumentChanged(Exception):
+    """ The document was updated by another request after it was read. """
+
+    def __init__(self, document_id: int):
+        super().__init__(f"Document {document_id} was changed by another request; retry.")
+        self.document_id = document_id
+
+# Fingerprint of a document's content (surrounding whitespace ignored)
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.strip().encode("utf-8")).hexdigest()
+
+# Existing documents of an owner with the given hashes, as {hash: document_id}
+def _documents_by_hash(cursor: sqlite3.Cursor, user_id: Optional[int], hashes: Iterable[str]) -> Dict[str, int]:
+    hashes = list(set(hashes))
+    found = {}
+    for start in range(0, len(hashes), 500):
+        batch = hashes[start:start + 500]
+        placeholders = ",".join("?" * len(batch))
+        cursor.execute(f"""
+            SELECT id, content_hash FROM documents
+            WHERE IFNULL(user_id, 0) = IFNULL(?, 0) AND content_hash IN ({placeholders})
+        """, [user_id] + batch)
+        found.update({row["content_hash"]: row["id"] for row in cursor.fetchall()})
+    return found
+
+# Indices of `contents` the owner has already stored, as {index: document_id} (checked before embedding)
+def find_duplicate_documents(user_id: Optional[int], contents: Sequence[str]) -> Dict[int, int]:
+    hashes = [content_hash(content) for content in contents]
+    with get_connection() as conn:
+        existing = _documents_by_hash(conn.cursor(), user_id, hashes)
+    return {i: existing[h] for i, h in enumerate(hashes) if h in existing}
+
+# The owner's document that an upload's chunks almost exactly repeat, as (document_id, weakest match) or None
+def find_near_duplicate(user_id: Optional[int], chunk_embeddings: Sequence[List[float]],
+                        threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Optional[Tuple[int, float]]:
+    partition = [owner_partition(user_id)]
+    matches = []
+    for embedding in chunk_embeddings:
+        hits = document_shards.search(partition, embedding, k=1)
+        if not hits or hits[0][1] < threshold:
+            return None
+        matches.append(hits[0])
+
+    chunks = get_chunks([chunk_id for chunk_id, _ in matches])
+    document_ids = {chunk["document_id"] for chunk in chunks}
+    if len(chunks) != len(matches) or len(document_ids) != 1:
+        return None
+    return document_ids.pop(), min(score for _, score in matches)
+
+
+# Saves document to database (returns the new document id)
+def save_document(content: str, embedding: List[float], user_id: Optional[int] = None,
+                  chunks: Optional[List[Tuple[Chunk, List[float]]]] = None,
+                  shared_with: Sequence[int] = ()) -> Optional[int]:
+    try:
+        return save_documents([(content, embedding, user_id, chunks)], shared_with)[0]
     
     except Exception as e:
         print(f"Error saving document: {e}")
-        return False
+        return None
+
+# Saves many documents and their chunks in a single transaction and returns their ids
+@retry_on_busy
+def save_documents(documents: List[Tuple[str, List[float], Optional[int], Optional[List[Tuple[Chunk, List[float]]]]]],
+                   shared_with: Sequence[int] = ()) -> List[int]:
+    """
+    Each item is (content, document embedding, user_id, [(chunk, chunk embedding), ...]).
+    Without chunks the whole document is stored as a single chunk. Every
+    document is shared read-only with the users in `shared_with`.
+
+    Content an owner has already stored (or that repeats earlier in the
+    batch) is not stored again; its existing document id is returned.
+    """
+    if not documents:
+        return []
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        # Hold the write lock for the whole batch so the new ids are contiguous.
+        cursor.execute("BEGIN IMMEDIATE")
+
+        hashes = [content_hash(content) for content, _, _, _ in documents]
+        existing: Dict[Tuple[Optional[int], str], int] = {}
+        for owner_id in {user_id for _, _, user_id, _ in documents}:
+            owned = [h for h, (_, _, user_id, _) in zip(hashes, documents) if user_id == owner_id]
+            existing.update({(owner_id, h): doc_id for h, doc_id in _documents_by_hash(cursor, owner_id, owned).items()})
+
+        new_positions, seen = [], set()
+        for i, (h, (_, _, user_id, _)) in enumerate(zip(hashes, documents)):
+            if (user_id, h) not in existing and (user_id, h) not in seen:
+                seen.add((user_id, h))
+                new_positions.append(i)
+
+        cursor.executemany("""
+            INSERT INTO documents (user_id, content, embedding, content_hash)
+            VALUES (?, ?, ?, ?)
+        """, [(documents[i][2], documents[i][0], embedding_to_blob(documents[i][1]), hashes[i]) for i in new_positions])
+        new_ids = []
+        if new_positions:
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'documents'")
+            last_id = cursor.fetchone()[0]
+            new_ids = list(range(last_id - len(new_positions) + 1, last_id + 1))
+        for i, doc_id in zip(new_positions, new_ids):
+            existing[(documents[i][2], hashes[i])] = doc_id
+        doc_ids = [existing[(user_id, h)] for h, (_, _, user_id, _) in zip(hashes, documents)]
+
+        chunk_rows, chunk_embeddings, chunk_owners = [], [], []
+        for doc_id, i in zip(new_ids, new_positions):
+            content, embedding, user_id, chunks = documents[i]
+            for chunk, chunk_embedding in chunks or [(Chunk(0, content, count_tokens(content)), embedding)]:
+                chunk_rows.append((doc_id, chunk.index, chunk.content, chunk.token_count, embedding_to_blob(chunk_embedding)))
+                chunk_embeddings.append(chunk_embedding)
+                chunk_owners.append(user_id)
+
+        cursor.executemany("""
+            INSERT INTO chunks (document_id, chunk_index, content, token_count, embedding)
+            VALUES (?, ?, ?, ?, ?)
+        """, chunk_rows)
+        last_chunk_id = 0
+        if chunk_rows:
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'chunks'")
+            last_chunk_id = cursor.fetchone()[0]
+
+        share_rows = [
+            (doc_id, recipient) for doc_id, (_, _, owner_id, _) in dict(zip(doc_ids, documents)).items()
+            for recipient in set(shared_with) if recipient != owner_id
+        ]
+        cursor.executemany("INSERT OR IGNORE INTO document_shares (document_id, user_id) VALUES (?, ?)", share_rows)
+
+        conn.commit()
+
+    # Keep loaded owner shards in step with the table; unloaded ones catch up when they load.
+    chunk_ids = list(range(last_chunk_id - len(chunk_rows) + 1, last_chunk_id + 1))
+    by_owner: Dict[Optional[int], Tuple[List[int], List[List[float]]]] = {}
+    for chunk_id, chunk_embedding, owner_id in zip(chunk_ids, chunk_embeddings, chunk_owners):
+        ids, embeddings = by_owner.setdefault(owner_id, ([], []))
+        ids.append(chunk_id)
+        embeddings.append(chunk_embedding)
+    for owner_id, (ids, embeddings) in by_owner.items():
+        document_shards.add_many(owner_partition(owner_id), ids, embeddings)
+
+    # Recipients' shared shards are rebuilt on their next query.
+    for recipient in {user_id for _, user_id in share_rows}:
+        document_shards.evict(shared_partition(recipient))
+    return doc_ids
+
+# Shares existing documents with more users
+@retry_on_busy
+def share_documents(doc_ids: Sequence[int], shared_with: Sequence[int]) -> None:
+    if not doc_ids or not shared_with:
+        return
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT OR IGNORE INTO document_shares (document_id, user_id)
+            SELECT id, ? FROM documents WHERE id = ? AND IFNULL(user_id, 0) != ?
+        """, [(recipient, doc_id, recipient) for doc_id in doc_ids for recipient in set(shared_with)])
+        conn.commit()
+
+    for recipient in set(shared_with):
+        document_shards.evict(shared_partition(recipient))
+
+# Get a document's chunks (with embeddings) in reading order
+def get_document_chunks(doc_id: int) -> List[Dict]:
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, chunk_index, content, token_count, embedding FROM chunks
+            WHERE document_id = ? ORDER BY chunk_index
+        """, (doc_id,))
+        return [dict(row, embedding=blob_to_embedding(row["embedding"])) for row in cursor.fetchall()]
+
+# Recipients a document is shared with
+def _document_recipients(cursor: sqlite3.Cursor, doc_id: int) -> List[int]:
+    cursor.execute("SELECT user_id FROM document_shares WHERE document_id = ?", (doc_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+# Replaces a document's content, keeping unchanged chunks and their embeddings
+@retry_on_busy
+def update_document(doc_id: int, content: str, embedding: List[float], kept: List[Tuple[int, Chunk]],
+                    added: List[Tuple[Chunk, List[float]]], expected_hash: str) -> Optional[Tuple[List[int], List[int]]]:
+    """
+    Args:
+        doc_id: document to update.
+        content: the new content.
+        embedding: the new document embedding.
+        kept: (existing chunk id, chunk at its new position) for chunks whose text is unchanged.
+        added: (chunk, chunk embedding) for new or edited chunks.
+        expected_hash: content hash of the version `kept` was computed from.
+
+    Return: (removed chunk ids, added chunk ids), or None if the document is
+        gone. Raises DuplicateDocument when the owner already stores the new
+        content as another document, and DocumentChanged when the document
+        no longer matches `expected_hash` or `kept`.
+    """
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("SELECT user_id, content FROM documents WHERE id = ?", (doc_id,))
+            row = cursor.fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            owner_id = row["user_id"]
+
+            # `kept` was computed outside this transaction; a concurrent update may have replaced those chunks.
+            cursor.execute("SELECT id FROM chunks WHERE document_id = ?", (doc_id,))
+            chunk_ids = {chunk[0] for chunk in cursor.fetchall()}
+            if content_hash(row["content"]) != expected_hash or any(chunk_id not in chunk_ids for chunk_id, _ in kept):
+                conn.rollback()
+                raise DocumentChanged(doc_id)
+
+            cursor.execute(
+                "UPDATE documents SET content = ?, embedding = ?, content_hash = ? WHERE id = ?",
+                (content, embedding_to_blob(embedding), content_hash(content), doc_id)
+            )
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            hashed = content_hash(content)
+            raise DuplicateDocument(_documents_by_hash(conn.cursor(), owner_id, [hashed]).get(hashed, -1))
+
+        kept_ids = {chunk_id for chunk_id, _ in kept}
+        removed_ids = [chunk_id for chunk_id in chunk_ids if chunk_id not in kept_ids]
+        cursor.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in removed_ids])
+        cursor.executemany(
+            "UPDATE chunks SET chunk_index = ? WHERE id = ?",
+            [(chunk.index, chunk_id) for chunk_id, chunk in kept]
+        )
+
+        added_ids = []
+        for chunk, chunk_embedding in added:
+            cursor.execute("""
+                INSERT INTO chunks (document_id, chunk_index, content, token_count, embedding)
+                VALUES (?, ?, ?, ?, ?)
+            """, (doc_id, chunk.index, chunk.content, chunk.token_count, embedding_to_blob(chunk_embedding)))
+            added_ids.append(cursor.lastrowid)
+
+        recipients = _document_recipients(cursor, doc_id)
+        conn.commit()
+
+    partition = owner_partition(owner_id)
+    document_shards.remove(partition, removed_ids)
+    document_shards.add_many(partition, added_ids, [chunk_embedding for _, chunk_embedding in added])
+    for recipient in recipients:
+        document_shards.evict(shared_partition(recipient))
+    return removed_ids, added_ids
+
+# Deletes a document with its chunks and shares (returns False if it did not exist)
+@retry_on_busy
+def delete_document(doc_id: int) -> bool:
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT user_id FROM documents WHERE id = ?", (doc_id,))
+        row = cursor.fetchone()
+        if row is None:
+            conn.commit()
+            return False
+
+        cursor.execute("SELECT id FROM chunks WHERE document_id = ?", (doc_id,))
+        chunk_ids = [chunk[0] for chunk in cursor.fetchall()]
+        recipients = _document_recipients(cursor, doc_id)
+        # Chunks (and through their trigger, full-text rows) and shares go with the document.
+        cursor.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+        conn.commit()
+
+    document_shards.remove(owner_partition(row["user_id"]), chunk_ids)
+    for recipient in recipients:
+        document_shards.evict(shared_partition(recipient))
+    return True
 
 # Get all documents from database
 def get_all_documents() -> List[Dict]:
     documents = []
     try:
-        with sqlite3.connect(DATABASE_PATH) as conn:
-            conn.row_factory = sqlite3.Row
+        with get_connection() as conn:
             cursor = conn.cursor()
 
             cursor.execute("SELECT * FROM documents")
@@ -103,7 +773,7 @@ def get_all_documents() -> List[Dict]:
                 documents.append({
                     "id": row["id"],
                     "content": row["content"],
-                    "embedding": json.loads(row["embedding"]),
+                    "embedding": blob_to_embedding(row["embedding"]),
                     "user_id": row["user_id"],
                     "created_at": row["created_at"]
                 })
@@ -111,4 +781,89 @@ def get_all_documents() -> List[Dict]:
     except Exception as e:
         print(f"Failed to get all documents: {e}")
 
-    return documents
\ No newline at end of file
+    return documents
+
+# Get a single document by id
+def get_document(doc_id: int) -> Optional[Dict]:
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT id, user_id, content, created_at FROM documents WHERE id = ?", (doc_id,))
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+        return dict(row)
+
+    except Exception as e:
+        print(f"Failed to get document {doc_id}: {e}")
+        return None
+
+# Get chunks by id, in the order requested
+def get_chunks(chunk_ids: List[int]) -> List[Dict]:
+    if not chunk_ids:
+        return []
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+
+            placeholders = ",".join("?" * len(chunk_ids))
+            cursor.execute(f"""
+                SELECT id, document_id, chunk_index, content, token_count FROM chunks
+                WHERE id IN ({placeholders})
+            """, list(chunk_ids))
+            rows = {row["id"]: dict(row) for row in cursor.fetchall()}
+
+        return [rows[chunk_id] for chunk_id in chunk_ids if chunk_id in rows]
+
+    except Exception as e:
+        print(f"Failed to get chunks: {e}")
+        return []
+
+# Full-text (BM25) search over the chunks a user can read; returns (chunk_id, score) with higher scores better
+def lexical_search(match_query: str, k: int, user_id: Optional[int] = None) -> List[Tuple[int, float]]:
+    if not match_query:
+        return []
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT chunks_fts.rowid, bm25(chunks_fts) AS rank FROM chunks_fts
+                JOIN chunks c ON c.id = chunks_fts.rowid
+                JOIN documents d ON d.id = c.document_id
+                WHERE chunks_fts MATCH ?
+                  AND (d.user_id IS NULL OR d.user_id = ? OR d.id IN (
+                      SELECT document_id FROM document_shares WHERE user_id = ?))
+                ORDER BY rank
+                LIMIT ?
+            """, (match_query, user_id, user_id, k))
+            return [(row[0], -row[1]) for row in cursor.fetchall()]
+
+    except Exception as e:
+        print(f"Full-text search failed: {e}")
+        return []
+
+# Get a user's id by username
+def get_user_id(username: str) -> Optional[int]:
+    try:
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+            row = cursor.fetchone()
+        return row["id"] if row else None
+
+    except Exception as e:
+        print(f"Failed to look up user {username}: {e}")
+        return None
+
+# Get user ids for many usernames (unknown usernames are left out)
+def get_user_ids(usernames: Iterable[str]) -> Dict[str, int]:
+    usernames = list(dict.fromkeys(usernames))
+    if not usernames:
+        return {}
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        placeholders = ",".join("?" * len(usernames))
+        cursor.execute(f"SELECT username, id FROM users WHERE username IN ({placeholders})", usernames)
+        return {row["username"]: row["id"] for row in cursor.fetchall()}
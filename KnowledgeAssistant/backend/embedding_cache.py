@@ -0,0 +1,244 @@
+# backend/embedding_cache.py
+
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+
+from backend.db import DATABASE_PATH, get_connection
+from backend.vector_index import EMBEDDING_DTYPE, blob_to_embedding, embedding_to_blob
+
+# Cache limits
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "4096"))
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+
+# === Helper Function: Cache Key ===
+def normalize_text(text: str) -> str:
+    """ Canonical form of a text for caching (NFC, trimmed, single spaces). """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def cache_key(text: str, model: str) -> str:
+    """ Content address of (model, normalized text). """
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-process LRU in front of a SQLite table.
+
+    Entries are keyed by a hash of the normalized text plus the model name, so
+    re-uploaded documents and repeated questions never hit the embedding API
+    twice. The SQLite tier is trimmed oldest-first once it grows past
+    `max_disk_bytes`. Hits are noted in memory and their `last_used` times
+    written with the next store, so lookups stay read-only.
+    """
+
+    TOUCH_BATCH = 1024  # Pending hit times that force a write from a lookup.
+
+    def __init__(self, db_path: str = DATABASE_PATH,
+                 max_memory_entries: int = EMBEDDING_CACHE_MEMORY_ENTRIES,
+                 max_disk_bytes: int = int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024)):
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        # Guards the memory tier, pending touches, counters and `_disk_bytes`.
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # === SQLite tier ===
+    def _connect(self) -> sqlite3.Connection:
+        conn = get_connection(self.db_path)
+        if self._disk_bytes is None:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache(last_used)")
+            conn.commit()
+            size = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM embedding_cache").fetchone()[0]
+            with self._lock:
+                if self._disk_bytes is None:
+                    self._disk_bytes = size
+        return conn
+
+    def _write_touches(self, conn: sqlite3.Connection) -> None:
+        # Runs inside the caller's write transaction.
+        with self._lock:
+            touched, self._touched = self._touched, {}
+        conn.executemany("UPDATE embedding_cache SET last_used = ? WHERE key = ?",
+                         [(last_used, key) for key, last_used in touched.items()])
+
+    def _evict_disk(self, conn: sqlite3.Connection) -> None:
+        # Runs inside the caller's write transaction, so concurrent sweeps never count a row twice.
+        # Trim down to 90% of the budget so eviction does not run on every insert.
+        target = int(self.max_disk_bytes * 0.9)
+        with self._lock:
+            excess = self._disk_bytes - target
+        while excess > 0:
+            rows = conn.execute(
+                "SELECT key, size_bytes FROM embedding_cache ORDER BY last_used LIMIT 256"
+            ).fetchall()
+            if not rows:
+                with self._lock:
+                    self._disk_bytes = 0
+                break
+            victims, freed = [], 0
+            for key, size_bytes in rows:
+                if freed >= excess:
+                    break
+                victims.append((key,))
+                freed += size_bytes
+            conn.executemany("DELETE FROM embedding_cache WHERE key = ?", victims)
+            excess -= freed
+            with self._lock:
+                self._disk_bytes -= freed
+                self.evictions += len(victims)
+
+    # === Memory tier ===
+    def _remember(self, key: str, embedding: np.ndarray) -> None:
+        with self._lock:
+            self._memory[key] = embedding
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    # === Public API ===
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        """ Cached embedding for (text, model), or None. """
+        return self.get_many([text], model)[0]
+
+    def get_many(self, texts: List[str], model: str) -> List[Optional[np.ndarray]]:
+        """ Cached embeddings for several texts (None where missing), in one SQLite round trip. """
+        keys = [cache_key(text, model) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        now = time.time()
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    self._touched[key] = now
+                    self.memory_hits += 1
+                    results[i] = embedding
+
+        missing: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            if results[i] is None:
+                missing.setdefault(key, []).append(i)
+
+        rows = []
+        if missing:
+            try:
+                conn = self._connect()
+                key_list = list(missing)
+                for start in range(0, len(key_list), 500):
+                    batch = key_list[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows += conn.execute(
+                        f"SELECT key, embedding FROM embedding_cache WHERE key IN ({placeholders})", batch
+                    ).fetchall()
+            except Exception as e:
+                print(f"Embedding cache lookup failed: {e}")
+
+        for key, blob in rows:
+            embedding = blob_to_embedding(blob)
+            self._remember(key, embedding)
+            for i in missing[key]:
+                results[i] = embedding
+
+        with self._lock:
+            self._touched.update((key, now) for key, _ in rows)
+            self.disk_hits += len(rows)
+            self.misses += sum(1 for r in results if r is None)
+            flush = len(self._touched) >= self.TOUCH_BATCH
+
+        if flush:
+            try:
+                with self._connect() as conn:
+                    self._write_touches(conn)
+            except Exception as e:
+                print(f"Embedding cache write failed: {e}")
+        return results
+
+    def put(self, text: str, model: str, embedding) -> None:
+        """ Store an embedding in both tiers. """
+        self.put_many([text], model, [embedding])
+
+    def put_many(self, texts: List[str], model: str, embeddings) -> None:
+        """ Store several embeddings in both tiers in one SQLite transaction. """
+        now = time.time()
+        rows = []
+        for text, embedding in zip(texts, embeddings):
+            key = cache_key(text, model)
+            embedding = np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+            self._remember(key, embedding)
+            rows.append((key, model, embedding_to_blob(embedding), embedding.nbytes, now))
+
+        try:
+            conn = self._connect()
+            with conn:
+                # Size changes are computed inside one write transaction, so concurrent writers cannot double count.
+                conn.execute("BEGIN IMMEDIATE")
+                self._write_touches(conn)
+                added = 0
+                for row in rows:
+                    replaced = conn.execute("SELECT size_bytes FROM embedding_cache WHERE key = ?", (row[0],)).fetchone()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO embedding_cache (key, model, embedding, size_bytes, last_used) VALUES (?, ?, ?, ?, ?)",
+                        row
+                    )
+                    added += row[3] - (replaced[0] if replaced else 0)
+                with self._lock:
+                    self._disk_bytes += added
+                    over = self._disk_bytes > self.max_disk_bytes
+                if over:
+                    self._evict_disk(conn)
+        except Exception as e:
+            print(f"Embedding cache write failed: {e}")
+
+    def clear(self) -> None:
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM embedding_cache")
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes or 0,
+            }
+
+
+# Process-wide embedding cache
+embedding_cache = EmbeddingCache()
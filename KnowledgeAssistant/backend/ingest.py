@@ -0,0 +1,226 @@
+# backend/ingest.py
+
+import os
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+from backend.chunking import Chunk, chunk_text
+from backend.db import find_duplicate_documents, run_db, save_documents
+from backend.openai_utils import get_embeddings
+from backend.vector_index import normalize
+
+# Documents embedded and written per batch (one DB transaction each).
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "256"))
+
+
+@dataclass
+class IngestJob:
+    """
+    Outcome of a synchronous bulk upload, returned once every item is done.
+    Queued uploads are tracked in SQLite instead (see backend.job_queue).
+    """
+
+    total: int
+    status: str = "pending"  # pending | running | completed | failed
+    processed: int = 0
+    succeeded: int = 0
+    failures: List[dict] = field(default_factory=list)
+    document_ids: List[int] = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def fail(self, index: int, error: str) -> None:
+        self.failures.append({"index": index, "error": error})
+        self.processed += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "status": self.status,
+            "total": self.total,
+            "processed": self.processed,
+            "succeeded": self.succeeded,
+            "failed": len(self.failures),
+            "progress": self.processed / self.total if self.total else 1.0,
+            "failures": self.failures,
+            "document_ids": self.document_ids,
+        }
+
+
+# === Helper Function: Parse Bulk File ===
+def parse_bulk_file(data: bytes) -> Tuple[List[Tuple[int, str]], List[dict]]:
+    """
+    Parse an uploaded bulk file: a JSON array or NDJSON (one document per line).
+
+    Each item is either a string or an object with a "content" field.
+
+    Return: ([(index, content), ...], [per-item parse failures]).
+    """
+
+    text = data.decode("utf-8-sig")
+    if text.lstrip().startswith("["):
+        raw_items = [(i, item) for i, item in enumerate(json.loads(text))]
+    else:
+        raw_items = []
+        for i, line in enumerate(line for line in text.splitlines() if line.strip()):
+            try:
+                raw_items.append((i, json.loads(line)))
+            except json.JSONDecodeError as e:
+                raw_items.append((i, e))
+
+    documents, failures = [], []
+    for i, item in raw_items:
+        if isinstance(item, dict):
+            item = item.get("content")
+        if isinstance(item, str):
+            documents.append((i, item))
+        elif isinstance(item, Exception):
+            failures.append({"index": i, "error": f"Invalid JSON: {item}"})
+        else:
+            failures.append({"index": i, "error": "Item must be a string or an object with a 'content' string."})
+    return documents, failures
+
+
+# === Document Embedding ===
+async def embed_documents(contents: List[str]) -> Tuple[List[Optional[tuple]], Dict[int, Exception]]:
+    """
+    Chunk documents and embed every chunk in as few requests as possible.
+
+    Return: (results, errors) where results[i] is (document embedding,
+        [(chunk, chunk embedding), ...]) or None for every index in errors.
+        The document embedding is the normalized mean of its chunk embeddings.
+        Errors are typed as in `get_embeddings`.
+    """
+
+    chunked: List[List[Chunk]] = [chunk_text(content) for content in contents]
+    texts = [chunk.content for chunks in chunked for chunk in chunks]
+    embeddings, chunk_errors = await get_embeddings(texts)
+
+    results: List[Optional[tuple]] = []
+    errors: Dict[int, Exception] = {}
+    offset = 0
+    for i, chunks in enumerate(chunked):
+        span = range(offset, offset + len(chunks))
+        offset += len(chunks)
+
+        failed = [chunk_errors[j] for j in span if j in chunk_errors]
+        if not chunks or failed:
+            errors[i] = failed[0] if failed else ValueError("Document content is empty.")
+            results.append(None)
+            continue
+
+        chunk_embeddings = [embeddings[j] for j in span]
+        doc_embedding = normalize(np.mean(normalize(np.asarray(chunk_embeddings)), axis=0)).tolist()
+        results.append((doc_embedding, list(zip(chunks, chunk_embeddings))))
+
+    return results, errors
+
+async def reembed_document(content: str, existing_chunks: List[dict]) -> Tuple[List[float], List[Tuple[int, Chunk]], List[Tuple[Chunk, list]]]:
+    """
+    Re-chunk an edited document, embedding only chunks whose text changed.
+
+    Args:
+        content: the new content.
+        existing_chunks: the document's current chunks (see backend.db.get_document_chunks).
+
+    Return: (document embedding, [(kept chunk id, chunk), ...], [(new chunk, embedding), ...]).
+        Raises ValueError for content that cannot be embedded and EmbeddingError when the
+        embedding request fails.
+    """
+
+    chunks = chunk_text(content)
+    if not chunks:
+        raise ValueError("Document content is empty.")
+
+    # Unchanged text keeps its chunk row and stored embedding.
+    unchanged: Dict[str, List[dict]] = {}
+    for existing in existing_chunks:
+        unchanged.setdefault(existing["content"], []).append(existing)
+
+    kept, changed, chunk_embeddings = [], [], []
+    for chunk in chunks:
+        matches = unchanged.get(chunk.content)
+        if matches:
+            existing = matches.pop(0)
+            kept.append((existing["id"], chunk))
+            chunk_embeddings.append(existing["embedding"])
+        else:
+            changed.append(chunk)
+            chunk_embeddings.append(None)
+
+    embeddings, errors = await get_embeddings([chunk.content for chunk in changed])
+    if errors:
+        raise next(iter(errors.values()))
+    added = list(zip(changed, embeddings))
+
+    new_embeddings = iter(embeddings)
+    chunk_embeddings = [embedding if embedding is not None else next(new_embeddings) for embedding in chunk_embeddings]
+    doc_embedding = normalize(np.mean(normalize(np.asarray(chunk_embeddings, dtype=np.float32)), axis=0)).tolist()
+    return doc_embedding, kept, added
+
+
+# === Bulk Ingestion ===
+async def ingest_documents(job: IngestJob, documents: List[Tuple[int, str]], user_id: Optional[int] = None,
+                           shared_with: Sequence[int] = ()) -> IngestJob:
+    """
+    Embed and store documents in batches, recording per-item failures on the job.
+
+    Args:
+        job: result to record outcomes on.
+        documents: (index, content) pairs; indices refer to the caller's input.
+        user_id: owner of the new documents.
+        shared_with: users who may also read them.
+    """
+
+    job.status = "running"
+    try:
+        for start in range(0, len(documents), BULK_BATCH_SIZE):
+            batch = []
+            for index, content in documents[start:start + BULK_BATCH_SIZE]:
+                if not content.strip():
+                    job.fail(index, "Document content is empty.")
+                else:
+                    batch.append((index, content))
+            if not batch:
+                continue
+
+            # Content the owner already stored is reported with its existing id instead of re-embedded.
+            duplicates = await run_db(find_duplicate_documents, user_id, [content for _, content in batch])
+            for j in sorted(duplicates):
+                job.document_ids.append(duplicates[j])
+                job.succeeded += 1
+                job.processed += 1
+            batch = [item for j, item in enumerate(batch) if j not in duplicates]
+            if not batch:
+                continue
+
+            embedded, errors = await embed_documents([content for _, content in batch])
+            ready = []
+            for j, (index, content) in enumerate(batch):
+                if j in errors:
+                    job.fail(index, str(errors[j]))
+                else:
+                    ready.append((index, content, embedded[j]))
+
+            try:
+                doc_ids = await run_db(save_documents, [
+                    (content, doc_embedding, user_id, chunks)
+                    for _, content, (doc_embedding, chunks) in ready
+                ], shared_with)
+                job.document_ids.extend(doc_ids)
+                job.succeeded += len(ready)
+                job.processed += len(ready)
+            except Exception as e:
+                for index, _, _ in ready:
+                    job.fail(index, f"Database write failed: {str(e)}")
+
+        job.status = "completed"
+    except Exception as e:
+        job.status = "failed"
+        print(f"Bulk ingestion failed: {e}")
+    finally:
+        job.finished_at = time.time()
+
+    return job
@@ -0,0 +1,360 @@
+# backend/job_queue.py
+
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from backend.db import find_duplicate_documents, get_connection, retry_on_busy, run_db, save_documents
+from backend.ingest import embed_documents
+
+# Worker pool and retry settings
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "32"))             # Items embedded and saved together.
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+INGEST_RETRY_BASE_SECONDS = float(os.getenv("INGEST_RETRY_BASE_SECONDS", "2"))  # Backoff doubles per attempt.
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "1"))         # Idle workers re-check for due retries.
+
+
+class IdempotencyConflict(Exception):
+    """ An idempotency key was reused with a different request body. """
+
+
+# === Helper Function: Request Fingerprint ===
+def request_fingerprint(documents: Sequence[Tuple[int, str]], failures: Sequence[dict], shared_with: Sequence[int]) -> str:
+    """ Hash of an upload request, used to tell retries from key reuse. """
+    payload = json.dumps([list(documents), list(failures), sorted(shared_with)], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# === Queue Storage (blocking; call through run_db) ===
+@retry_on_busy
+def enqueue_job(user_id: int, documents: Sequence[Tuple[int, str]], failures: Sequence[dict] = (),
+                shared_with: Sequence[int] = (), idempotency_key: Optional[str] = None) -> Tuple[str, bool]:
+    """
+    Persist an upload job and its items.
+
+    Args:
+        user_id: owner of the documents.
+        documents: (index, content) pairs to ingest.
+        failures: items that already failed validation ({"index", "error"}).
+        shared_with: users the documents are shared with.
+        idempotency_key: client key; resubmitting it returns the original job.
+
+    Return: (job_id, created). created is False when the key matched an earlier job.
+    """
+
+    fingerprint = request_fingerprint(documents, failures, shared_with)
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+
+        if idempotency_key is not None:
+            cursor.execute(
+                "SELECT id, request_hash FROM ingest_jobs WHERE user_id = ? AND idempotency_key = ?",
+                (user_id, idempotency_key)
+            )
+            existing = cursor.fetchone()
+            if existing is not None:
+                conn.commit()
+                if existing["request_hash"] != fingerprint:
+                    raise IdempotencyConflict("Idempotency key was already used for a different upload.")
+                return existing["id"], False
+
+        job_id = uuid.uuid4().hex
+        cursor.execute("""
+            INSERT INTO ingest_jobs (id, user_id, idempotency_key, request_hash, shared_with, total, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (job_id, user_id, idempotency_key, fingerprint, json.dumps(list(shared_with)),
+              len(documents) + len(failures), time.time()))
+
+        items = []
+        for index, content in documents:
+            if content.strip():
+                items.append((job_id, index, content, "pending", None))
+            else:
+                items.append((job_id, index, content, "failed", "Document content is empty."))
+        items += [(job_id, failure["index"], "", "failed", failure["error"]) for failure in failures]
+        cursor.executemany("""
+            INSERT INTO ingest_items (job_id, item_index, content, status, error)
+            VALUES (?, ?, ?, ?, ?)
+        """, items)
+
+        conn.commit()
+    return job_id, True
+
+@retry_on_busy
+def claim_items(limit: int) -> List[dict]:
+    """ Mark up to `limit` due items as running and return them with their job's owner and shares. """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("""
+            SELECT i.id, i.job_id, i.content, i.attempts, j.user_id, j.shared_with
+            FROM ingest_items i JOIN ingest_jobs j ON j.id = i.job_id
+            WHERE i.status = 'pending' AND i.next_attempt_at <= ?
+            ORDER BY i.id
+            LIMIT ?
+        """, (time.time(), limit))
+        items = [dict(row) for row in cursor.fetchall()]
+
+        if items:
+            cursor.executemany("UPDATE ingest_items SET status = 'running' WHERE id = ?", [(item["id"],) for item in items])
+        conn.commit()
+    return items
+
+@retry_on_busy
+def finish_items(done: Sequence[Tuple[int, int]], retry: Sequence[Tuple[int, str, float]], failed: Sequence[Tuple[int, str]]) -> None:
+    """
+    Record the outcome of a batch.
+
+    Args:
+        done: (item_id, document_id) for stored items.
+        retry: (item_id, error, next_attempt_at) for items to try again.
+        failed: (item_id, error) for items out of attempts.
+    """
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "UPDATE ingest_items SET status = 'done', document_id = ?, error = NULL WHERE id = ?",
+            [(document_id, item_id) for item_id, document_id in done]
+        )
+        cursor.executemany(
+            "UPDATE ingest_items SET status = 'pending', attempts = attempts + 1, error = ?, next_attempt_at = ? WHERE id = ?",
+            [(error, next_attempt_at, item_id) for item_id, error, next_attempt_at in retry]
+        )
+        cursor.executemany(
+            "UPDATE ingest_items SET status = 'failed', attempts = attempts + 1, error = ? WHERE id = ?",
+            [(error, item_id) for item_id, error in failed]
+        )
+        conn.commit()
+
+@retry_on_busy
+def requeue_running_items() -> int:
+    """ Return items claimed by a previous process that stopped mid-batch to the queue. """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE ingest_items SET status = 'pending' WHERE status = 'running'")
+        conn.commit()
+        return cursor.rowcount
+
+def get_queued_job(job_id: str) -> Optional[dict]:
+    """ Progress of a queued job: IngestJob.to_dict() fields plus its job id, owner and retry count. """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, user_id, total, created_at FROM ingest_jobs WHERE id = ?", (job_id,))
+        job = cursor.fetchone()
+        if job is None:
+            return None
+
+        cursor.execute("""
+            SELECT item_index, status, error, attempts, document_id FROM ingest_items
+            WHERE job_id = ? ORDER BY item_index
+        """, (job_id,))
+        items = cursor.fetchall()
+
+    counts: Dict[str, int] = defaultdict(int)
+    for item in items:
+        counts[item["status"]] += 1
+    processed = counts["done"] + counts["failed"]
+    if counts["pending"] + counts["running"] == 0:
+        status = "completed"
+    elif processed or counts["running"]:
+        status = "running"
+    else:
+        status = "pending"
+
+    return {
+        "job_id": job["id"],
+        "user_id": job["user_id"],
+        "status": status,
+        "total": job["total"],
+        "processed": processed,
+        "succeeded": counts["done"],
+        "failed": counts["failed"],
+        "retrying": sum(1 for item in items if item["status"] == "pending" and item["attempts"] > 0),
+        "progress": processed / job["total"] if job["total"] else 1.0,
+        "failures": [{"index": item["item_index"], "error": item["error"]} for item in items if item["status"] == "failed"],
+        "document_ids": [item["document_id"] for item in items if item["status"] == "done"],
+    }
+
+
+class IngestQueue:
+    """
+    Worker pool that drains the SQLite-backed upload queue.
+
+    Each worker claims a batch of due items, embeds them together, stores
+    each job's share of the batch in one transaction and records the
+    outcome. Failed items are retried with jittered exponential backoff up
+    to `max_attempts`; items left running by a crash are re-queued on start.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, batch_size: int = INGEST_BATCH_SIZE,
+                 max_attempts: int = INGEST_MAX_ATTEMPTS, retry_base: float = INGEST_RETRY_BASE_SECONDS,
+                 poll_interval: float = INGEST_POLL_SECONDS):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    async def start(self) -> None:
+        """ Start the workers (idempotent). """
+        if self.running:
+            return
+        self._wake = asyncio.Event()
+        requeued = await run_db(requeue_running_items)
+        if requeued:
+            print(f"Re-queued {requeued} interrupted upload items.")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """ Cancel the workers; claimed items are re-queued on the next start. """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, user_id: int, documents: Sequence[Tuple[int, str]], failures: Sequence[dict] = (),
+                     shared_with: Sequence[int] = (), idempotency_key: Optional[str] = None) -> Tuple[str, bool]:
+        """ Persist a job and wake the workers. Returns (job_id, created). """
+        job_id, created = await run_db(enqueue_job, user_id, documents, failures, shared_with, idempotency_key)
+        await self.start()
+        self._wake.set()
+        return job_id, created
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                items = await run_db(claim_items, self.batch_size)
+            except Exception as e:
+                print(f"Failed to claim upload items: {e}")
+                items = []
+
+            if not items:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                    self._wake.clear()
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._process(items)
+            except Exception as e:
+                # Keep the worker alive; items already stored complete as duplicates on their retry.
+                print(f"Failed to process upload batch: {e}")
+                await self._retry_all(items, f"Batch processing failed: {str(e)}")
+
+    def _backoff(self, attempts: int) -> float:
+        delay = self.retry_base * 2 ** (attempts - 1)
+        return time.time() + delay * random.uniform(1.0, 1.5)
+
+    def _give_up_or_retry(self, item: dict, error: str, retry: list, failed: list) -> None:
+        attempts = item["attempts"] + 1
+        if attempts >= self.max_attempts:
+            failed.append((item["id"], error))
+        else:
+            retry.append((item["id"], error, self._backoff(attempts)))
+
+    async def _retry_all(self, items: List[dict], error: str) -> None:
+        """ Schedule every item of a failed batch for another attempt (or fail those out of attempts). """
+        retry, failed = [], []
+        for item in items:
+            self._give_up_or_retry(item, error, retry, failed)
+        try:
+            await run_db(finish_items, [], retry, failed)
+        except Exception as e:
+            # Items stay 'running' and are re-queued on the next start.
+            print(f"Failed to record upload batch results: {e}")
+            return
+        self.retried += len(retry)
+        self.failed += len(failed)
+
+    async def _process(self, items: List[dict]) -> None:
+        done, retry, failed = [], [], []
+
+        def give_up_or_retry(item: dict, error: str) -> None:
+            self._give_up_or_retry(item, error, retry, failed)
+
+        # Content the owner already stored completes with its existing id and is not re-embedded.
+        by_owner: Dict[int, List[dict]] = defaultdict(list)
+        for item in items:
+            by_owner[item["user_id"]].append(item)
+        duplicate_items = set()
+        for owner_id, owned in by_owner.items():
+            try:
+                duplicates = await run_db(find_duplicate_documents, owner_id, [item["content"] for item in owned])
+            except Exception as e:
+                print(f"Duplicate check failed: {e}")
+                continue
+            for j, doc_id in duplicates.items():
+                done.append((owned[j]["id"], doc_id))
+                duplicate_items.add(owned[j]["id"])
+        items = [item for item in items if item["id"] not in duplicate_items]
+
+        embedded, errors = await embed_documents([item["content"] for item in items])
+
+        # Store each job's share of the batch with that job's owner and recipients.
+        by_job: Dict[str, List[Tuple[dict, tuple]]] = defaultdict(list)
+        for i, item in enumerate(items):
+            if i in errors:
+                give_up_or_retry(item, str(errors[i]))
+            else:
+                by_job[item["job_id"]].append((item, embedded[i]))
+
+        for ready in by_job.values():
+            owner_id = ready[0][0]["user_id"]
+            shared_with = json.loads(ready[0][0]["shared_with"])
+            try:
+                doc_ids = await run_db(save_documents, [
+                    (item["content"], doc_embedding, owner_id, chunks)
+                    for item, (doc_embedding, chunks) in ready
+                ], shared_with)
+                done.extend((item["id"], doc_id) for (item, _), doc_id in zip(ready, doc_ids))
+            except Exception as e:
+                for item, _ in ready:
+                    give_up_or_retry(item, f"Database write failed: {str(e)}")
+
+        try:
+            await run_db(finish_items, done, retry, failed)
+        except Exception as e:
+            # Items stay 'running' and are re-queued on the next start.
+            print(f"Failed to record upload batch results: {e}")
+
+        self.batches += 1
+        self.completed += len(done)
+        self.retried += len(retry)
+        self.failed += len(failed)
+
+    def stats(self) -> dict:
+        return {
+            "workers": sum(1 for task in self._tasks if not task.done()),
+            "items_completed": self.completed,
+            "items_failed": self.failed,
+            "items_retried": self.retried,
+            "batches": self.batches,
+        }
+
+
+# Process-wide upload queue (started with the app)
+ingest_queue = IngestQueue()
@@ -0,0 +1,262 @@
+# backend/metrics.py
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Requests slower than this are logged with a per-stage breakdown (0 disables the log).
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "0"))
+
+# Histogram buckets in seconds (upstream calls dominate, so the range reaches 30 s).
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+# === Metric Types ===
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    """ A named metric with optional labels, rendered in the Prometheus text format. """
+
+    kind = ""
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            counts = {key: list(value) for key, value in self._counts.items()}
+            sums = dict(self._sums)
+
+        lines = []
+        for key in sorted(counts):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts[key]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(sums[key])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """ Metrics plus callbacks that report component stats (e.g. cache hit ratios) at scrape time. """
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._stats: List[Tuple[str, Callable[[], dict]]] = []
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, description, label_names))
+
+    def gauge(self, name: str, description: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, description, label_names))
+
+    def histogram(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, description, label_names, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_stats(self, component: str, stats: Callable[[], dict]) -> None:
+        """ Export the numeric fields of `stats()` as knowledge_<field>{component="..."} gauges. """
+        self._stats.append((component, stats))
+
+    def render(self) -> str:
+        blocks = [metric.render() for metric in self._metrics]
+
+        fields: Dict[str, List[str]] = {}
+        for component, stats in self._stats:
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"Failed to collect {component} stats: {e}")
+                continue
+            for name, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    fields.setdefault(name, []).append(f'knowledge_{name}{{component="{component}"}} {_format_value(value)}')
+        for name, samples in fields.items():
+            blocks.append("\n".join([f"# TYPE knowledge_{name} gauge"] + samples))
+
+        return "\n".join(blocks) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.counter("knowledge_http_requests_total", "HTTP requests served.", ("method", "route", "status"))
+REQUEST_SECONDS = registry.histogram("knowledge_http_request_duration_seconds", "HTTP request latency, until the last body byte.", ("method", "route"))
+IN_FLIGHT = registry.gauge("knowledge_http_requests_in_flight", "Requests currently being served.")
+STAGE_SECONDS = registry.histogram("knowledge_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",))
+DB_SECONDS = registry.histogram("knowledge_db_operation_seconds", "Database calls, including time queued for a worker thread.", ("operation",))
+OPENAI_TOKENS = registry.counter("knowledge_openai_tokens_total", "Tokens reported by the OpenAI API.", ("model", "kind"))
+
+
+# === Request Tracing ===
+@dataclass
+class RequestTrace:
+    method: str
+    path: str
+    started_at: float = field(default_factory=time.perf_counter)
+    stages: Dict[str, float] = field(default_factory=dict)
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def breakdown(self) -> str:
+        return ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in sorted(self.stages.items(), key=lambda item: -item[1]))
+
+
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """ Time a pipeline stage into the stage histogram and the current request's trace. """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add(stage, elapsed)
+
+def observe_db(operation: str, seconds: float) -> None:
+    """ Record one database call (see backend.db.run_db). """
+    DB_SECONDS.observe(seconds, operation=operation)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(f"db.{operation}", seconds)
+
+def record_usage(model: str, usage) -> None:
+    """ Count the tokens in an OpenAI response's `usage` block (if any). """
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        count = getattr(usage, kind, None)
+        if count:
+            OPENAI_TOKENS.inc(count, model=model, kind=kind.replace("_tokens", ""))
+
+
+# === Middleware ===
+class MetricsMiddleware:
+    """
+    ASGI middleware that counts requests, tracks in-flight requests and
+    times each one until its last body chunk is sent, so streamed answers
+    are measured in full. Requests slower than SLOW_REQUEST_SECONDS are
+    logged with their per-stage breakdown.
+    """
+
+    def __init__(self, app, slow_request_seconds: float = SLOW_REQUEST_SECONDS):
+        self.app = app
+        self.slow_request_seconds = slow_request_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(method=scope["method"], path=scope["path"])
+        token = current_trace.set(trace)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            current_trace.reset(token)
+            elapsed = time.perf_counter() - trace.started_at
+
+            # Label by route template (e.g. /knowledge/upload/bulk/{job_id}) to keep cardinality bounded.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUESTS.inc(method=trace.method, route=route, status=status[0])
+            REQUEST_SECONDS.observe(elapsed, method=trace.method, route=route)
+
+            if self.slow_request_seconds and elapsed >= self.slow_request_seconds:
+                print(f"Slow request: {trace.method} {trace.path} {status[0]} took {elapsed * 1000:.1f}ms ({trace.breakdown() or 'no stages'})")
@@ -5,6 +5,10 @@ from typing import List
 
 class UploadDocumentRequest(BaseModel):
     content: str
+    shared_with: List[str] = Field(default_factory=list, example=["alice"])
+
+class UpdateDocumentRequest(BaseModel):
+    content: str
 
 class RegisterRequest(BaseModel):
     username: str = Field(..., example="bob")
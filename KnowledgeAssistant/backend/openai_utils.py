@@ -1,8 +1,14 @@
 # backend/openai_utils.py
 
 import os
-from openai import OpenAI
+import asyncio
+import httpx
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from backend.db import run_db
+from backend.embedding_cache import embedding_cache
+from backend.metrics import record_usage
 
 # Set the proper location for .env
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
@@ -10,34 +16,171 @@ dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
 # Load env variables from .env
 load_dotenv(dotenv_path=dotenv_path)
 
+# Upstream limits
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+
+# Embedding request limits (per input, and per multi-input request)
+EMBEDDING_MAX_INPUT_TOKENS = 8191
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "2048"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "250000"))
+
+# Shared, pooled HTTP client (keep-alive connections are reused across requests)
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_CONNECTIONS),
+    timeout=httpx.Timeout(OPENAI_TIMEOUT_SECONDS, connect=5.0)
+)
+
 # Set OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
 
-def get_embedding(text: str, model: str = "text-embedding-ada-002") -> list:
-    """ Generates an embedding vector for a given text. """
-    response = client.embeddings.create(
-        input=[text],
-        model=model
-    )
-    return response.data[0].embedding
+# Bounds in-flight upstream calls so a burst cannot exhaust the pool or rate limits.
+upstream_slots = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
 
-def generate_answer(prompt: str, model = "gpt-4o") -> str:
-    """ Generate a response based on a given prompt. """
+
+class EmbeddingError(Exception):
+    """ The embedding service could not embed the text (an upstream failure, not bad input). """
+
+
+async def close_client() -> None:
+    """ Close the shared HTTP client (called on shutdown). """
+    await client.close()
+
+async def get_embedding(text: str, model: str = "text-embedding-ada-002") -> list:
+    """ Generates an embedding vector for a given text (served from cache when possible). """
+    cached = await run_db(embedding_cache.get, text, model)
+    if cached is not None:
+        return cached.tolist()
+
+    async with upstream_slots:
+        response = await client.embeddings.create(
+            input=[text],
+            model=model
+        )
+    record_usage(model, response.usage)
+    embedding = response.data[0].embedding
+
+    await run_db(embedding_cache.put, text, model, embedding)
+    return embedding
+
+def estimate_tokens(text: str) -> int:
+    """ Conservative token estimate (~3 characters per token) used to size requests. """
+    return len(text) // 3 + 1
+
+def plan_embedding_batches(texts: List[str]) -> List[List[int]]:
+    """
+    Group text indices into embedding requests that respect the input and token limits.
+
+    Args:
+        texts: texts to embed (each must fit EMBEDDING_MAX_INPUT_TOKENS).
+
+    Return: list of batches, each a list of indices into `texts`.
+    """
+
+    batches, batch, batch_tokens = [], [], 0
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= EMBEDDING_BATCH_MAX_INPUTS or batch_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(i)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+async def get_embeddings(texts: List[str], model: str = "text-embedding-ada-002") -> Tuple[List[Optional[list]], Dict[int, Exception]]:
+    """
+    Embed many texts with as few multi-input requests as possible.
+
+    Cached texts are served from the embedding cache; the rest are packed into
+    batches within the request limits and sent concurrently.
+
+    Return: (embeddings, errors) where embeddings[i] is None for every index in errors.
+        Each error is a ValueError for a text that cannot be embedded or an
+        EmbeddingError for a failed request.
+    """
+
+    cached = await run_db(embedding_cache.get_many, texts, model)
+    results: List[Optional[list]] = [c.tolist() if c is not None else None for c in cached]
+    errors: Dict[int, Exception] = {}
+
+    todo = []
+    for i, text in enumerate(texts):
+        if results[i] is not None:
+            continue
+        if estimate_tokens(text) > EMBEDDING_MAX_INPUT_TOKENS:
+            errors[i] = ValueError(f"Text is too long to embed (~{estimate_tokens(text)} tokens > {EMBEDDING_MAX_INPUT_TOKENS}).")
+        else:
+            todo.append(i)
+
+    async def embed_batch(batch: List[int]) -> None:
+        try:
+            async with upstream_slots:
+                response = await client.embeddings.create(
+                    input=[texts[i] for i in batch],
+                    model=model
+                )
+            record_usage(model, response.usage)
+            for item in response.data:
+                results[batch[item.index]] = item.embedding
+        except Exception as e:
+            for i in batch:
+                errors[i] = EmbeddingError(f"Embedding request failed: {str(e)}")
+
+    await asyncio.gather(*(
+        embed_batch([todo[j] for j in batch])
+        for batch in plan_embedding_batches([texts[i] for i in todo])
+    ))
+
+    fresh = [i for i in todo if results[i] is not None]
+    if fresh:
+        await run_db(embedding_cache.put_many, [texts[i] for i in fresh], model, [results[i] for i in fresh])
+    return results, errors
+
+def answer_messages(prompt: str) -> list:
+    """ Chat messages used to answer a prompt. """
     if not prompt or not isinstance(prompt, str):
         raise ValueError("Prompt must be non empty string.")
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {
-                "role": "system", 
-                "content": "You are an internal knowledge assistant. Answer clearly and helpfully."
-            },
-            {
-                "role": "user", 
-                "content": prompt
-            }
-        ],
-        temperature=0.2 # Range: 0.0 (Very deterministic; safe) to 1.0 (Creative; unexpected responses)
-    )
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+    return [
+        {
+            "role": "system",
+            "content": "You are an internal knowledge assistant. Answer clearly and helpfully."
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+async def generate_answer(prompt: str, model = "gpt-4o") -> str:
+    """ Generate a response based on a given prompt. """
+    messages = answer_messages(prompt)
+
+    async with upstream_slots:
+        response = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.2 # Range: 0.0 (Very deterministic; safe) to 1.0 (Creative; unexpected responses)
+        )
+    record_usage(model, response.usage)
+    return response.choices[0].message.content.strip()
+
+async def generate_answer_stream(prompt: str, model = "gpt-4o") -> AsyncIterator[str]:
+    """ Generate a response based on a given prompt, yielding tokens as they arrive. """
+    messages = answer_messages(prompt)
+
+    async with upstream_slots:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.2,
+            stream=True,
+            stream_options={"include_usage": True}  # Final chunk reports token counts.
+        )
+        async for chunk in stream:
+            record_usage(model, getattr(chunk, "usage", None))
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
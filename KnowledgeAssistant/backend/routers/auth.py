@@ -2,50 +2,56 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from backend.db import get_connection
+from backend.db import get_connection, retry_on_busy, run_db
 from backend.models import RegisterRequest, LoginRequest
-from backend.auth_utils import hash_password, create_access_token, verify_password
+from backend.metrics import span
+from backend.auth_utils import hash_password, create_access_token, login_rate_limiter, run_hash, verify_password
 from typing import Optional
-import sqlite3
 
 auth_router = APIRouter(prefix="/auth", tags=["auth"])
 
-# === Internal login helper ===
-def authenicate_user(username: str, password: str) -> Optional[str]:
+# === Internal login helpers ===
+def get_user_record(username: str) -> Optional[dict]:
     try:
         with get_connection() as conn:
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
 
-            cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
+            cursor.execute("SELECT id, username, hashed_password FROM users WHERE username = ?", (username,))
             user = cursor.fetchone()
-            
-            if not user:
-                return None
-
-            hashed_password = user["hashed_password"]
-
-            if not verify_password(password, hashed_password):
-                return None
-            
-            # return authenticated username
-            return username
+            return dict(user) if user else None
     
     except Exception as e:
         return None
 
+async def authenicate_user(username: str, password: str) -> Optional[dict]:
+    # Rate limit per username before spending any bcrypt time on it.
+    login_rate_limiter.check(username)
+
+    user = await run_db(get_user_record, username)
+    if not user:
+        return None
+
+    # bcrypt runs on its own bounded pool, off the event loop and the database threads.
+    with span("password_hash"):
+        verified = await run_hash(verify_password, password, user["hashed_password"])
+    if not verified:
+        return None
+
+    # return authenticated user
+    return {"id": user["id"], "username": user["username"]}
+
 # === JSON Login ===   
 @auth_router.post("/login")
 async def login(request: LoginRequest):
     username = request.username.strip()
     password = request.password
 
-    user = authenicate_user(username, password)
+    user = await authenicate_user(username, password)
 
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password.")
     
-    token = create_access_token({"sub": user})
+    token = create_access_token({"sub": user["username"], "uid": user["id"]})
     return {"access_token": token, "token_type": "bearer"}
 
 # === Form Login ===
@@ -54,14 +60,32 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     username = form_data.username
     password = form_data.password
 
-    user = authenicate_user(username, password)
+    user = await authenicate_user(username, password)
 
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid username or password.")
     
-    token = create_access_token({"sub": user})
+    token = create_access_token({"sub": user["username"], "uid": user["id"]})
     return {"access_token": token, "token_type": "bearer"}
 
+# === Internal registration helper ===
+@retry_on_busy
+def create_user(username: str, hashed_password: str) -> None:
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+        existing_user = cursor.fetchone()
+
+        if existing_user:
+            raise HTTPException(status_code=400, detail="Username already exists in database.")
+        
+        cursor.execute(
+            "INSERT INTO users (username, hashed_password) VALUES (?, ?)",
+            (username, hashed_password)
+        )
+        conn.commit()
+
 # === Regiser User Endpoint ===
 @auth_router.post("/register")
 async def register_user(request: RegisterRequest):
@@ -72,26 +96,16 @@ async def register_user(request: RegisterRequest):
         if not username or not password:
             raise HTTPException(status_code=400, detail="Username and password cannot be empty.")
 
-        hashed_password = hash_password(password)
-
-        with get_connection() as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-            existing_user = cursor.fetchone()
-
-            if existing_user:
-                raise HTTPException(status_code=400, detail="Username already exists in database.")
-            
-            cursor.execute(
-                "INSERT INTO users (username, hashed_password) VALUES (?, ?)",
-                (username, hashed_password)
-            )
-            conn.commit()
+        # Password hashing and the insert both block, so run them off the event loop.
+        with span("password_hash"):
+            hashed_password = await run_hash(hash_password, password)
+        await run_db(create_user, username, hashed_password)
         
         return {"message": "User successfully registered!"}
     
+    except HTTPException:
+        raise
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Registration failed: {str(e)}")
 
@@ -1,67 +1,208 @@
 # backend/routers/knowledge.py
 
-from fastapi import APIRouter, HTTPException, Depends
+import os
+import json
+from fastapi import APIRouter, HTTPException, Depends, File, Header, Query, UploadFile
+from fastapi.responses import StreamingResponse
 from typing import List, Optional, Tuple
 
-from backend.db import get_all_documents, save_document
-from backend.models import AskQuestionRequest, UploadDocumentRequest
-from backend.auth_utils import get_current_user
-from backend.openai_utils import get_embedding, generate_answer
+from backend.db import (
+    DocumentChanged, DuplicateDocument, content_hash, delete_document, document_shards, find_duplicate_documents,
+    find_near_duplicate, get_chunks, get_document, get_document_chunks, get_user_id, get_user_ids, lexical_search,
+    run_db, save_document, share_documents, update_document, visible_partitions
+)
+from backend.models import AskQuestionRequest, UpdateDocumentRequest, UploadDocumentRequest
+from backend.answer_cache import answer_cache
+from backend.ingest import (
+    IngestJob, embed_documents, ingest_documents, parse_bulk_file, reembed_document
+)
+from backend.job_queue import IdempotencyConflict, get_queued_job, ingest_queue
+from backend.auth_utils import get_current_claims
+from backend.chunking import truncate_tokens
+from backend.metrics import span
+from backend.search import LEXICAL_MIN_RATIO, contains_terms, fts_query, identifier_terms, lexical_fast_path, reciprocal_rank_fusion
+from backend.openai_utils import EmbeddingError, get_embedding, generate_answer, generate_answer_stream
 
 knowledge_router = APIRouter(prefix="/knowledge", tags=["knowledge"])
 
 CONFIDENCE_THRESHOLD = 0.7
 MINIMUM_CONTENT_LENGTH = 20
 
+# Retrieval context: chunks considered per question, and the prompt budget they share.
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+
+# === Current User Dependency ===
+async def get_current_user_id(claims: dict = Depends(get_current_claims)) -> int:
+    # Tokens issued at login carry the user id; older tokens fall back to a lookup.
+    user_id = claims.get("uid")
+    if user_id is None:
+        user_id = await run_db(get_user_id, claims["sub"])
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials.")
+    return user_id
+
+
 # === Upload Document Endpoint ===
 @knowledge_router.post("/upload")
-async def upload_document(request: UploadDocumentRequest, username: str = Depends(get_current_user)):
+async def upload_document(request: UploadDocumentRequest, background: bool = False, skip_near_duplicates: bool = False,
+                          idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                          user_id: int = Depends(get_current_user_id)):
+    shared_with = await resolve_recipients(request.shared_with)
+
+    # Accept immediately and let the upload workers embed and store it.
+    if background:
+        return await queue_ingest_job(user_id, [(0, request.content)], [], shared_with, idempotency_key)
+
     try:
         # Get text from request.
         content = request.content
 
-        # Create embedding from content.
-        embedding = get_embedding(content)
+        # Identical content is stored once: skip embedding and point at the existing copy.
+        duplicates = await run_db(find_duplicate_documents, user_id, [content])
+        if duplicates:
+            doc_id = duplicates[0]
+            await run_db(share_documents, [doc_id], shared_with)
+            return {"message": "Document is already stored.", "document_id": doc_id, "duplicate": True, "near_duplicate_of": None}
+
+        # Split into chunks and embed each one.
+        with span("embedding"):
+            embedded, errors = await embed_documents([content])
+        if errors:
+            raise errors[0]
+        embedding, chunks = embedded[0]
 
-        # TODO: Attach username to document uploads.
+        # Compare against the uploader's documents using the embeddings just computed.
+        near_duplicate = await run_db(find_near_duplicate, user_id, [chunk_embedding for _, chunk_embedding in chunks])
+        near_duplicate_of = near_duplicate[0] if near_duplicate else None
+        if near_duplicate_of is not None and skip_near_duplicates:
+            return {"message": "Document is a near-duplicate and was not stored.", "document_id": near_duplicate_of,
+                    "duplicate": True, "near_duplicate_of": near_duplicate_of}
 
-        # Save document and embedding to storage.
-        save_document(content, embedding) 
+        # Save document, chunks and embeddings to storage, owned by the uploader.
+        with span("save"):
+            doc_id = await run_db(save_document, content, embedding, user_id, chunks, shared_with)
+        if doc_id is None:
+            raise RuntimeError("Document could not be saved.")
 
         # Return success.
-        return {"message": "Document upload successfully!"}
+        return {"message": "Document upload successfully!", "document_id": doc_id, "duplicate": False, "near_duplicate_of": near_duplicate_of}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to upload document: {str(e)}")
 
 
+# === Bulk Upload Endpoint (JSON array) ===
+@knowledge_router.post("/upload/bulk")
+async def upload_documents_bulk(documents: List[UploadDocumentRequest], background: bool = False,
+                                shared_with: List[str] = Query([]),
+                                idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                                user_id: int = Depends(get_current_user_id)):
+    recipients = await resolve_recipients(shared_with)
+    items = [(i, doc.content) for i, doc in enumerate(documents)]
+    if background:
+        return await queue_ingest_job(user_id, items, [], recipients, idempotency_key)
+
+    # Synchronous uploads answer with the final results; there is no job to poll.
+    job = IngestJob(total=len(documents))
+    return (await ingest_documents(job, items, user_id, recipients)).to_dict()
+
+
+# === Bulk Upload Endpoint (NDJSON / JSON file) ===
+@knowledge_router.post("/upload/bulk/file")
+async def upload_documents_file(file: UploadFile = File(...), background: bool = True,
+                                shared_with: List[str] = Query([]),
+                                idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                                user_id: int = Depends(get_current_user_id)):
+    recipients = await resolve_recipients(shared_with)
+    try:
+        documents, failures = parse_bulk_file(await file.read())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse bulk file: {str(e)}")
+
+    if background:
+        return await queue_ingest_job(user_id, documents, failures, recipients, idempotency_key)
+
+    job = IngestJob(total=len(documents) + len(failures))
+    for failure in failures:
+        job.fail(failure["index"], failure["error"])
+    return (await ingest_documents(job, documents, user_id, recipients)).to_dict()
+
+
+# === Update Document Endpoint ===
+@knowledge_router.put("/documents/{doc_id}")
+async def update_document_content(doc_id: int, request: UpdateDocumentRequest, user_id: int = Depends(get_current_user_id)):
+    if not request.content.strip():
+        raise HTTPException(status_code=400, detail="Document content is empty.")
+    document = await owned_document(doc_id, user_id)
+    existing_chunks = await run_db(get_document_chunks, doc_id)
+    if content_hash(document["content"]) == content_hash(request.content):
+        return {"document_id": doc_id, "chunks": len(existing_chunks), "reembedded": 0, "reused": len(existing_chunks), "unchanged": True}
+
+    # Only chunks whose text changed are sent for embedding.
+    try:
+        with span("embedding"):
+            embedding, kept, added = await reembed_document(request.content, existing_chunks)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except EmbeddingError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update document: {str(e)}")
+
+    try:
+        with span("save"):
+            updated = await run_db(update_document, doc_id, request.content, embedding, kept, added,
+                                   content_hash(document["content"]))
+    except (DuplicateDocument, DocumentChanged) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Document not found.")
+
+    answer_cache.invalidate_document(doc_id)
+    return {"document_id": doc_id, "chunks": len(kept) + len(added), "reembedded": len(added), "reused": len(kept), "unchanged": False}
+
+
+# === Delete Document Endpoint ===
+@knowledge_router.delete("/documents/{doc_id}")
+async def delete_document_endpoint(doc_id: int, user_id: int = Depends(get_current_user_id)):
+    await owned_document(doc_id, user_id)
+    if not await run_db(delete_document, doc_id):
+        raise HTTPException(status_code=404, detail="Document not found.")
+
+    answer_cache.invalidate_document(doc_id)
+    return {"message": "Document deleted.", "document_id": doc_id}
+
+
+# === Upload Job Progress Endpoint ===
+@knowledge_router.get("/jobs/{job_id}")
+async def upload_job_status(job_id: str, user_id: int = Depends(get_current_user_id)):
+    queued = await run_db(get_queued_job, job_id)
+    if queued is None or queued.pop("user_id") != user_id:
+        raise HTTPException(status_code=404, detail="Upload job not found.")
+    return queued
+
+
+# === Bulk Upload Progress Endpoint (kept for existing clients) ===
+@knowledge_router.get("/upload/bulk/{job_id}")
+async def bulk_upload_status(job_id: str, user_id: int = Depends(get_current_user_id)):
+    return await upload_job_status(job_id, user_id)
+
+
 # === Add Question Endpoint ===
 @knowledge_router.post("/ask-question")
-async def ask_question(request: AskQuestionRequest, username: str = Depends(get_current_user)):
+async def ask_question(request: AskQuestionRequest, user_id: int = Depends(get_current_user_id)):
     try:
-        question = request.question
-
-        # Create embedding for question
-        question_embedding = get_embedding(question)
-
-        # TODO: filter docs by username and access.
-        # Get the documents from the database
-        documents = get_all_documents()
-        if not documents:
-            return {"answer": "No documents are currently available in the knowledge base."}
-        
-        # Find the most similar document
-        best_doc, best_score = find_most_similar_document(question_embedding, documents)
-        if best_doc is None or best_score < CONFIDENCE_THRESHOLD:
-            return {"answer": "It doesn't appear that I can find a suitable document to answer your question."}
-        
-        # Validate document content
-        if not best_doc.get('content') or len(best_doc['content'].strip()) < MINIMUM_CONTENT_LENGTH:
-            return {"answer": "It doesn't appear that I can find a suitable document to answer your question."}
-
-        # Create the prompt and generate answer
-        prompt = f"Use the following document to answer the question. \n\nDocument:\n{best_doc['content']}\n\nQuestion:\n{question}"
-        answer = generate_answer(prompt)
+        # Retrieval and pre-generation checks
+        answer, context = await prepare_answer(request.question, user_id)
+        if answer is not None:
+            return {"answer": answer}
+
+        # Generate answer
+        with span("generate"):
+            answer = await generate_answer(context["prompt"])
+        if context["embedding"] is not None:
+            answer_cache.store(context["embedding"], context["documents"], answer)
 
         # Response with answer
         return {"answer": answer}
@@ -70,45 +211,197 @@ async def ask_question(request: AskQuestionRequest, username: str = Depends(get_
         raise HTTPException(status_code=500, detail=f"Failed to answer question: {str(e)}")
 
 
-# === Helper Function: Cosine Similarity ===
-def cosine_similarity(vec1: list[float], vec2: list[float]) -> float:
+# === Streaming Question Endpoint (Server-Sent Events) ===
+@knowledge_router.post("/ask-question/stream")
+async def ask_question_stream(request: AskQuestionRequest, user_id: int = Depends(get_current_user_id)):
+    try:
+        # Checks run before the stream opens, so failures still return a normal error.
+        answer, context = await prepare_answer(request.question, user_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to answer question: {str(e)}")
+
+    async def events():
+        if answer is not None:
+            yield sse_event({"token": answer})
+            yield sse_event({}, event="done")
+            return
+
+        tokens = []
+        try:
+            with span("generate"):
+                async for token in generate_answer_stream(context["prompt"]):
+                    tokens.append(token)
+                    yield sse_event({"token": token})
+        except Exception as e:
+            yield sse_event({"detail": f"Failed to answer question: {str(e)}"}, event="error")
+            return
+
+        if context["embedding"] is not None:
+            answer_cache.store(context["embedding"], context["documents"], "".join(tokens).strip())
+        yield sse_event({}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# === Helper Function: Queue Ingest Job ===
+async def queue_ingest_job(user_id: int, documents: List[Tuple[int, str]], failures: List[dict],
+                           shared_with: List[int], idempotency_key: Optional[str]) -> dict:
+    """ Persist an upload job for the worker pool and return its id for polling. """
+    try:
+        job_id, created = await ingest_queue.submit(user_id, documents, failures, shared_with, idempotency_key)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    job = await run_db(get_queued_job, job_id)
+    job.pop("user_id")
+    return {"job_id": job_id, "status": job["status"], "total": job["total"], "duplicate": not created}
+
+# === Helper Function: Owned Document ===
+async def owned_document(doc_id: int, user_id: int) -> dict:
+    """ The document if the user owns it; 404 otherwise (other users' documents are not revealed). """
+    document = await run_db(get_document, doc_id)
+    if document is None or document["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Document not found.")
+    return document
+
+# === Helper Function: Resolve Recipients ===
+async def resolve_recipients(usernames: List[str]) -> List[int]:
+    """ User ids of the users a document is shared with (400 if any is unknown). """
+    user_ids = await run_db(get_user_ids, usernames)
+    unknown = [name for name in usernames if name not in user_ids]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot share with unknown users: {', '.join(unknown)}")
+    return list(user_ids.values())
+
+# === Helper Function: Prepare Answer ===
+async def prepare_answer(question: str, user_id: int) -> Tuple[Optional[str], Optional[dict]]:
     """ 
-    Compute cosine similarity between two vectors. 
+    Retrieve context for a question and run the checks that precede generation.
+
+    Only documents the user owns, unowned documents and documents shared
+    with the user are searched.
     
     Args:
-        vec1: list of floats.
-        vec2: list of floats.
-    
-    Return: the similarity between vec1 and vec2
+        question: the user's question.
+        user_id: the asking user.
+
+    Return: (answer, None) when no model call is needed (empty knowledge base,
+        low confidence, short document or cached answer), otherwise
+        (None, context) with the question embedding (None when full-text
+        search answered alone), documents and prompt.
     """
 
-    dot_product = sum(a * b for a, b in zip(vec1, vec2))
-    norm1 = sum(a * a for a in vec1) ** 0.5
-    norm2 = sum(b * b for b in vec2) ** 0.5
-    
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
+    # Load the user's index shards on first use
+    partitions = visible_partitions(user_id)
+    with span("load_shards"):
+        total_chunks = await run_db(document_shards.size, partitions)
+    if total_chunks == 0:
+        return "No documents are currently available in the knowledge base.", None
+
+    # Full-text search first: exact identifiers (error codes, SKUs) need no embedding
+    with span("lexical_search"):
+        lexical_hits, top_lexical = await run_db(find_lexical_hits, question, user_id)
+    question_embedding = None
+    if lexical_hits and top_lexical is not None and lexical_fast_path(question, lexical_hits, top_lexical["content"]):
+        with span("retrieval"):
+            context_chunks, _ = await run_db(find_relevant_chunks, None, lexical_hits, partitions)
+    else:
+        # Create embedding for question and fuse vector and lexical rankings
+        with span("embedding"):
+            question_embedding = await get_embedding(question)
+        with span("retrieval"):
+            context_chunks, best_score = await run_db(find_relevant_chunks, question_embedding, lexical_hits, partitions)
+
+        identifiers = identifier_terms(question)
+        identifier_match = bool(identifiers) and top_lexical is not None and contains_terms(top_lexical["content"], identifiers)
+        if not context_chunks or (best_score < CONFIDENCE_THRESHOLD and not identifier_match):
+            return "It doesn't appear that I can find a suitable document to answer your question.", None
     
-    return dot_product / (norm1 * norm2)
+    # Validate document content
+    if sum(len(chunk['content'].strip()) for chunk in context_chunks) < MINIMUM_CONTENT_LENGTH:
+        return "It doesn't appear that I can find a suitable document to answer your question.", None
+
+    # Reuse the answer to a near-identical question answered from the same chunks
+    if question_embedding is not None:
+        with span("answer_cache"):
+            cached_answer = answer_cache.lookup(question_embedding, context_chunks)
+        if cached_answer is not None:
+            return cached_answer, None
+
+    # Create the prompt
+    prompt = f"Use the following document excerpts to answer the question. \n\n{format_context(context_chunks)}\n\nQuestion:\n{question}"
+    return None, {"embedding": question_embedding, "documents": context_chunks, "prompt": prompt}
 
-# === Helper Function: Find Most Similar Document ===
-def find_most_similar_document(question_embedding: List[float], documents: List[dict]) -> Tuple[Optional[dict], float]:
+# === Helper Function: Server-Sent Event ===
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """ Format one Server-Sent Event (JSON payload keeps newlines in tokens intact). """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+# === Helper Function: Find Lexical Hits ===
+def find_lexical_hits(question: str, user_id: int, k: int = RETRIEVAL_TOP_K) -> Tuple[List[Tuple[int, float]], Optional[dict]]:
+    """ BM25 (chunk_id, score) hits among the user's chunks, and the top hit's chunk (or None). """
+    hits = lexical_search(fts_query(question), k, user_id)
+    top = get_chunks([hits[0][0]]) if hits else []
+    return hits, top[0] if top else None
+
+# === Helper Function: Find Relevant Chunks ===
+def find_relevant_chunks(question_embedding: Optional[List[float]], lexical_hits: List[Tuple[int, float]],
+                         partitions: List[tuple], k: int = RETRIEVAL_TOP_K,
+                         token_budget: int = CONTEXT_TOKEN_BUDGET) -> Tuple[List[dict], float]:
     """ 
-    Find the document with the highest similarity to the question
+    Find the chunks most relevant to the question that fit in the prompt budget.
+
+    Vector and BM25 rankings are merged with reciprocal rank fusion; after
+    the first chunk, a candidate is kept only if it is similar enough to the
+    question or a strong lexical match.
     
     Args:
-        question_embedding: the question
-        documents: the documents to search.
+        question_embedding: the question, or None for a lexical-only search.
+        lexical_hits: BM25 (chunk_id, score) pairs, best first.
+        partitions: index shards to search (see backend.db.visible_partitions).
+        k: number of candidate chunks to pull from each ranking.
+        token_budget: maximum total tokens of the returned chunks.
 
-    Return: The document most similar to the question.
+    Return: (chunks best first, each with a "score"; best cosine similarity, -1 if none).
     """
 
-    best_score = -1
-    best_doc = None
-    for doc in documents:
-        score = cosine_similarity(question_embedding, doc["embedding"])
-        if score > best_score:
-            best_score = score
-            best_doc = doc
+    vector_hits = document_shards.search(partitions, question_embedding, k=k) if question_embedding is not None else []
+    if not vector_hits and not lexical_hits:
+        return [], -1
+
+    cosine, bm25 = dict(vector_hits), dict(lexical_hits)
+    lexical_floor = LEXICAL_MIN_RATIO * lexical_hits[0][1] if lexical_hits else float("inf")
+    fused = reciprocal_rank_fusion([vector_hits, lexical_hits])
+
+    selected, used = [], 0
+    for chunk in get_chunks([chunk_id for chunk_id, _ in fused[:k]]):
+        chunk["score"] = cosine.get(chunk["id"], -1)
+        # Weaker matches only fill the budget if they are still relevant.
+        relevant = chunk["score"] >= CONFIDENCE_THRESHOLD or chunk["id"] in bm25 and bm25[chunk["id"]] >= lexical_floor
+        if selected and not relevant:
+            continue
+        if used + chunk["token_count"] > token_budget:
+            if selected:
+                continue
+            # Oversized legacy (pre-chunking) documents are cut to the budget.
+            chunk["content"] = truncate_tokens(chunk["content"], token_budget)
+            chunk["token_count"] = token_budget
+        selected.append(chunk)
+        used += chunk["token_count"]
+
+    return selected, max(cosine.values(), default=-1)
 
-    return best_doc, best_score
\ No newline at end of file
+# === Helper Function: Format Context ===
+def format_context(chunks: List[dict]) -> str:
+    """ Render chunks for the prompt, grouped by document and in reading order. """
+    ordered = sorted(chunks, key=lambda chunk: (chunk["document_id"], chunk["chunk_index"]))
+    return "\n\n".join(
+        f"Document {chunk['document_id']} (part {chunk['chunk_index'] + 1}):\n{chunk['content']}"
+        for chunk in ordered
+    )
@@ -0,0 +1,89 @@
+# backend/search.py
+
+import os
+import re
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+# Reciprocal rank fusion constant; larger values flatten the gap between ranks.
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Lexical fast path: the top BM25 hit must beat the runner-up by this factor.
+LEXICAL_DOMINANCE = float(os.getenv("LEXICAL_DOMINANCE", "1.5"))
+
+# Lexical hits scoring below this fraction of the best hit are not relevant on their own.
+LEXICAL_MIN_RATIO = float(os.getenv("LEXICAL_MIN_RATIO", "0.5"))
+
+TERM = re.compile(r"[\w-]+")
+STOPWORDS = frozenset("""
+    a an and are as at be by can do does for from how i in is it me my of on or
+    the this that to was what when where which who why will with you your
+""".split())
+
+
+# === Helper Function: Query Terms ===
+def query_terms(text: str) -> List[str]:
+    """ Distinct lower-cased search terms in text, stopwords removed. """
+    terms = (term.strip("-").lower() for term in TERM.findall(text))
+    return list(dict.fromkeys(term for term in terms if term and term not in STOPWORDS))
+
+def identifier_terms(text: str) -> List[str]:
+    """ Terms that look like identifiers (error codes, SKUs, versions): they contain a digit or '_'. """
+    return [term for term in query_terms(text)
+            if len(term) >= 3 and any(c.isdigit() or c == "_" for c in term)]
+
+def fts_query(text: str) -> str:
+    """
+    FTS5 MATCH expression for a free-text question.
+
+    Each term is quoted so punctuation and FTS operators in user input are
+    taken literally, and terms are OR-ed so BM25 ranks partial matches.
+    """
+    return " OR ".join(f'"{term}"' for term in query_terms(text))
+
+def contains_terms(content: str, terms: Sequence[str]) -> bool:
+    """ True when every term appears as a whole token in content. """
+    tokens = {term.lower() for term in TERM.findall(content)}
+    return all(term in tokens for term in terms)
+
+
+# === Rank Fusion ===
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[int, float]]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    Merge ranked lists with reciprocal rank fusion.
+
+    Only positions are used, so BM25 and cosine scores never have to be
+    put on the same scale: each list adds 1 / (k + rank) to its items.
+
+    Args:
+        rankings: lists of (id, score) pairs, best first.
+        k: damping constant.
+
+    Return: (id, fused score) pairs, best first.
+    """
+
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, (item_id, _) in enumerate(ranking, start=1):
+            fused[item_id] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+# === Lexical Fast Path ===
+def lexical_fast_path(question: str, hits: List[Tuple[int, float]], top_content: str) -> bool:
+    """
+    Whether full-text search alone is confident enough to answer.
+
+    The question must name identifiers, the top hit must contain all of
+    them, and it must clearly outrank the next hit (or be the only one).
+
+    Args:
+        question: the user's question.
+        hits: BM25 (chunk_id, score) pairs, best first.
+        top_content: content of the top hit.
+    """
+
+    identifiers = identifier_terms(question)
+    if not identifiers or not hits or not contains_terms(top_content, identifiers):
+        return False
+    return len(hits) == 1 or hits[0][1] >= LEXICAL_DOMINANCE * hits[1][1]
@@ -0,0 +1,673 @@
+# backend/vector_index.py
+
+import os
+import time
+import heapq
+import threading
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Embeddings are stored and scored as float32.
+EMBEDDING_DTYPE = np.float32
+
+# Index backend and tuning knobs (see README for details).
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "flat")
+IVF_NLIST = int(os.getenv("IVF_NLIST", "1024"))      # Number of coarse clusters.
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))      # Clusters scanned per query (recall vs. latency).
+PQ_M = int(os.getenv("PQ_M", "64"))                  # Sub-quantizers per vector (bytes per code).
+IVF_RERANK = int(os.getenv("IVF_RERANK", "8"))       # Exact re-scoring of k * IVF_RERANK candidates (0 = off).
+
+# Per-partition shards (see ShardedIndex).
+SHARD_IDLE_SECONDS = float(os.getenv("SHARD_IDLE_SECONDS", "900"))  # Evict shards unused for this long.
+MAX_LOADED_SHARDS = int(os.getenv("MAX_LOADED_SHARDS", "256"))       # Least recently used shards beyond this are evicted.
+
+
+# === Helper Function: Embedding <-> BLOB ===
+def embedding_to_blob(embedding) -> bytes:
+    """ Serialize an embedding into a float32 BLOB. """
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+
+def blob_to_embedding(blob: bytes) -> np.ndarray:
+    """ Deserialize a float32 BLOB back into an embedding vector. """
+    return np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """ L2-normalize vectors along the last axis (zero vectors stay zero). """
+    vectors = np.asarray(vectors, dtype=EMBEDDING_DTYPE)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """ Indices of the k highest scores, best first. """
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+def kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0) -> np.ndarray:
+    """
+    Plain Lloyd's k-means.
+
+    Args:
+        vectors: (n, d) training vectors.
+        n_clusters: number of centroids to learn.
+        n_iter: number of assignment/update rounds.
+        seed: RNG seed for the initial centroids.
+
+    Return: (n_clusters, d) centroids.
+    """
+
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = nearest_centroid(vectors, centroids)
+        counts = np.bincount(assign, minlength=n_clusters)
+
+        # Per-cluster sums via one sorted pass (much faster than np.add.at).
+        order = np.argsort(assign, kind="stable")
+        present = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts[present])[:-1]])
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(vectors[order], starts, axis=0)
+
+        # Re-seed empty clusters from random points.
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+            counts[empty] = 1
+        centroids = sums / counts[:, None]
+
+    return centroids.astype(EMBEDDING_DTYPE)
+
+def nearest_centroid(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    """ Index of the nearest (L2) centroid for each vector. """
+    c_norms = (centroids * centroids).sum(axis=1)
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk):
+        block = vectors[start:start + chunk]
+        assign[start:start + chunk] = np.argmin(c_norms - 2 * block @ centroids.T, axis=1)
+    return assign
+
+
+class _RowBuffer:
+    """ Growable (ids, rows) arrays with amortized O(1) appends. """
+
+    def __init__(self, width: int, dtype, capacity: int = 1024):
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.rows = np.empty((capacity, width), dtype=dtype)
+        self.size = 0
+
+    def append(self, ids: np.ndarray, rows: np.ndarray) -> None:
+        end = self.size + len(ids)
+        if end > len(self.ids):
+            capacity = max(end, 2 * len(self.ids))
+            new_ids = np.empty(capacity, dtype=np.int64)
+            new_rows = np.empty((capacity, self.rows.shape[1]), dtype=self.rows.dtype)
+            new_ids[:self.size] = self.ids[:self.size]
+            new_rows[:self.size] = self.rows[:self.size]
+            self.ids, self.rows = new_ids, new_rows
+        self.ids[self.size:end] = ids
+        self.rows[self.size:end] = rows
+        self.size = end
+
+    def view(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.ids[:self.size], self.rows[:self.size]
+
+    def remove(self, ids: np.ndarray) -> int:
+        """ Drop rows whose id is in `ids` (order of the rest is kept). Returns the number removed. """
+        keep = ~np.isin(self.ids[:self.size], ids)
+        kept = int(keep.sum())
+        removed = self.size - kept
+        if removed:
+            self.ids[:kept] = self.ids[:self.size][keep]
+            self.rows[:kept] = self.rows[:self.size][keep]
+            self.size = kept
+        return removed
+
+
+class VectorIndex:
+    """
+    Base class for document embedding indexes.
+
+    Vectors are L2-normalized on insert, so every backend ranks by cosine
+    similarity. Subclasses implement `_add`, `search` and the (de)serialization
+    hooks; locking and persistence live here.
+    """
+
+    backend = ""
+
+    def __init__(self):
+        self.dim = 0
+        self.loaded = False
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def add(self, doc_id: int, embedding) -> None:
+        """ Add a single embedding to the index. """
+        self.add_many([doc_id], [embedding])
+
+    def add_many(self, doc_ids: Iterable[int], embeddings) -> None:
+        """ Add a batch of embeddings to the index. """
+        doc_ids = np.asarray(list(doc_ids), dtype=np.int64)
+        if not len(doc_ids):
+            return
+        vectors = normalize(np.asarray(embeddings, dtype=EMBEDDING_DTYPE).reshape(len(doc_ids), -1))
+
+        with self._lock:
+            if len(self) and vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension mismatch: index has {self.dim}, got {vectors.shape[1]}.")
+            self.dim = vectors.shape[1]
+            self._add(doc_ids, vectors)
+
+    def _add(self, doc_ids: np.ndarray, vectors: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def remove(self, doc_ids: Iterable[int]) -> int:
+        """ Remove embeddings by id. Returns the number removed. """
+        doc_ids = np.asarray(list(doc_ids), dtype=np.int64)
+        if not len(doc_ids):
+            return 0
+        with self._lock:
+            return self._remove(doc_ids)
+
+    def _remove(self, doc_ids: np.ndarray) -> int:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def max_id(self) -> int:
+        """ Largest document id in the index (0 when empty). """
+        raise NotImplementedError
+
+    def ids(self) -> np.ndarray:
+        """ Every document id in the index. """
+        raise NotImplementedError
+
+    def search(self, query, k: int = 1) -> List[Tuple[int, float]]:
+        """
+        Find the k most similar embeddings to the query.
+
+        Args:
+            query: the query embedding.
+            k: number of results to return.
+
+        Return: list of (doc_id, cosine similarity), best first.
+        """
+        raise NotImplementedError
+
+    # === Persistence ===
+    def save(self, path: str) -> None:
+        """ Write the index to `path` (an .npz file). """
+        with self._lock:
+            state = self._state()
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, backend=np.array(self.backend), dim=np.array(self.dim), **state)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """ Restore the index from `path`. Returns False if missing or incompatible. """
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            if str(data["backend"]) != self.backend or not self._compatible(data):
+                return False
+            with self._lock:
+                self.dim = int(data["dim"])
+                self._restore(data)
+        return True
+
+    def _state(self) -> dict:
+        raise NotImplementedError
+
+    def _restore(self, data) -> None:
+        raise NotImplementedError
+
+    def _compatible(self, data) -> bool:
+        return True
+
+
+class FlatIndex(VectorIndex):
+    """
+    Exact search over an in-memory matrix of pre-normalized embeddings.
+
+    Cosine similarity against a query is a single matrix-vector product. The
+    matrix grows by doubling to keep incremental inserts amortized O(1).
+    """
+
+    backend = "flat"
+
+    def __init__(self):
+        super().__init__()
+        self._rows: Optional[_RowBuffer] = None
+
+    def __len__(self) -> int:
+        return self._rows.size if self._rows else 0
+
+    def _add(self, doc_ids: np.ndarray, vectors: np.ndarray) -> None:
+        if self._rows is None or self._rows.rows.shape[1] != self.dim:
+            self._rows = _RowBuffer(self.dim, EMBEDDING_DTYPE)
+        self._rows.append(doc_ids, vectors)
+
+    def _remove(self, doc_ids: np.ndarray) -> int:
+        return self._rows.remove(doc_ids) if self._rows else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._rows = None
+
+    def max_id(self) -> int:
+        return int(self._rows.view()[0].max()) if len(self) else 0
+
+    def ids(self) -> np.ndarray:
+        return self.vectors()[0].copy()
+
+    def vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ (ids, normalized vectors) currently held by the index. """
+        with self._lock:
+            if not len(self):
+                return np.empty(0, dtype=np.int64), np.empty((0, self.dim), dtype=EMBEDDING_DTYPE)
+            return self._rows.view()
+
+    def search(self, query, k: int = 1) -> List[Tuple[int, float]]:
+        with self._lock:
+            if not len(self):
+                return []
+            ids, matrix = self._rows.view()
+            scores = matrix @ normalize(query)
+            # `ids` is a view that a concurrent remove compacts in place, so read it under the lock.
+            return [(int(ids[i]), float(scores[i])) for i in top_k(scores, k)]
+
+    def _state(self) -> dict:
+        # Copies: the snapshot is written after the lock is released.
+        ids, matrix = self.vectors()
+        return {"ids": ids.copy(), "vectors": matrix.copy()}
+
+    def _restore(self, data) -> None:
+        self._rows = None
+        if len(data["ids"]):
+            self._add(data["ids"], data["vectors"])
+
+
+class IVFPQIndex(VectorIndex):
+    """
+    Approximate search with an inverted file (IVF) and product quantization (PQ).
+
+    A coarse k-means quantizer splits the space into `nlist` cells. Each vector
+    is stored in its cell as `m` one-byte PQ codes of its residual, and a query
+    only scans the `nprobe` closest cells using asymmetric distance lookup
+    tables. When `rerank` > 0 the full vectors are kept as well and the top
+    `k * rerank` candidates are re-scored exactly.
+
+    Until `train_size` vectors have arrived the index behaves like a flat
+    index; the quantizers are trained on that first batch.
+    """
+
+    backend = "ivfpq"
+    KSUB = 256         # Centroids per sub-quantizer (one byte per code).
+    MAX_TRAIN = 65536  # Training sample cap for the quantizers.
+
+    def __init__(self, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, m: int = PQ_M,
+                 rerank: int = IVF_RERANK, train_size: Optional[int] = None):
+        super().__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.m = m
+        self.rerank = rerank
+        self.train_size = train_size or max(40 * nlist, 4 * self.KSUB)
+        self._pending = FlatIndex()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.coarse: Optional[np.ndarray] = None       # (nlist, d)
+        self.codebooks: Optional[np.ndarray] = None    # (m, KSUB, d / m)
+        self._lists: List[_RowBuffer] = []
+        self._vectors: List[_RowBuffer] = []
+        self._size = 0
+        self._max_id = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.coarse is not None
+
+    def __len__(self) -> int:
+        return self._size + len(self._pending)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._reset()
+
+    def max_id(self) -> int:
+        return max(self._max_id, self._pending.max_id())
+
+    def ids(self) -> np.ndarray:
+        with self._lock:
+            return np.concatenate([self._pending.ids()] + [lst.view()[0] for lst in self._lists])
+
+    def _sub_dims(self) -> int:
+        # Fall back to the largest divisor of dim that does not exceed m.
+        while self.dim % self.m:
+            self.m -= 1
+        return self.dim // self.m
+
+    def _add(self, doc_ids: np.ndarray, vectors: np.ndarray) -> None:
+        if not self.is_trained:
+            self._pending.add_many(doc_ids, vectors)
+            if len(self._pending) >= self.train_size:
+                self.train()
+            return
+        self._encode_and_store(doc_ids, vectors)
+
+    def _remove(self, doc_ids: np.ndarray) -> int:
+        removed = self._pending.remove(doc_ids)
+        # Codes and full vectors share row order within a cell, so removing from both keeps them aligned.
+        for cell, lst in enumerate(self._lists):
+            count = lst.remove(doc_ids)
+            if count and self.rerank:
+                self._vectors[cell].remove(doc_ids)
+            self._size -= count
+            removed += count
+        return removed
+
+    def train(self) -> None:
+        """ Train the coarse and product quantizers on the buffered vectors. """
+        with self._lock:
+            ids, vectors = self._pending.vectors()
+            if not len(ids):
+                return
+            ids, vectors = ids.copy(), vectors.copy()
+
+            # Quantizers are trained on a bounded sample; every vector is encoded afterwards.
+            sub = self._sub_dims()
+            rng = np.random.default_rng(0)
+            sample = vectors[rng.choice(len(vectors), min(len(vectors), self.MAX_TRAIN), replace=False)]
+            self.coarse = kmeans(sample, self.nlist)
+            residuals = sample - self.coarse[nearest_centroid(sample, self.coarse)]
+            self.codebooks = np.stack([
+                kmeans(residuals[:, j * sub:(j + 1) * sub], self.KSUB, seed=j)
+                for j in range(self.m)
+            ])
+            # Pad codebooks trained on fewer than KSUB points so codes stay in range.
+            if self.codebooks.shape[1] < self.KSUB:
+                pad = np.zeros((self.m, self.KSUB - self.codebooks.shape[1], sub), dtype=EMBEDDING_DTYPE)
+                self.codebooks = np.concatenate([self.codebooks, pad], axis=1)
+
+            self.nlist = len(self.coarse)
+            self._lists = [_RowBuffer(self.m, np.uint8, 16) for _ in range(self.nlist)]
+            self._vectors = [_RowBuffer(self.dim, EMBEDDING_DTYPE, 16) for _ in range(self.nlist)] if self.rerank else []
+            self._pending.clear()
+            self._encode_and_store(ids, vectors)
+
+    def _encode_and_store(self, doc_ids: np.ndarray, vectors: np.ndarray) -> None:
+        sub = self.dim // self.m
+        cells = nearest_centroid(vectors, self.coarse)
+        residuals = vectors - self.coarse[cells]
+        codes = np.stack([
+            nearest_centroid(residuals[:, j * sub:(j + 1) * sub], self.codebooks[j])
+            for j in range(self.m)
+        ], axis=1).astype(np.uint8)
+
+        for cell in np.unique(cells):
+            rows = cells == cell
+            self._lists[cell].append(doc_ids[rows], codes[rows])
+            if self.rerank:
+                self._vectors[cell].append(doc_ids[rows], vectors[rows])
+
+        self._size += len(doc_ids)
+        self._max_id = max(self._max_id, int(doc_ids.max()))
+
+    def search(self, query, k: int = 1) -> List[Tuple[int, float]]:
+        query = normalize(query)
+
+        with self._lock:
+            if not self.is_trained:
+                return self._pending.search(query, k)
+            if not self._size:
+                return []
+
+            # Pick the closest cells and build the per-query lookup tables.
+            coarse_scores = self.coarse @ query
+            probe = top_k(coarse_scores, self.nprobe)
+            sub = self.dim // self.m
+            tables = np.einsum("jcs,js->jc", self.codebooks, query.reshape(self.m, sub))
+
+            ids, scores, cand_cells = [], [], []
+            for cell in probe:
+                cell_ids, codes = self._lists[cell].view()
+                if not len(cell_ids):
+                    continue
+                ids.append(cell_ids)
+                scores.append(coarse_scores[cell] + tables[np.arange(self.m), codes].sum(axis=1))
+                cand_cells.append(np.full(len(cell_ids), cell))
+
+            if not ids:
+                return []
+            ids, scores = np.concatenate(ids), np.concatenate(scores)
+
+            if not self.rerank:
+                return [(int(ids[i]), float(scores[i])) for i in top_k(scores, k)]
+
+            # Re-score the best approximate candidates against the full vectors.
+            cand_cells = np.concatenate(cand_cells)
+            offsets = np.concatenate([np.arange(self._lists[c].size) for c in probe if self._lists[c].size])
+            candidates = top_k(scores, k * self.rerank)
+            exact = np.array([self._vectors[cand_cells[i]].rows[offsets[i]] @ query for i in candidates])
+
+        order = np.argsort(-exact)[:k]
+        return [(int(ids[candidates[i]]), float(exact[i])) for i in order]
+
+    def _compatible(self, data) -> bool:
+        # Rerank needs the stored full vectors.
+        return not self.rerank or "coarse" not in data or "vec_ids" in data
+
+    def _state(self) -> dict:
+        pending_ids, pending_vectors = self._pending.vectors()
+        state = {"pending_ids": pending_ids, "pending_vectors": pending_vectors}
+        if not self.is_trained:
+            return state
+
+        views = [lst.view() for lst in self._lists]
+        state.update(
+            coarse=self.coarse,
+            codebooks=self.codebooks,
+            list_sizes=np.array([len(v[0]) for v in views]),
+            ids=np.concatenate([v[0] for v in views]),
+            codes=np.concatenate([v[1] for v in views]),
+        )
+        if self.rerank:
+            vec_views = [v.view() for v in self._vectors]
+            state.update(
+                vec_ids=np.concatenate([v[0] for v in vec_views]),
+                vectors=np.concatenate([v[1] for v in vec_views]),
+            )
+        return state
+
+    def _restore(self, data) -> None:
+        self._reset()
+        self._pending.clear()
+        if len(data["pending_ids"]):
+            self._pending.add_many(data["pending_ids"], data["pending_vectors"])
+        if "coarse" not in data:
+            return
+
+        self.coarse = data["coarse"]
+        self.codebooks = data["codebooks"]
+        self.nlist, self.m = len(self.coarse), self.codebooks.shape[0]
+        bounds = np.concatenate([[0], np.cumsum(data["list_sizes"])])
+        ids, codes = data["ids"], data["codes"]
+        self._lists = []
+        self._vectors = []
+        for cell in range(self.nlist):
+            lo, hi = bounds[cell], bounds[cell + 1]
+            lst = _RowBuffer(self.m, np.uint8, max(16, hi - lo))
+            lst.append(ids[lo:hi], codes[lo:hi])
+            self._lists.append(lst)
+            if self.rerank:
+                vec = _RowBuffer(self.dim, EMBEDDING_DTYPE, max(16, hi - lo))
+                vec.append(data["vec_ids"][lo:hi], data["vectors"][lo:hi])
+                self._vectors.append(vec)
+        self._size = len(ids)
+        self._max_id = int(ids.max()) if len(ids) else 0
+
+
+# === Index Factory ===
+INDEX_BACKENDS = {
+    FlatIndex.backend: FlatIndex,
+    IVFPQIndex.backend: IVFPQIndex,
+}
+
+def create_index(backend: str = VECTOR_INDEX_BACKEND, **params) -> VectorIndex:
+    """ Create a vector index by backend name ('flat' or 'ivfpq'). """
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown vector index backend '{backend}'. Choose from: {', '.join(INDEX_BACKENDS)}.")
+    return INDEX_BACKENDS[backend](**params)
+
+
+@dataclass
+class Shard:
+    index: VectorIndex
+    loaded_through: int       # Highest row id in the source table when the shard was loaded.
+    last_used: float
+    unsaved: int = 0          # Inserts and removals since the shard was last persisted.
+
+
+class ShardedIndex:
+    """
+    One vector index per partition (e.g. per owner), loaded on first use.
+
+    `loader(key)` builds a shard from storage and `saver(key, shard)` persists
+    it; shards unused for `idle_seconds`, or beyond `max_shards`, are saved and
+    dropped from memory. A per-key lock serializes loading, inserting and
+    evicting a partition, so rows committed while a shard loads are neither
+    lost nor indexed twice.
+    """
+
+    def __init__(self, loader: Callable[[Hashable], Shard],
+                 saver: Optional[Callable[[Hashable, Shard], None]] = None,
+                 idle_seconds: float = SHARD_IDLE_SECONDS,
+                 max_shards: int = MAX_LOADED_SHARDS,
+                 save_every: int = 1000):
+        self.loader = loader
+        self.saver = saver
+        self.idle_seconds = idle_seconds
+        self.max_shards = max_shards
+        self.save_every = save_every
+
+        self._shards: "OrderedDict[Hashable, Shard]" = OrderedDict()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._shards
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    def _key_lock(self, key: Hashable) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def shard(self, key: Hashable) -> VectorIndex:
+        """ The index for `key`, loading it on first use. """
+        with self._key_lock(key):
+            shard = self._shards.get(key)
+            if shard is None:
+                shard = self.loader(key)
+            shard.last_used = time.monotonic()
+            with self._lock:
+                self._shards[key] = shard
+                self._shards.move_to_end(key)
+
+        self.evict_idle()
+        return shard.index
+
+    def remove(self, key: Hashable, ids: List[int]) -> None:
+        """ Remove rows from a loaded shard; unloaded shards drop them when they load. """
+        with self._key_lock(key):
+            shard = self._shards.get(key)
+            if shard is None:
+                return
+            shard.unsaved += shard.index.remove(ids)
+            if self.saver and shard.unsaved >= self.save_every:
+                self._save(key, shard)
+
+    def add_many(self, key: Hashable, ids: List[int], embeddings) -> None:
+        """ Add rows to a loaded shard; unloaded shards pick them up when they load. """
+        with self._key_lock(key):
+            shard = self._shards.get(key)
+            if shard is None:
+                return
+            fresh = [(row_id, embedding) for row_id, embedding in zip(ids, embeddings) if row_id > shard.loaded_through]
+            if not fresh:
+                return
+            shard.index.add_many([row_id for row_id, _ in fresh], [embedding for _, embedding in fresh])
+            shard.unsaved += len(fresh)
+            if self.saver and shard.unsaved >= self.save_every:
+                self._save(key, shard)
+
+    def search(self, keys: Iterable[Hashable], query, k: int = 1) -> List[Tuple[int, float]]:
+        """ Top k (id, score) pairs across the shards for `keys`, best first. """
+        hits = []
+        for key in keys:
+            hits.extend(self.shard(key).search(query, k=k))
+        return heapq.nlargest(k, hits, key=lambda hit: hit[1])
+
+    def size(self, keys: Iterable[Hashable]) -> int:
+        """ Total number of vectors in the shards for `keys`. """
+        return sum(len(self.shard(key)) for key in keys)
+
+    def evict(self, key: Hashable) -> None:
+        """ Save and drop one shard (it reloads on next use). """
+        with self._key_lock(key):
+            with self._lock:
+                shard = self._shards.pop(key, None)
+            if shard is not None and shard.unsaved:
+                self._save(key, shard)
+
+    def evict_idle(self) -> None:
+        """ Drop shards idle for longer than `idle_seconds` and the least recently used beyond `max_shards`. """
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            keys = list(self._shards)
+            stale = [key for key in keys if self._shards[key].last_used < cutoff]
+            stale += [key for key in keys[:max(0, len(keys) - self.max_shards)] if key not in stale]
+        for key in stale:
+            self.evict(key)
+
+    def save_all(self) -> None:
+        """ Persist every loaded shard with unsaved inserts. """
+        for key in list(self._shards):
+            with self._key_lock(key):
+                shard = self._shards.get(key)
+                if shard is not None and shard.unsaved:
+                    self._save(key, shard)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._shards.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            shards = list(self._shards.values())
+        return {"loaded_shards": len(shards), "indexed_vectors": sum(len(shard.index) for shard in shards)}
+
+    def _save(self, key: Hashable, shard: Shard) -> None:
+        if self.saver is None:
+            return
+        try:
+            self.saver(key, shard)
+            shard.unsaved = 0
+        except Exception as e:
+            print(f"Failed to save index shard {key}: {e}")
@@ -0,0 +1,123 @@
+// frontend/src/App.js
+
+import { useRef, useState } from "react";
+import "./index.css";
+
+const API_URL = process.env.REACT_APP_API_URL || "http://localhost:8000";
+
+// Parse one Server-Sent Event block ("event: ...\ndata: {...}").
+function parseEvent(block) {
+  let event = "message";
+  let data = "";
+  for (const line of block.split("\n")) {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) data += line.slice(5).trim();
+  }
+  return { event, data: data ? JSON.parse(data) : {} };
+}
+
+// POST a question and call onToken for every streamed token.
+async function streamAnswer(question, token, onToken, signal) {
+  const response = await fetch(`${API_URL}/knowledge/ask-question/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Authorization: `Bearer ${token}` },
+    body: JSON.stringify({ question }),
+    signal,
+  });
+
+  if (!response.ok) {
+    const body = await response.json().catch(() => ({}));
+    throw new Error(body.detail || `Request failed (${response.status})`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line; keep any partial event in the buffer.
+    const blocks = buffer.split("\n\n");
+    buffer = blocks.pop();
+    for (const block of blocks) {
+      const { event, data } = parseEvent(block);
+      if (event === "error") throw new Error(data.detail);
+      if (event === "done") return;
+      onToken(data.token);
+    }
+  }
+}
+
+function LoginForm({ onLogin }) {
+  const [username, setUsername] = useState("");
+  const [password, setPassword] = useState("");
+  const [error, setError] = useState("");
+
+  async function submit(e) {
+    e.preventDefault();
+    setError("");
+    const response = await fetch(`${API_URL}/auth/login`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ username, password }),
+    });
+    const body = await response.json();
+    if (response.ok) onLogin(body.access_token);
+    else setError(body.detail || "Login failed.");
+  }
+
+  return (
+    <form onSubmit={submit}>
+      <input placeholder="Username" value={username} onChange={(e) => setUsername(e.target.value)} />
+      <input placeholder="Password" type="password" value={password} onChange={(e) => setPassword(e.target.value)} />
+      <button type="submit">Log in</button>
+      {error && <p className="error">{error}</p>}
+    </form>
+  );
+}
+
+export default function App() {
+  const [token, setToken] = useState(null);
+  const [question, setQuestion] = useState("");
+  const [answer, setAnswer] = useState("");
+  const [error, setError] = useState("");
+  const [streaming, setStreaming] = useState(false);
+  const controller = useRef(null);
+
+  async function ask(e) {
+    e.preventDefault();
+    controller.current?.abort();
+    controller.current = new AbortController();
+
+    setAnswer("");
+    setError("");
+    setStreaming(true);
+    try {
+      // Append each token as soon as it arrives.
+      await streamAnswer(question, token, (t) => setAnswer((prev) => prev + t), controller.current.signal);
+    } catch (err) {
+      if (err.name !== "AbortError") setError(err.message);
+    } finally {
+      setStreaming(false);
+    }
+  }
+
+  if (!token) return <LoginForm onLogin={setToken} />;
+
+  return (
+    <main>
+      <h1>Knowledge Assistant</h1>
+      <form onSubmit={ask}>
+        <textarea value={question} onChange={(e) => setQuestion(e.target.value)} placeholder="Ask a question..." />
+        <button type="submit" disabled={!question.trim() || streaming}>
+          {streaming ? "Answering..." : "Ask"}
+        </button>
+      </form>
+      {error && <p className="error">{error}</p>}
+      <pre className="answer">{answer}</pre>
+    </main>
+  );
+}
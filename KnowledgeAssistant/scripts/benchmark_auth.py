@@ -0,0 +1,101 @@
+# scripts/benchmark_auth.py
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import httpx
+import numpy as np
+
+async def timed(coro) -> float:
+    start = time.perf_counter()
+    response = await coro
+    if response.status_code >= 500:
+        response.raise_for_status()
+    return time.perf_counter() - start
+
+async def gather_limited(concurrency: int, coros) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(limited(coro) for coro in coros))
+
+async def probe_loop(api: httpx.AsyncClient, stop: asyncio.Event) -> list:
+    """ Ping /health every 10 ms; slow pings mean something is blocking the event loop. """
+    latencies = []
+    while not stop.is_set():
+        latencies.append(await timed(api.get("/health")))
+        await asyncio.sleep(0.01)
+    return latencies
+
+def percentiles(latencies: list) -> str:
+    ms = np.asarray(latencies) * 1000
+    return f"p50={np.percentile(ms, 50):7.1f} ms  p99={np.percentile(ms, 99):7.1f} ms"
+
+async def run(args):
+    # Throwaway database; import the app only after pointing the backend at it.
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    workdir = tempfile.mkdtemp()
+    import backend.db as db
+    db.DATABASE_PATH = os.path.join(workdir, "knowledge.db")
+    db.INDEX_DIR = workdir
+    from backend.app import app
+    from backend.auth_utils import BCRYPT_THREADS, token_cache
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=120) as api:
+        users = [f"bench{i}" for i in range(args.users)]
+        await gather_limited(args.concurrency, [api.post("/auth/register", json={"username": u, "password": "pw"}) for u in users])
+        print(f"{args.users} users, concurrency {args.concurrency}, {BCRYPT_THREADS} bcrypt threads\n")
+
+        # Logins: one per user (stays under the per-username rate limit), with a loop probe running.
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_loop(api, stop))
+        start = time.perf_counter()
+        latencies = await gather_limited(args.concurrency, [
+            timed(api.post("/auth/login", json={"username": u, "password": "pw"})) for u in users
+        ])
+        wall = time.perf_counter() - start
+        stop.set()
+        health = await probe
+        print(f"login                {len(users) / wall:8.1f} req/s  {percentiles(latencies)}")
+        print(f"/health during login {'':8}        {percentiles(health)}")
+
+        # Authenticated requests with and without the token claims cache.
+        token = (await api.post("/auth/login", json={"username": users[0], "password": "pw"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for label, ttl in (("auth (no cache)", 0.0), ("auth (token cache)", 60.0)):
+            token_cache.clear()
+            token_cache.ttl = ttl
+            start = time.perf_counter()
+            latencies = await gather_limited(args.concurrency, [
+                timed(api.get("/knowledge/upload/bulk/missing", headers=headers)) for _ in range(args.requests)
+            ])
+            wall = time.perf_counter() - start
+            print(f"{label:<20} {args.requests / wall:8.1f} req/s  {percentiles(latencies)}")
+
+        # Per-username rate limiting: rapid attempts against one account.
+        statuses = await asyncio.gather(*(
+            api.post("/auth/login", json={"username": users[1], "password": "wrong"}) for _ in range(args.attempts)
+        ))
+        limited = sum(response.status_code == 429 for response in statuses)
+        print(f"\n{args.attempts} rapid attempts on one username: {limited} rejected with 429")
+
+def main():
+    parser = argparse.ArgumentParser(description="Login and authenticated-request throughput under concurrency.")
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=5000, help="Authenticated requests per run.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=25, help="Rapid login attempts against one username.")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
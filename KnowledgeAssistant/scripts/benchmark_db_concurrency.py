@@ -0,0 +1,98 @@
+# scripts/benchmark_db_concurrency.py
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import backend.db as db
+
+def seed(conn: sqlite3.Connection, n_docs: int, dim: int) -> None:
+    """
+    Create the schema and fill it with n_docs documents.
+    """
+
+    db.isvalid_users_table(conn.cursor())
+    db.isvalid_documents_table(conn.cursor())
+    blob = np.random.default_rng(0).standard_normal(dim).astype(np.float32).tobytes()
+    conn.executemany(
+        "INSERT INTO documents (content, embedding) VALUES (?, ?)",
+        [(f"seed document {i}", blob) for i in range(n_docs)]
+    )
+    conn.commit()
+
+def baseline_connection(path: str) -> sqlite3.Connection:
+    # What every db.py call used to do: a fresh connection in rollback-journal mode.
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def run(label: str, path: str, connect, retry, threads: int, ops: int, write_ratio: float, n_docs: int, dim: int):
+    blob = np.zeros(dim, dtype=np.float32).tobytes()
+    errors = [0]
+    lock = threading.Lock()
+
+    def read(conn):
+        doc_id = random.randint(1, n_docs)
+        conn.execute("SELECT id, user_id, content, created_at FROM documents WHERE id = ?", (doc_id,)).fetchone()
+
+    def write(conn):
+        with conn:
+            conn.execute("INSERT INTO documents (content, embedding) VALUES (?, ?)", ("benchmark document", blob))
+
+    def worker():
+        for _ in range(ops):
+            conn = connect(path)
+            op = write if random.random() < write_ratio else read
+            try:
+                retry(op)(conn)
+            except sqlite3.OperationalError:
+                with lock:
+                    errors[0] += 1
+            if connect is baseline_connection:
+                conn.close()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    total = threads * ops
+    print(f"{label:<22}{total / elapsed:>12,.0f} ops/s{errors[0]:>10} locked errors")
+    return total / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed read/write SQLite throughput: per-call connections vs. the WAL connection pool.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=2000, help="Operations per thread.")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    baseline_path = os.path.join(workdir, "baseline.db")
+    pooled_path = os.path.join(workdir, "pooled.db")
+    with sqlite3.connect(baseline_path) as conn:
+        seed(conn, args.docs, args.dim)
+    seed(db.get_connection(pooled_path), args.docs, args.dim)
+
+    print(f"{args.threads} threads x {args.ops} ops, {args.write_ratio:.0%} writes\n")
+    base = run("per-call connections", baseline_path, baseline_connection, lambda f: f,
+               args.threads, args.ops, args.write_ratio, args.docs, args.dim)
+    pooled = run("pooled WAL", pooled_path, db.get_connection, db.retry_on_busy,
+                 args.threads, args.ops, args.write_ratio, args.docs, args.dim)
+    print(f"\nspeed-up: {pooled / base:.1f}x")
+
+if __name__ == "__main__":
+    main()
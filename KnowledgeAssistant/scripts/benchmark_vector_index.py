@@ -0,0 +1,81 @@
+# scripts/benchmark_vector_index.py
+
+import sys
+import time
+import argparse
+import sqlite3
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from backend.vector_index import FlatIndex, IVFPQIndex, blob_to_embedding
+
+def synthetic_embeddings(n: int, dim: int, n_topics: int = 256, seed: int = 0) -> np.ndarray:
+    """
+    Clustered random vectors that roughly mimic real embedding geometry.
+    """
+
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    assign = rng.integers(0, n_topics, n)
+    return topics[assign] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+
+def load_embeddings(db_path: str) -> np.ndarray:
+    """
+    Read every stored embedding from a knowledge.db file.
+    """
+
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT embedding FROM documents").fetchall()
+    return np.stack([blob_to_embedding(row[0]) for row in rows])
+
+def time_queries(index, queries: np.ndarray, k: int):
+    start = time.perf_counter()
+    results = [[doc_id for doc_id, _ in index.search(q, k)] for q in queries]
+    elapsed = time.perf_counter() - start
+    return results, elapsed / len(queries) * 1000
+
+def recall_at_k(exact, approx, k: int) -> float:
+    hits = sum(len(set(e[:k]) & set(a[:k])) for e, a in zip(exact, approx))
+    return hits / (k * len(exact))
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall@k and latency of IVF-PQ vs. exact flat search.")
+    parser.add_argument("--db", help="Use embeddings from this knowledge.db instead of synthetic data.")
+    parser.add_argument("--n", type=int, default=100_000, help="Number of synthetic vectors.")
+    parser.add_argument("--dim", type=int, default=1536, help="Synthetic embedding dimension.")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--m", type=int, default=64)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 8])
+    args = parser.parse_args()
+
+    vectors = load_embeddings(args.db) if args.db else synthetic_embeddings(args.n, args.dim)
+    ids = np.arange(1, len(vectors) + 1)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(len(vectors), args.queries)] + 0.3 * rng.standard_normal((args.queries, vectors.shape[1])).astype(np.float32)
+    print(f"Corpus: {len(vectors):,} x {vectors.shape[1]}, {args.queries} queries, k={args.k}\n")
+
+    flat = FlatIndex()
+    flat.add_many(ids, vectors)
+    exact, flat_ms = time_queries(flat, queries, args.k)
+    print(f"{'backend':<28}{'recall@k':>10}{'ms/query':>12}")
+    print(f"{'flat':<28}{1.0:>10.3f}{flat_ms:>12.2f}")
+
+    for rerank in args.rerank:
+        start = time.perf_counter()
+        ivf = IVFPQIndex(nlist=args.nlist, m=args.m, rerank=rerank, train_size=len(vectors))
+        ivf.add_many(ids, vectors)
+        build_s = time.perf_counter() - start
+
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            approx, ivf_ms = time_queries(ivf, queries, args.k)
+            label = f"ivfpq nprobe={nprobe} rerank={rerank}"
+            print(f"{label:<28}{recall_at_k(exact, approx, args.k):>10.3f}{ivf_ms:>12.2f}")
+        print(f"  (build {build_s:.1f}s)")
+
+if __name__ == "__main__":
+    main()
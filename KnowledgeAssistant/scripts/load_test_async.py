@@ -0,0 +1,121 @@
+# scripts/load_test_async.py
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+
+EMBED_DIM = 64
+
+def fake_upstream(latency: float) -> FastAPI:
+    """
+    Minimal stand-in for the OpenAI API that answers after `latency` seconds.
+
+    Embeddings are a shared base direction plus text-seeded noise, so every
+    question matches the uploaded document but no two questions share a cached answer.
+    """
+
+    upstream = FastAPI()
+    base = np.ones(EMBED_DIM, dtype=np.float32)
+
+    def embed(text: str) -> list:
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:4], "little")
+        noise = np.random.default_rng(seed).standard_normal(EMBED_DIM).astype(np.float32)
+        return (base + 0.35 * np.linalg.norm(base) * noise / np.linalg.norm(noise)).tolist()
+
+    @upstream.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        return {
+            "object": "list",
+            "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": embed(text)} for i, text in enumerate(body["input"])],
+            "usage": {"prompt_tokens": 1, "total_tokens": 1},
+        }
+
+    @upstream.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        await asyncio.sleep(latency)
+        return {
+            "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "Fake answer."}}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+    return upstream
+
+def start_upstream(latency: float) -> str:
+    """
+    Serve the fake upstream on a free localhost port in a background thread.
+    """
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(fake_upstream(latency), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+async def run(args):
+    # Point the backend at a throwaway database and the fake upstream before importing it.
+    os.environ["OPENAI_BASE_URL"] = start_upstream(args.latency)
+    os.environ.setdefault("OPENAI_API_KEY", "load-test")
+    workdir = tempfile.mkdtemp()
+    import backend.db as db
+    db.DATABASE_PATH = os.path.join(workdir, "knowledge.db")
+    db.INDEX_DIR = workdir
+    from backend.app import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=60) as api:
+        await api.post("/auth/register", json={"username": "load", "password": "test"})
+        token = (await api.post("/auth/login", json={"username": "load", "password": "test"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        await api.post("/knowledge/upload", json={"content": "The load test document describes the quarterly release process."}, headers=headers)
+
+        async def ask(i: int) -> float:
+            start = time.perf_counter()
+            response = await api.post("/knowledge/ask-question", json={"question": f"Question number {i}?"}, headers=headers)
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        # Each ask makes two upstream calls (embedding + completion).
+        print(f"Fake upstream latency: {args.latency * 1000:.0f} ms per call, {args.requests} requests\n")
+        for concurrency in (1, args.requests):
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def limited(i: int) -> float:
+                async with semaphore:
+                    return await ask(i + concurrency * 1000)
+
+            start = time.perf_counter()
+            latencies = await asyncio.gather(*(limited(i) for i in range(args.requests)))
+            wall = time.perf_counter() - start
+            print(f"concurrency={concurrency:<4} wall={wall:6.2f}s  mean latency={np.mean(latencies) * 1000:7.1f} ms  "
+                  f"overlap={sum(latencies) / wall:5.1f}x  throughput={args.requests / wall:6.1f} req/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Show that concurrent ask-question requests overlap on the event loop.")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake upstream latency per call in seconds.")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
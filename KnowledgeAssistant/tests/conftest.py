@@ -0,0 +1,63 @@
+# tests/conftest.py
+
+import os
+import sys
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The OpenAI client is created at import time; tests never reach the network.
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+
+class StubEmbeddings:
+    """ Stand-in for `client.embeddings`: deterministic vectors, records every request's inputs. """
+
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    async def create(self, input, model):
+        self.calls.append(list(input))
+        if self.fail:
+            raise RuntimeError("upstream unavailable")
+        data = [type("Item", (), {"index": i, "embedding": stub_embedding(text)}) for i, text in enumerate(input)]
+        return type("Response", (), {"data": data, "usage": None})
+
+
+class StubClient:
+    def __init__(self, fail: bool = False):
+        self.embeddings = StubEmbeddings(fail)
+
+
+def stub_embedding(text: str, dim: int = 8) -> list:
+    """ A fixed pseudo-random vector per text. """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    return np.random.default_rng(seed).standard_normal(dim).tolist()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """ A fresh knowledge database and index directory under `tmp_path`. """
+    from backend import db
+    monkeypatch.setattr(db, "DATABASE_PATH", str(tmp_path / "knowledge.db"))
+    monkeypatch.setattr(db, "INDEX_DIR", str(tmp_path))
+    db.document_shards.clear()
+    assert db.init_db()
+    yield db
+    db.document_shards.clear()
+
+
+@pytest.fixture
+def stub_client(tmp_path, monkeypatch):
+    """ Replace the OpenAI client used for embeddings, with an empty embedding cache in front of it. """
+    from backend import openai_utils
+    from backend.embedding_cache import EmbeddingCache
+    client = StubClient()
+    monkeypatch.setattr(openai_utils, "client", client)
+    monkeypatch.setattr(openai_utils, "embedding_cache", EmbeddingCache(str(tmp_path / "embeddings.db")))
+    return client
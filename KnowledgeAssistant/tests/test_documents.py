@@ -0,0 +1,136 @@
+# tests/test_documents.py
+
+import asyncio
+
+import pytest
+
+from backend.db import (
+    DocumentChanged, DuplicateDocument, content_hash, delete_document, find_duplicate_documents, get_document,
+    get_document_chunks, load_document_shard, owner_partition, save_documents, update_document
+)
+from backend.ingest import embed_documents, reembed_document
+from backend.openai_utils import EmbeddingError
+from conftest import StubClient
+
+
+def paragraph(word: str) -> str:
+    return " ".join(f"{word}{i}." for i in range(250))
+
+ORIGINAL = "\n\n".join([paragraph("alpha"), paragraph("beta"), paragraph("gamma")])
+EDITED = "\n\n".join([paragraph("alpha"), paragraph("beta"), paragraph("delta")])
+
+
+def store(content: str, user_id=None) -> int:
+    (embedded,), errors = asyncio.run(embed_documents([content]))
+    assert not errors
+    doc_embedding, chunks = embedded
+    return save_documents([(content, doc_embedding, user_id, chunks)])[0]
+
+def reembed(content: str, doc_id: int):
+    return asyncio.run(reembed_document(content, get_document_chunks(doc_id)))
+
+def indexed_ids(db) -> set:
+    return {int(i) for i in db.document_shards.shard(owner_partition(None)).ids()}
+
+def chunk_ids(doc_id: int) -> set:
+    return {chunk["id"] for chunk in get_document_chunks(doc_id)}
+
+
+def test_identical_content_is_stored_once(database, stub_client):
+    doc_id = store(ORIGINAL)
+
+    assert find_duplicate_documents(None, ["  " + ORIGINAL + "\n"]) == {0: doc_id}
+    assert store(ORIGINAL) == doc_id
+    assert find_duplicate_documents(None, [EDITED]) == {}
+
+
+def test_update_only_embeds_changed_chunks(database, stub_client):
+    doc_id = store(ORIGINAL)
+    before = get_document_chunks(doc_id)
+    stub_client.embeddings.calls.clear()
+
+    embedding, kept, added = reembed(EDITED, doc_id)
+
+    assert kept and added
+    sent = [text for call in stub_client.embeddings.calls for text in call]
+    assert sorted(sent) == sorted(chunk.content for chunk, _ in added)
+    assert {chunk_id for chunk_id, _ in kept} <= {chunk["id"] for chunk in before}
+
+    removed_ids, added_ids = update_document(doc_id, EDITED, embedding, kept, added, content_hash(ORIGINAL))
+
+    after = get_document_chunks(doc_id)
+    assert [chunk["chunk_index"] for chunk in after] == list(range(len(kept) + len(added)))
+    assert "delta0." in " ".join(chunk["content"] for chunk in after)
+    assert get_document(doc_id)["content"] == EDITED
+    assert not set(removed_ids) & chunk_ids(doc_id)
+    assert indexed_ids(database) == chunk_ids(doc_id)
+
+
+def test_update_to_another_documents_content_is_a_duplicate(database, stub_client):
+    doc_id = store(ORIGINAL)
+    other_id = store(EDITED)
+
+    embedding, kept, added = reembed(EDITED, doc_id)
+    with pytest.raises(DuplicateDocument) as error:
+        update_document(doc_id, EDITED, embedding, kept, added, content_hash(ORIGINAL))
+
+    assert error.value.document_id == other_id
+    assert get_document(doc_id)["content"] == ORIGINAL
+
+
+def test_update_based_on_a_stale_read_is_rejected(database, stub_client):
+    doc_id = store(ORIGINAL)
+    stale = reembed(EDITED, doc_id)
+
+    # Another request rewrites the document first, replacing the chunks `stale` keeps.
+    third = "\n\n".join([paragraph("epsilon"), paragraph("zeta")])
+    embedding, kept, added = reembed(third, doc_id)
+    update_document(doc_id, third, embedding, kept, added, content_hash(ORIGINAL))
+    current = chunk_ids(doc_id)
+
+    with pytest.raises(DocumentChanged):
+        update_document(doc_id, EDITED, *stale, content_hash(ORIGINAL))
+
+    assert get_document(doc_id)["content"] == third
+    assert chunk_ids(doc_id) == current
+
+
+def test_deleted_chunks_stay_deleted_after_reload(database, stub_client):
+    kept_id = store(ORIGINAL)
+    deleted_id = store(EDITED)
+    deleted_chunks = chunk_ids(deleted_id)
+
+    # Snapshot the shard while both documents are indexed.
+    database.document_shards.shard(owner_partition(None))
+    database.document_shards.save_all()
+    assert deleted_chunks <= indexed_ids(database)
+
+    # Deleting does not rewrite the snapshot; a restart must still drop the chunks.
+    assert delete_document(deleted_id)
+    assert not deleted_chunks & indexed_ids(database)
+    database.document_shards.clear()
+
+    shard = load_document_shard(owner_partition(None))
+    assert {int(i) for i in shard.index.ids()} == chunk_ids(kept_id)
+    assert shard.unsaved == len(deleted_chunks)
+
+
+def test_deleting_from_an_unloaded_shard_does_not_load_it(database, stub_client):
+    doc_id = store(ORIGINAL)
+    database.document_shards.clear()
+
+    assert delete_document(doc_id)
+    assert owner_partition(None) not in database.document_shards
+    assert indexed_ids(database) == set()
+
+
+def test_embedding_errors_are_typed(database, stub_client, monkeypatch):
+    from backend import openai_utils
+    doc_id = store(ORIGINAL)
+
+    with pytest.raises(ValueError):
+        reembed("   ", doc_id)
+
+    monkeypatch.setattr(openai_utils, "client", StubClient(fail=True))
+    with pytest.raises(EmbeddingError):
+        reembed(EDITED, doc_id)
@@ -0,0 +1,113 @@
+# tests/test_embedding_cache.py
+
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from backend import openai_utils
+from backend.embedding_cache import EmbeddingCache, cache_key
+from conftest import stub_embedding
+
+MODEL = "text-embedding-ada-002"
+
+
+@pytest.fixture
+def cache(stub_client, tmp_path, monkeypatch):
+    """ A small cache (two memory entries) behind `get_embeddings`. """
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_memory_entries=2)
+    monkeypatch.setattr(openai_utils, "embedding_cache", cache)
+    return cache
+
+
+def embed(texts):
+    embeddings, errors = asyncio.run(openai_utils.get_embeddings(texts))
+    assert not errors
+    return embeddings
+
+
+def test_repeated_texts_are_memory_hits(cache, stub_client):
+    first = embed(["alpha", "beta"])
+    second = embed(["alpha", "beta"])
+
+    assert stub_client.embeddings.calls == [["alpha", "beta"]]
+    assert np.allclose(first, second)
+    assert cache.stats()["memory_hits"] == 2
+
+
+def test_evicted_texts_are_disk_hits(cache, stub_client):
+    embed(["alpha", "beta", "gamma"])  # Two memory entries: "alpha" drops out of the LRU.
+    assert cache_key("alpha", MODEL) not in cache._memory
+
+    (alpha,) = embed(["alpha"])
+
+    assert len(stub_client.embeddings.calls) == 1
+    assert np.allclose(alpha, stub_embedding("alpha"), atol=1e-6)
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 0
+
+
+def test_new_texts_are_misses(cache, stub_client):
+    embed(["alpha"])
+    embed(["alpha", "delta"])
+
+    assert stub_client.embeddings.calls == [["alpha"], ["delta"]]
+    stats = cache.stats()
+    assert stats["misses"] == 2
+    assert stats["hit_ratio"] == pytest.approx(1 / 3)
+
+
+def test_normalized_text_shares_an_entry(cache, stub_client):
+    embed(["alpha  beta"])
+    embed([" alpha beta\n"])
+
+    assert len(stub_client.embeddings.calls) == 1
+
+
+def test_disk_tier_stays_within_budget(tmp_path):
+    # Eight float32 values per entry: room for ten entries.
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_memory_entries=1, max_disk_bytes=10 * 32)
+    cache.put_many([f"text {i}" for i in range(25)], MODEL, [stub_embedding(str(i)) for i in range(25)])
+
+    stats = cache.stats()
+    assert stats["evictions"] > 0
+    assert stats["disk_bytes"] <= 10 * 32
+    assert cache.get("text 24", MODEL) is not None
+    assert cache.get("text 0", MODEL) is None
+
+
+def test_concurrent_writers_keep_disk_size_exact(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_memory_entries=4, max_disk_bytes=40 * 32)
+
+    def work(worker):
+        for i in range(30):
+            cache.put_many([f"{worker}-{i}", "shared"], MODEL, [stub_embedding(f"{worker}-{i}"), stub_embedding("shared")])
+            cache.get_many([f"{worker}-{i}", "shared"], MODEL)
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    conn = cache._connect()
+    stored = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM embedding_cache").fetchone()[0]
+    assert cache.stats()["disk_bytes"] == stored
+    assert stored <= 40 * 32
+
+
+def test_lookups_do_not_write(cache, stub_client):
+    embed(["alpha", "beta", "gamma"])
+    conn = cache._connect()
+    before = conn.execute("SELECT last_used FROM embedding_cache WHERE key = ?", (cache_key("alpha", MODEL),)).fetchone()[0]
+
+    embed(["alpha"])
+    after = conn.execute("SELECT last_used FROM embedding_cache WHERE key = ?", (cache_key("alpha", MODEL),)).fetchone()[0]
+    assert after == before
+
+    # The hit's time is written with the next store.
+    embed(["delta"])
+    written = conn.execute("SELECT last_used FROM embedding_cache WHERE key = ?", (cache_key("alpha", MODEL),)).fetchone()[0]
+    assert written > before
@@ -0,0 +1,165 @@
+# tests/test_vector_index.py
+
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from backend.vector_index import FlatIndex, IVFPQIndex, Shard, ShardedIndex, create_index
+
+
+def random_vectors(count: int, dim: int = 32, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+
+def exact_top(vectors: np.ndarray, query: np.ndarray, k: int) -> list:
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    return [int(i) + 1 for i in np.argsort(-scores)[:k]]
+
+def small_ivfpq() -> IVFPQIndex:
+    return IVFPQIndex(nlist=8, nprobe=4, m=8, rerank=4, train_size=256)
+
+
+# === Flat index ===
+def test_flat_search_is_exact_cosine():
+    vectors = random_vectors(200)
+    index = FlatIndex()
+    index.add_many(range(1, 201), vectors)
+    query = random_vectors(1, seed=1)[0]
+
+    hits = index.search(query, k=5)
+
+    assert [doc_id for doc_id, _ in hits] == exact_top(vectors, query, 5)
+    assert index.search(vectors[41], k=1)[0] == (42, pytest.approx(1.0, abs=1e-5))
+    assert all(a[1] >= b[1] for a, b in zip(hits, hits[1:]))
+
+def test_flat_remove_and_ids():
+    index = FlatIndex()
+    index.add_many(range(1, 11), random_vectors(10))
+
+    assert index.remove([3, 7, 99]) == 2
+    assert sorted(index.ids().tolist()) == [1, 2, 4, 5, 6, 8, 9, 10]
+    assert index.max_id() == 10
+    assert 3 not in [doc_id for doc_id, _ in index.search(random_vectors(1, seed=3)[0], k=10)]
+
+def test_flat_rejects_other_dimensions():
+    index = FlatIndex()
+    index.add_many([1], random_vectors(1, dim=8))
+    with pytest.raises(ValueError):
+        index.add_many([2], random_vectors(1, dim=16))
+
+def test_flat_search_pairs_ids_with_scores_during_concurrent_removes():
+    # One-hot vectors: only id j can score 1.0 against the query for j.
+    dim = 64
+    eye = np.eye(dim, dtype=np.float32)
+    index = FlatIndex()
+    index.add_many(range(1, dim + 1), eye)
+    stop = threading.Event()
+
+    def rotate():
+        # Moving the first row to the end shifts every other row in the buffer.
+        while not stop.is_set():
+            first = int(index.ids()[0])
+            index.remove([first])
+            index.add_many([first], eye[[first - 1]])
+
+    # Switch threads often so a read outside the lock would overlap a remove.
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target=rotate)
+    thread.start()
+    try:
+        for _ in range(2000):
+            for j in (2, 32, 64):
+                doc_id, score = index.search(eye[j - 1], k=1)[0]
+                assert doc_id == j or score < 0.5  # Row j may be mid-rotation.
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+
+
+# === IVF-PQ index ===
+def test_ivfpq_recall_against_exact_search():
+    vectors = random_vectors(2000)
+    index = small_ivfpq()
+    index.add_many(range(1, 2001), vectors)
+    assert index.is_trained and len(index) == 2000
+
+    queries = random_vectors(50, seed=2)
+    recall = np.mean([
+        len(set(doc_id for doc_id, _ in index.search(query, k=10)) & set(exact_top(vectors, query, 10))) / 10
+        for query in queries
+    ])
+    assert recall >= 0.8
+
+def test_ivfpq_is_exact_until_trained():
+    vectors = random_vectors(100)
+    index = small_ivfpq()
+    index.add_many(range(1, 101), vectors)
+    query = random_vectors(1, seed=4)[0]
+
+    assert not index.is_trained
+    assert [doc_id for doc_id, _ in index.search(query, k=5)] == exact_top(vectors, query, 5)
+
+def test_ivfpq_remove_and_ids():
+    index = small_ivfpq()
+    index.add_many(range(1, 401), random_vectors(400))
+
+    assert index.remove(range(1, 401, 2)) == 200
+    assert sorted(index.ids().tolist()) == list(range(2, 401, 2))
+    assert all(doc_id % 2 == 0 for doc_id, _ in index.search(random_vectors(1, seed=5)[0], k=20))
+
+@pytest.mark.parametrize("backend", ["flat", "ivfpq"])
+def test_save_and_load_round_trip(tmp_path, backend):
+    params = {} if backend == "flat" else {"nlist": 8, "nprobe": 4, "m": 8, "rerank": 4, "train_size": 256}
+    index = create_index(backend, **params)
+    index.add_many(range(1, 601), random_vectors(600))
+    index.remove([5, 6])
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+
+    restored = create_index(backend, **params)
+    assert restored.load(path)
+    query = random_vectors(1, seed=6)[0]
+    assert restored.search(query, k=10) == index.search(query, k=10)
+    assert sorted(restored.ids().tolist()) == sorted(index.ids().tolist())
+    assert not create_index("flat" if backend == "ivfpq" else "ivfpq").load(path)
+
+
+# === Sharded index ===
+def make_sharded(sources: dict, saved: list, save_every: int = 3) -> ShardedIndex:
+    def loader(key):
+        index = FlatIndex()
+        ids, vectors = sources[key]
+        index.add_many(ids, vectors)
+        return Shard(index=index, loaded_through=max(ids), last_used=0.0)
+
+    return ShardedIndex(loader, lambda key, shard: saved.append(key), save_every=save_every)
+
+def test_sharded_search_merges_partitions():
+    vectors = random_vectors(20)
+    sources = {"a": (list(range(1, 11)), vectors[:10]), "b": (list(range(11, 21)), vectors[10:])}
+    sharded = make_sharded(sources, [])
+    query = random_vectors(1, seed=7)[0]
+
+    hits = sharded.search(["a", "b"], query, k=5)
+
+    assert [doc_id for doc_id, _ in hits] == exact_top(vectors, query, 5)
+    assert sharded.size(["a", "b"]) == 20
+
+def test_sharded_updates_only_touch_loaded_shards():
+    vectors = random_vectors(10)
+    saved = []
+    sharded = make_sharded({"a": ([1, 2, 3], vectors[:3])}, saved)
+
+    sharded.add_many("a", [4], vectors[3:4])
+    sharded.remove("a", [1])
+    assert "a" not in sharded
+
+    sharded.shard("a")
+    sharded.add_many("a", [4, 5], vectors[3:5])
+    sharded.remove("a", [1])
+    assert sorted(sharded.shard("a").ids().tolist()) == [2, 3, 4, 5]
+    assert saved == ["a"]  # Two inserts and a removal reach save_every.
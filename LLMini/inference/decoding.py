@@ -0,0 +1,311 @@
+# inference/decoding.py
+
+from pathlib import Path
+import tensorflow as tf
+from model.transformer import MiniGPT
+from inference.sampling import sample_tokens, seen_tokens
+from utils.config import *
+
+def load_model(weights_path=WEIGHTS_PATH, context_size=MAX_SEQUENCE_LENGTH):
+    """
+    Build MiniGPT and load trained weights once.
+
+    Args:
+        weights_path: weights saved by training/train.py (skipped with a warning if missing).
+        context_size: longest sequence the model accepts.
+    """
+
+    model = MiniGPT(VOCAB_SIZE, context_size, EMBED_DIM, NUM_HEADS, FFN_DIM, NUM_LAYERS)
+    model(tf.zeros((1, 1), dtype=tf.int32))  # Create the weights before loading them.
+    if weights_path and Path(weights_path).exists():
+        model.load_weights(weights_path)
+    else:
+        print(f"Warning: no weights at {weights_path}; the model is untrained.")
+    return model
+
+def greedy_decode(model, tokens, max_tokens, max_length, eos_id=None):
+    """
+    Greedy decoding that re-runs the model over the whole sequence for every
+    new token (O(n^2) work; kept as the reference for the cached decoder).
+
+    Args:
+        model: a MiniGPT model.
+        tokens: prompt token ids (list of int).
+        max_tokens: the maximum number of new tokens.
+        max_length: the longest sequence the model accepts.
+        eos_id: stop after generating this token (optional).
+
+    Returns:
+        Prompt and generated token ids as a list of int.
+    """
+
+    input_tokens = tf.convert_to_tensor([tokens[:max_length]], dtype=tf.int32)
+
+    for _ in range(max_tokens):
+        if input_tokens.shape[1] >= max_length:
+            break
+
+        predictions = model(input_tokens, training=False)
+        next_token_id = tf.argmax(predictions[:, -1, :], axis=-1, output_type=tf.int32)
+        input_tokens = tf.concat([input_tokens, tf.expand_dims(next_token_id, axis=1)], axis=1)
+        if int(next_token_id[0]) == eos_id:
+            break
+
+    return input_tokens.numpy()[0].tolist()
+
+def greedy_decode_cached(model, tokens, max_tokens, max_length, eos_id=None):
+    """
+    Greedy decoding with a key/value cache: the prompt is processed once,
+    then each step runs the model on the newest token only.
+
+    Same arguments and result as greedy_decode.
+    """
+
+    tokens = list(tokens[:max_length])
+    if len(tokens) >= max_length or max_tokens <= 0:
+        return tokens
+
+    # Prefill: one pass over the prompt builds every block's cache.
+    logits, past = model.call_with_cache(tf.convert_to_tensor([tokens], dtype=tf.int32))
+
+    for step in range(max_tokens):
+        next_token_id = tf.argmax(logits[:, -1, :], axis=-1, output_type=tf.int32)
+        tokens.append(int(next_token_id[0]))
+        if len(tokens) >= max_length or step == max_tokens - 1 or tokens[-1] == eos_id:
+            break
+
+        logits, past = model.call_with_cache(tf.expand_dims(next_token_id, axis=1), past)
+
+    return tokens
+
+def compile_decoder(model, max_length, jit_compile=False):
+    """
+    Build a compiled decoder with fixed shapes (greedy or sampled).
+
+    Tokens live in a preallocated (batch, max_length) buffer and the key/value
+    cache in fixed (batch, max_length, ...) tensors, so every step has the
+    same shapes: the loop is traced once and runs as a single graph
+    (optionally XLA-compiled, which specializes per batch size) without
+    per-token Python dispatch. Each step picks every row's next token with
+    one batched call of inference.sampling.sample_tokens.
+
+    Args:
+        model: a MiniGPT model.
+        max_length: buffer length (at most the model's context size).
+        jit_compile: compile the loop with XLA.
+
+    Returns:
+        decode(prompts, max_tokens, eos_id=None, pad_id=0, temperature=0.0,
+        top_k=0, top_p=1.0, repetition_penalty=1.0, seed=None) -> list of
+        token id lists, one per prompt, each stopping after eos_id or
+        max_tokens new tokens. max_tokens and the sampling settings are one
+        value for all prompts or one per prompt; temperature 0 is greedy.
+        Prompts are right-padded with pad_id. The same seed and batch give
+        the same tokens.
+    """
+
+    @tf.function(jit_compile=jit_compile, input_signature=[
+        tf.TensorSpec([None, max_length], tf.int32),   # buffer
+        tf.TensorSpec([None], tf.int32),               # lengths
+        tf.TensorSpec([None], tf.int32),               # max_tokens
+        tf.TensorSpec([], tf.int32),                   # eos_id
+        tf.TensorSpec([None], tf.float32),             # temperature
+        tf.TensorSpec([None], tf.int32),               # top_k
+        tf.TensorSpec([None], tf.float32),             # top_p
+        tf.TensorSpec([None], tf.float32),             # repetition_penalty
+        tf.TensorSpec([2], tf.int32),                  # seed
+    ])
+    def decode_loop(buffer, lengths, max_tokens, eos_id, temperature, top_k, top_p, repetition_penalty, seed):
+        # Prefill: one causal pass over the padded buffer. Padding after a
+        # prompt is never attended to (each row masks keys past its own
+        # position) and its cache slots get overwritten as the row grows.
+        logits, cache = model.call_with_cache(buffer)
+        last = tf.gather(logits, lengths - 1, batch_dims=1)
+        end = tf.minimum(lengths + max_tokens, max_length)
+        vocab_size = logits.shape[-1]
+        seen = seen_tokens(buffer, lengths, vocab_size)
+
+        def step(i, positions, last, buffer, cache, seen, done):
+            step_seed = tf.random.experimental.stateless_fold_in(seed, i)
+            token = sample_tokens(last, seen, temperature, top_k, top_p, repetition_penalty, step_seed)
+            write = tf.logical_and(
+                tf.equal(tf.range(max_length)[tf.newaxis, :], positions[:, tf.newaxis]),
+                tf.logical_not(done)[:, tf.newaxis]
+            )
+            buffer = tf.where(write, token[:, tf.newaxis], buffer)
+            seen = seen | tf.cast(tf.one_hot(token, vocab_size), tf.bool)
+
+            next_positions = tf.where(done, positions, positions + 1)
+            done = done | tf.equal(token, eos_id) | (next_positions >= end)
+
+            # Skip the forward pass once every row has finished.
+            last, cache = tf.cond(
+                tf.reduce_all(done),
+                lambda: (last, cache),
+                lambda: _squeeze_logits(model.call_at_position(
+                    token[:, tf.newaxis], cache, tf.minimum(positions, max_length - 1)))
+            )
+            return i + 1, next_positions, last, buffer, cache, seen, done
+
+        _, _, _, buffer, _, _, _ = tf.while_loop(
+            lambda i, positions, last, buffer, cache, seen, done: tf.logical_not(tf.reduce_all(done)),
+            step,
+            (tf.constant(0), lengths, last, buffer, cache, seen, lengths >= end),
+        )
+        return buffer
+
+    def decode(prompts, max_tokens, eos_id=None, pad_id=0, temperature=0.0, top_k=0, top_p=1.0,
+               repetition_penalty=1.0, seed=None):
+        prompts = [list(prompt[:max_length]) or [pad_id] for prompt in prompts]
+        lengths = [len(prompt) for prompt in prompts]
+        limits = per_prompt(max_tokens, len(prompts))
+        buffer = [prompt + [pad_id] * (max_length - len(prompt)) for prompt in prompts]
+
+        output = decode_loop(
+            tf.constant(buffer, dtype=tf.int32),
+            tf.constant(lengths, dtype=tf.int32),
+            tf.constant(limits, dtype=tf.int32),
+            tf.constant(-1 if eos_id is None else eos_id, dtype=tf.int32),
+            tf.constant(per_prompt(temperature, len(prompts)), dtype=tf.float32),
+            tf.constant(per_prompt(top_k, len(prompts)), dtype=tf.int32),
+            tf.constant(per_prompt(top_p, len(prompts)), dtype=tf.float32),
+            tf.constant(per_prompt(repetition_penalty, len(prompts)), dtype=tf.float32),
+            make_seed(seed),
+        ).numpy()
+
+        return [trim(row, length, limit, max_length, eos_id) for row, length, limit in zip(output, lengths, limits)]
+
+    return decode
+
+def compile_beam_search(model, max_length, num_beams=4, jit_compile=False):
+    """
+    Build a compiled beam search decoder with fixed shapes.
+
+    Every prompt keeps `num_beams` hypotheses as rows of one
+    (batch * num_beams, ...) buffer and cache. Each step scores all
+    num_beams * vocab continuations of a prompt at once, keeps the best
+    num_beams with one top_k, and reorders the buffer and cache rows with
+    a single gather. Finished beams (eos) carry their score forward unchanged.
+
+    Args:
+        model: a MiniGPT model.
+        max_length: buffer length (at most the model's context size).
+        num_beams: hypotheses kept per prompt.
+        jit_compile: compile the loop with XLA.
+
+    Returns:
+        decode(prompts, max_tokens, eos_id=None, pad_id=0, length_penalty=1.0)
+        -> the best hypothesis per prompt, ranked by log probability divided
+        by (generated length ** length_penalty).
+    """
+
+    @tf.function(jit_compile=jit_compile, input_signature=[
+        tf.TensorSpec([None, max_length], tf.int32),   # buffer
+        tf.TensorSpec([None], tf.int32),               # lengths
+        tf.TensorSpec([None], tf.int32),               # max_tokens
+        tf.TensorSpec([], tf.int32),                   # eos_id
+        tf.TensorSpec([], tf.float32),                 # length_penalty
+    ])
+    def search(buffer, lengths, max_tokens, eos_id, length_penalty):
+        batch = tf.shape(buffer)[0]
+
+        # Prefill once per prompt, then copy the cache to every beam.
+        logits, cache = model.call_with_cache(buffer)
+        last = tf.repeat(tf.gather(logits, lengths - 1, batch_dims=1), num_beams, axis=0)
+        cache = tf.nest.map_structure(lambda t: tf.repeat(t, num_beams, axis=0), cache)
+        buffer = tf.repeat(buffer, num_beams, axis=0)
+        positions = tf.repeat(lengths, num_beams)
+        end = tf.repeat(tf.minimum(lengths + max_tokens, max_length), num_beams)
+        vocab_size = logits.shape[-1]
+
+        # All beams start identical, so only the first one may expand on the first step.
+        scores = tf.tile(tf.concat([[0.0], tf.fill([num_beams - 1], float("-inf"))], 0)[tf.newaxis, :], [batch, 1])
+        scores = tf.reshape(scores, [-1])
+        finished = tf.zeros_like(positions, dtype=tf.bool)
+        generated = tf.zeros_like(positions)
+
+        def step(positions, last, buffer, cache, scores, finished, generated):
+            done = finished | (positions >= end)
+            log_probs = tf.nn.log_softmax(last, axis=-1)
+            # A done beam has exactly one continuation (itself, unchanged score).
+            keep_only = tf.where(tf.range(vocab_size) == 0, 0.0, float("-inf"))
+            log_probs = tf.where(done[:, tf.newaxis], keep_only[tf.newaxis, :], log_probs)
+
+            candidates = tf.reshape(scores[:, tf.newaxis] + log_probs, [batch, num_beams * vocab_size])
+            top_scores, top_ids = tf.math.top_k(candidates, k=num_beams)
+            source = tf.reshape(top_ids // vocab_size + tf.range(batch)[:, tf.newaxis] * num_beams, [-1])
+            token = tf.reshape(top_ids % vocab_size, [-1])
+
+            # Reorder every per-beam tensor to follow its parent hypothesis.
+            buffer, cache, positions, finished, generated = tf.nest.map_structure(
+                lambda t: tf.gather(t, source), (buffer, cache, positions, finished, generated))
+            done = tf.gather(done, source)
+
+            write = tf.logical_and(
+                tf.equal(tf.range(max_length)[tf.newaxis, :], positions[:, tf.newaxis]),
+                tf.logical_not(done)[:, tf.newaxis]
+            )
+            buffer = tf.where(write, token[:, tf.newaxis], buffer)
+            generated = tf.where(done, generated, generated + 1)
+            finished = finished | (tf.logical_not(done) & tf.equal(token, eos_id))
+            next_positions = tf.where(done, positions, positions + 1)
+
+            all_done = tf.reduce_all(finished | (next_positions >= end))
+            last, cache = tf.cond(
+                all_done,
+                lambda: (last, cache),
+                lambda: _squeeze_logits(model.call_at_position(
+                    token[:, tf.newaxis], cache, tf.minimum(positions, max_length - 1)))
+            )
+            return next_positions, last, buffer, cache, tf.reshape(top_scores, [-1]), finished, generated
+
+        positions, _, buffer, _, scores, _, generated = tf.while_loop(
+            lambda positions, last, buffer, cache, scores, finished, generated:
+                tf.logical_not(tf.reduce_all(finished | (positions >= end))),
+            step,
+            (positions, last, buffer, cache, scores, finished, generated),
+        )
+
+        normalized = scores / tf.pow(tf.maximum(tf.cast(generated, tf.float32), 1.0), length_penalty)
+        best = tf.argmax(tf.reshape(normalized, [batch, num_beams]), axis=-1, output_type=tf.int32)
+        rows = best + tf.range(batch) * num_beams
+        return tf.gather(buffer, rows), tf.gather(positions, rows)
+
+    def decode(prompts, max_tokens, eos_id=None, pad_id=0, length_penalty=1.0):
+        prompts = [list(prompt[:max_length]) or [pad_id] for prompt in prompts]
+        lengths = [len(prompt) for prompt in prompts]
+        limits = per_prompt(max_tokens, len(prompts))
+        buffer = [prompt + [pad_id] * (max_length - len(prompt)) for prompt in prompts]
+
+        output, ends = search(
+            tf.constant(buffer, dtype=tf.int32),
+            tf.constant(lengths, dtype=tf.int32),
+            tf.constant(limits, dtype=tf.int32),
+            tf.constant(-1 if eos_id is None else eos_id, dtype=tf.int32),
+            tf.constant(length_penalty, dtype=tf.float32),
+        )
+        return [row[:end].tolist() for row, end in zip(output.numpy(), ends.numpy())]
+
+    return decode
+
+# === Helper Functions ===
+def per_prompt(value, count):
+    """ A setting given once for all prompts or as one value per prompt, as a list. """
+    return list(value) if isinstance(value, (list, tuple)) else [value] * count
+
+def make_seed(seed=None):
+    """ Stateless RNG seed; None draws a fresh one. """
+    if seed is None:
+        seed = int(tf.random.uniform([], maxval=2**31 - 1, dtype=tf.int32))
+    return tf.constant([seed, 0], dtype=tf.int32)
+
+def trim(row, length, limit, max_length, eos_id):
+    """ Prompt plus generated tokens of one buffer row, cut after eos_id. """
+    tokens = row[:min(length + limit, max_length)].tolist()
+    if eos_id is not None and eos_id in tokens[length:]:
+        tokens = tokens[:tokens.index(eos_id, length) + 1]
+    return tokens
+
+def _squeeze_logits(result):
+    logits, cache = result
+    return logits[:, -1, :], cache
@@ -4,9 +4,9 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
-import tensorflow as tf
-from model.transformer import MiniGPT
 from tokenizer.tokenization import BPETokenizer
+from inference.decoding import compile_beam_search, compile_decoder, greedy_decode, greedy_decode_cached, load_model
+from inference.quantization import QuantizedModel
 from utils.config import *
 
 # === Load Tokenizer ===
@@ -14,37 +14,57 @@ tokenizer = BPETokenizer()
 tokenizer.load("tokenizer.json")
 
 # === Load Model ===
-model = MiniGPT(VOCAB_SIZE, MAX_SEQUENCE_LENGTH, EMBED_DIM, NUM_HEADS, NUM_LAYERS)
+model = load_model(WEIGHTS_PATH)
 
-def generate_text(prompt, max_tokens = 50):
+# === Compiled Decoder (fixed-shape graph, traced on first use) ===
+compiled_decode = compile_decoder(model, MAX_SEQUENCE_LENGTH, jit_compile=GENERATE_JIT_COMPILE)
+beam_decoders = {}
+
+# === Quantized Model (loaded on first use; see scripts/quantize_model.py) ===
+quantized_models = {}
+
+def generate_text(prompt, max_tokens = 50, use_cache = True, compiled = True, temperature = 0.0,
+                  top_k = 0, top_p = 1.0, repetition_penalty = 1.0, num_beams = 1, seed = None, quantized = False):
     """
     Generate a resonse to a prompt.
 
     Args:
         prompt: string passed to model for response generation.
         max_tokens: the maximum number of tokens.
+        use_cache: reuse attention keys/values between steps instead of
+            re-running the model over the whole sequence.
+        compiled: run the cached loop as one compiled graph (use_cache only).
+        temperature: 0 for greedy decoding, > 0 to sample.
+        top_k: sample from the k most likely tokens only (0 disables).
+        top_p: sample from the smallest set of tokens with this much probability (1 disables).
+        repetition_penalty: > 1 makes tokens already in the text less likely.
+        num_beams: > 1 runs beam search instead of greedy decoding or sampling.
+        seed: integer seed; the same seed gives the same sampled text.
+        quantized: decode greedily with the quantized model at QUANTIZED_MODEL_PATH.
     """
 
     input_tokens = tokenizer.encode(prompt)
-    input_tokens = input_tokens[:MAX_SEQUENCE_LENGTH]
-    input_tokens = tf.convert_to_tensor([input_tokens], dtype=tf.int32)
-
-    for _ in range(max_tokens):
-
-        # Predict next token
-        predictions = model(input_tokens, training=False)
-        next_token_logits = predictions[:, -1, :]
-        next_token_id = tf.argmax(next_token_logits, axis=-1, output_type=tf.int32)
+    sampling = temperature > 0 or repetition_penalty != 1.0
+    if (sampling or num_beams > 1) and (quantized or not (use_cache and compiled)):
+        raise ValueError("Sampling and beam search need use_cache=True and compiled=True (and quantized=False).")
 
-        # Append predicted tokens to sequence
-        input_tokens = tf.concat([input_tokens, tf.expand_dims(next_token_id, axis=1)], axis=1)
+    # Predict tokens until <eos>, max_tokens or the sequence gets too long
+    if quantized:
+        if QUANTIZED_MODEL_PATH not in quantized_models:
+            quantized_models[QUANTIZED_MODEL_PATH] = QuantizedModel(QUANTIZED_MODEL_PATH)
+        generated_tokens = quantized_models[QUANTIZED_MODEL_PATH].generate(input_tokens, max_tokens, tokenizer.eos_id())
+    elif num_beams > 1:
+        if num_beams not in beam_decoders:
+            beam_decoders[num_beams] = compile_beam_search(model, MAX_SEQUENCE_LENGTH, num_beams, jit_compile=GENERATE_JIT_COMPILE)
+        generated_tokens = beam_decoders[num_beams]([input_tokens], max_tokens, tokenizer.eos_id(), tokenizer.pad_id())[0]
+    elif use_cache and compiled:
+        generated_tokens = compiled_decode([input_tokens], max_tokens, tokenizer.eos_id(), tokenizer.pad_id(),
+                                           temperature, top_k, top_p, repetition_penalty, seed)[0]
+    else:
+        decode = greedy_decode_cached if use_cache else greedy_decode
+        generated_tokens = decode(model, input_tokens, max_tokens, MAX_SEQUENCE_LENGTH, tokenizer.eos_id())
 
-        # Stop is sequence gets too long
-        if input_tokens.shape[1] >= MAX_SEQUENCE_LENGTH:
-            break
-    
     # Decode tokens back to text
-    generated_tokens = input_tokens.numpy().sequeeze().tolist()
     generated_text = tokenizer.decode(generated_tokens)
 
     return generated_text
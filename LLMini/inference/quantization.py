@@ -0,0 +1,201 @@
+# inference/quantization.py
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+try:
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:
+    Interpreter = tf.lite.Interpreter
+
+QUANTIZATION_MODES = ("float32", "float16", "int8")
+
+# A quantized model is one decode step of one sequence, exported to TFLite:
+#   (token (1, 1), position (1,), cache) -> (logits (1, vocab), cache)
+# where cache stacks every block's keys and values, [k0, v0, k1, v1, ...],
+# into one (2 * num_layers, max_length, heads, key_dim) tensor.
+
+def step_function(model, max_length):
+    """
+    Wrap model.call_at_position as a fixed-shape tf.function for export.
+
+    Args:
+        model: a built MiniGPT model.
+        max_length: cache length (the longest sequence the step accepts).
+    """
+
+    attn = model.blocks[0].attn.attn
+    cache_shape = (2 * len(model.blocks), max_length, attn.num_heads, attn.key_dim)
+
+    @tf.function(input_signature=[
+        tf.TensorSpec((1, 1), tf.int32, name="token"),
+        tf.TensorSpec((1,), tf.int32, name="position"),
+        tf.TensorSpec(cache_shape, tf.float32, name="cache"),
+    ])
+    def step(token, position, cache):
+        layers = [layer[tf.newaxis] for layer in tf.unstack(cache)]
+        cache = list(zip(layers[0::2], layers[1::2]))
+        logits, cache = model.call_at_position(token, cache, position)
+        return logits[:, 0, :], tf.concat([layer for kv in cache for layer in kv], axis=0)
+
+    return step
+
+def calibration_steps(model, windows, max_length, steps_per_window = 4, seed = 0):
+    """
+    Representative step inputs for int8 calibration.
+
+    Each window is run through the float model once to fill a realistic
+    cache; a few positions in it then become (token, position, cache) samples.
+
+    Args:
+        model: the float MiniGPT model.
+        windows: lists of token ids (e.g. from calibration_windows).
+        max_length: cache length of the exported step.
+        steps_per_window: positions sampled from each window.
+        seed: seed for the sampled positions.
+    """
+
+    rng = np.random.default_rng(seed)
+    for window in windows:
+        window = list(window[:max_length])
+        buffer = np.zeros((1, max_length), dtype=np.int32)
+        buffer[0, :len(window)] = window
+        _, cache = model.call_with_cache(tf.constant(buffer))
+        cache = tf.concat([layer for kv in cache for layer in kv], axis=0).numpy()
+
+        for position in rng.choice(len(window), size=min(steps_per_window, len(window)), replace=False):
+            yield [np.array([[window[position]]], dtype=np.int32), np.array([position], dtype=np.int32), cache]
+
+def calibration_windows(tokenizer, corpus_path, count, length, seed = 0):
+    """
+    Token windows from random places in a text corpus, without reading all of it.
+
+    Args:
+        tokenizer: a trained BPETokenizer.
+        corpus_path: the text file to draw from (e.g. data/corpus.txt).
+        count: number of windows.
+        length: tokens per window.
+        seed: seed for the file offsets.
+    """
+
+    rng = np.random.default_rng(seed)
+    texts = []
+    with open(corpus_path, "rb") as f:
+        size = f.seek(0, 2)
+        # Spare draws in case some land where there is too little text.
+        for _ in range(count * 4):
+            f.seek(int(rng.integers(0, max(1, size - 1))))
+            f.readline()  # Start at the next full line.
+            texts.append(f.read(length * 16).decode("utf-8", errors="ignore"))
+    windows = [tokens[:length] for tokens in tokenizer.encode_batch(texts) if len(tokens) >= 2]
+    return windows[:count]
+
+def quantize_model(model, max_length, mode = "int8", calibration = None):
+    """
+    Export one decode step of MiniGPT to TFLite, optionally quantized.
+
+    float16 stores the weights as float16. int8 stores per-channel int8
+    weights; with `calibration` (see calibration_steps) activations are
+    quantized too, using ranges observed on that data, and ops without an
+    int8 kernel stay in float.
+
+    Args:
+        model: a built MiniGPT model with trained weights.
+        max_length: cache length (the longest sequence the model handles).
+        mode: one of QUANTIZATION_MODES.
+        calibration: callable returning an iterator of step inputs (int8 only).
+
+    Returns:
+        The .tflite model as bytes.
+    """
+
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}; expected one of {QUANTIZATION_MODES}.")
+
+    # TFLite only freezes plain tf.Variables, so bake the Keras weights in as constants first.
+    frozen = convert_variables_to_constants_v2(step_function(model, max_length).get_concrete_function())
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([frozen], model)
+    if mode == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == "int8":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = calibration
+    return converter.convert()
+
+
+class QuantizedModel:
+    """
+    Runs an exported step model (see quantize_model) one token at a time.
+    """
+
+    def __init__(self, model, num_threads = None):
+        """
+        Args:
+            model: path to a .tflite file, or its bytes.
+            num_threads: CPU threads for the interpreter (None lets it decide).
+        """
+
+        content = model if isinstance(model, bytes) else None
+        path = None if content else str(model)
+        self.interpreter = Interpreter(model_path=path, model_content=content, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+
+        inputs = {detail["name"]: detail for detail in self.interpreter.get_input_details()}
+        self.token_input = next(inputs[name]["index"] for name in inputs if "token" in name)
+        self.position_input = next(inputs[name]["index"] for name in inputs if "position" in name)
+        cache = next(inputs[name] for name in inputs if "cache" in name)
+        self.cache_input = cache["index"]
+        self.cache_shape = tuple(cache["shape"])
+        self.max_length = self.cache_shape[1]
+
+        # Logits are (1, vocab); the cache output has the cache's shape.
+        outputs = self.interpreter.get_output_details()
+        self.logits_output = next(detail["index"] for detail in outputs if len(detail["shape"]) == 2)
+        self.cache_output = next(detail["index"] for detail in outputs if len(detail["shape"]) == 4)
+
+    def step(self, token, position, cache):
+        """ Logits for the token at `position`, and the cache with it written in. """
+        self.interpreter.set_tensor(self.token_input, np.array([[token]], dtype=np.int32))
+        self.interpreter.set_tensor(self.position_input, np.array([position], dtype=np.int32))
+        self.interpreter.set_tensor(self.cache_input, cache)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.logits_output)[0], self.interpreter.get_tensor(self.cache_output)
+
+    def empty_cache(self):
+        return np.zeros(self.cache_shape, dtype=np.float32)
+
+    def generate(self, tokens, max_tokens, eos_id = None):
+        """
+        Greedy decoding; same arguments and result as decoding.greedy_decode
+        (the model's cache length is the maximum sequence length).
+        """
+
+        tokens = list(tokens[:self.max_length])
+        if not tokens or len(tokens) >= self.max_length or max_tokens <= 0:
+            return tokens
+
+        # Prefill one token at a time; the last call gives the first new token's logits.
+        cache = self.empty_cache()
+        for position, token in enumerate(tokens):
+            logits, cache = self.step(token, position, cache)
+
+        for step in range(max_tokens):
+            tokens.append(int(np.argmax(logits)))
+            if len(tokens) >= self.max_length or step == max_tokens - 1 or tokens[-1] == eos_id:
+                break
+            logits, cache = self.step(tokens[-1], len(tokens) - 1, cache)
+
+        return tokens
+
+    def log_likelihood(self, tokens):
+        """ Sum of log p(next token) over a window, and the number of predictions. """
+        tokens = list(tokens[:self.max_length])
+        cache, total = self.empty_cache(), 0.0
+        for position in range(len(tokens) - 1):
+            logits, cache = self.step(tokens[position], position, cache)
+            logits = logits.astype(np.float64)
+            log_norm = np.log(np.sum(np.exp(logits - logits.max()))) + logits.max()
+            total += logits[tokens[position + 1]] - log_norm
+        return total, len(tokens) - 1
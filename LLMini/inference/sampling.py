@@ -0,0 +1,83 @@
+# inference/sampling.py
+
+import tensorflow as tf
+
+# All functions work on a whole batch of next-token logits, (batch, vocab),
+# with one setting per row, so one decode step handles every sequence at once.
+
+def apply_repetition_penalty(logits, seen, penalty):
+    """
+    Make tokens already in a sequence less likely (CTRL-style penalty).
+
+    Args:
+        logits: (batch, vocab) next-token logits.
+        seen: (batch, vocab) bool, True for tokens already in the row.
+        penalty: (batch,) values > 1 penalize repeats; 1 disables.
+    """
+
+    penalty = penalty[:, tf.newaxis]
+    penalized = tf.where(logits > 0, logits / penalty, logits * penalty)
+    return tf.where(seen, penalized, logits)
+
+def filter_top_k_top_p(logits, top_k, top_p):
+    """
+    Keep only the top-k tokens and the smallest set of tokens whose
+    probability mass reaches top_p; the rest get -inf.
+
+    One descending sort serves both filters: each gives a per-row logit
+    threshold and the stricter one wins.
+
+    Args:
+        logits: (batch, vocab) next-token logits (already temperature-scaled).
+        top_k: (batch,) tokens to keep; 0 disables.
+        top_p: (batch,) nucleus mass in (0, 1]; 1 disables.
+    """
+
+    vocab_size = tf.shape(logits)[-1]
+    sorted_logits = tf.sort(logits, axis=-1, direction="DESCENDING")
+
+    k = tf.where(top_k > 0, tf.minimum(top_k, vocab_size), vocab_size)
+    kth_logit = tf.gather(sorted_logits, k - 1, batch_dims=1)
+
+    # A token stays in the nucleus if the mass ranked above it is still below top_p.
+    mass_before = tf.cumsum(tf.nn.softmax(sorted_logits, axis=-1), axis=-1, exclusive=True)
+    in_nucleus = (mass_before < top_p[:, tf.newaxis]) | (top_p >= 1.0)[:, tf.newaxis]
+    nucleus_logit = tf.reduce_min(tf.where(in_nucleus, sorted_logits, sorted_logits[:, :1]), axis=-1)
+
+    threshold = tf.maximum(kth_logit, nucleus_logit)
+    return tf.where(logits >= threshold[:, tf.newaxis], logits, tf.fill(tf.shape(logits), float("-inf")))
+
+def sample_tokens(logits, seen, temperature, top_k, top_p, repetition_penalty, seed):
+    """
+    Pick the next token for every row.
+
+    Rows with temperature 0 decode greedily; the others sample from the
+    filtered, temperature-scaled distribution with the Gumbel-max trick
+    (argmax of logits plus Gumbel noise), which draws from the softmax
+    without a per-row categorical call.
+
+    Args:
+        logits: (batch, vocab) next-token logits.
+        seen: (batch, vocab) bool, tokens already in each row.
+        temperature, top_k, top_p, repetition_penalty: (batch,) settings.
+        seed: (2,) int32 stateless seed; the same seed gives the same tokens.
+
+    Returns:
+        (batch,) int32 token ids.
+    """
+
+    logits = apply_repetition_penalty(logits, seen, repetition_penalty)
+    greedy = tf.argmax(logits, axis=-1, output_type=tf.int32)
+
+    scaled = logits / tf.maximum(temperature, 1e-6)[:, tf.newaxis]
+    filtered = filter_top_k_top_p(scaled, top_k, top_p)
+    uniform = tf.random.stateless_uniform(tf.shape(logits), seed, minval=1e-20, maxval=1.0)
+    sampled = tf.argmax(filtered - tf.math.log(-tf.math.log(uniform)), axis=-1, output_type=tf.int32)
+
+    return tf.where(temperature > 0, sampled, greedy)
+
+def seen_tokens(buffer, lengths, vocab_size):
+    """ (batch, vocab) bool mask of the tokens in each row's first `lengths` positions. """
+    valid = tf.range(tf.shape(buffer)[1])[tf.newaxis, :] < lengths[:, tf.newaxis]
+    ids = tf.where(valid, buffer, -1)  # one_hot of -1 is all zeros, so padding drops out.
+    return tf.reduce_max(tf.one_hot(ids, vocab_size), axis=1) > 0
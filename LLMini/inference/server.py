@@ -0,0 +1,293 @@
+# inference/server.py
+
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from tokenizer.tokenization import BPETokenizer
+from inference.decoding import compile_decoder, load_model
+from utils.config import *
+
+# Per-request sampling settings and their defaults (greedy).
+SAMPLING_DEFAULTS = {"temperature": 0.0, "top_k": 0, "top_p": 1.0, "repetition_penalty": 1.0}
+
+@dataclass
+class GenerationRequest:
+    tokens: list
+    max_tokens: int
+    sampling: dict = field(default_factory=lambda: dict(SAMPLING_DEFAULTS))
+    submitted_at: float = field(default_factory=time.perf_counter)
+    done: threading.Event = field(default_factory=threading.Event)
+    result: list = None
+    error: str = None
+    timed_out: bool = False
+    batch_size: int = 0
+    started_at: float = 0.0
+    finished_at: float = 0.0
+
+
+class ServerMetrics:
+    """
+    Request, token and batch counters plus recent per-request latencies.
+    """
+
+    def __init__(self, window = 1000):
+        self.lock = threading.Lock()
+        self.started_at = time.perf_counter()
+        self.requests = 0
+        self.failed = 0
+        self.tokens_generated = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.latencies = deque(maxlen=window)
+        self.queue_waits = deque(maxlen=window)
+
+    def record_batch(self, requests):
+        with self.lock:
+            self.batches += 1
+            self.batched_requests += len(requests)
+            for request in requests:
+                self.requests += 1
+                if request.error:
+                    self.failed += 1
+                    continue
+                self.tokens_generated += len(request.result) - len(request.tokens)
+                self.latencies.append(request.finished_at - request.submitted_at)
+                self.queue_waits.append(request.started_at - request.submitted_at)
+
+    def snapshot(self):
+        with self.lock:
+            uptime = time.perf_counter() - self.started_at
+            latencies = np.asarray(self.latencies) * 1000
+            waits = np.asarray(self.queue_waits) * 1000
+            return {
+                "uptime_s": round(uptime, 1),
+                "requests": self.requests,
+                "failed": self.failed,
+                "tokens_generated": self.tokens_generated,
+                "requests_per_s": round(self.requests / uptime, 2),
+                "tokens_per_s": round(self.tokens_generated / uptime, 2),
+                "batches": self.batches,
+                "mean_batch_size": round(self.batched_requests / self.batches, 2) if self.batches else 0.0,
+                "latency_ms": percentiles(latencies),
+                "queue_wait_ms": percentiles(waits),
+            }
+
+def percentiles(values):
+    if not len(values):
+        return {"p50": None, "p95": None, "p99": None}
+    return {f"p{p}": round(float(np.percentile(values, p)), 1) for p in (50, 95, 99)}
+
+
+class DynamicBatcher:
+    """
+    Groups concurrent generation requests into padded batches.
+
+    A background thread takes the first waiting request, then keeps
+    collecting until the batch holds `max_batch_size` requests or
+    `max_wait` seconds have passed, and decodes the whole batch in one call
+    of the compiled decoder. Rows are right-padded with the tokenizer's
+    pad id; each row attends only to its own positions, so padding never
+    leaks into another sequence.
+    """
+
+    def __init__(self, decode, eos_id, pad_id, max_batch_size = SERVER_MAX_BATCH_SIZE,
+                 max_wait = SERVER_MAX_WAIT_MS / 1000, metrics = None):
+        self.decode = decode
+        self.eos_id = eos_id
+        self.pad_id = pad_id
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics or ServerMetrics()
+        self.pending = queue.Queue()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def submit(self, tokens, max_tokens, sampling = None, timeout = None):
+        """
+        Queue one prompt and wait for its batch to finish.
+
+        Args:
+            tokens: prompt token ids.
+            max_tokens: new tokens to generate at most.
+            sampling: settings from SAMPLING_DEFAULTS to override for this prompt.
+            timeout: seconds to wait before giving up.
+
+        Returns:
+            The finished GenerationRequest (check .error; .timed_out is set when the wait ran out).
+        """
+
+        request = GenerationRequest(tokens=tokens, max_tokens=max_tokens)
+        request.sampling.update(sampling or {})
+        self.pending.put(request)
+        if not request.done.wait(timeout):
+            request.timed_out = True
+            request.error = "Timed out waiting for generation."
+        return request
+
+    def _collect(self):
+        try:
+            batch = [self.pending.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self.stopped.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+
+            started_at = time.perf_counter()
+            try:
+                # Every row keeps its own sampling settings within the shared batch.
+                settings = {name: [request.sampling[name] for request in batch] for name in SAMPLING_DEFAULTS}
+                results = self.decode([request.tokens for request in batch],
+                                      [request.max_tokens for request in batch],
+                                      self.eos_id, self.pad_id, **settings)
+            except Exception as e:
+                results = [None] * len(batch)
+                for request in batch:
+                    request.error = f"Generation failed: {e}"
+
+            finished_at = time.perf_counter()
+            for request, result in zip(batch, results):
+                request.result = result
+                request.batch_size = len(batch)
+                request.started_at = started_at
+                request.finished_at = finished_at
+            self.metrics.record_batch(batch)
+            for request in batch:
+                request.done.set()
+
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    """
+    POST /generate  {"prompt": str, "max_tokens": int, optional sampling settings}
+    GET  /metrics   throughput, batch sizes and latency percentiles
+    GET  /health
+    """
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self.send_json(200, self.server.batcher.metrics.snapshot())
+        else:
+            self.send_json(404, {"detail": "Not found."})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self.send_json(404, {"detail": "Not found."})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            prompt = body["prompt"]
+            max_tokens = int(body.get("max_tokens", 50))
+            sampling = {name: type(default)(body[name]) for name, default in SAMPLING_DEFAULTS.items() if name in body}
+        except (KeyError, ValueError, TypeError) as e:
+            self.send_json(400, {"detail": f"Expected {{\"prompt\": str, \"max_tokens\": int, ...}}: {e}"})
+            return
+
+        tokenizer = self.server.tokenizer
+        tokens = tokenizer.encode(prompt)[:MAX_SEQUENCE_LENGTH]
+        request = self.server.batcher.submit(tokens, max(0, max_tokens), sampling, timeout=self.server.request_timeout)
+        if request.error:
+            # A timeout means the server is overloaded, not broken.
+            self.send_json(504 if request.timed_out else 500, {"detail": request.error})
+            return
+
+        self.send_json(200, {
+            "text": tokenizer.decode(request.result),
+            "prompt_tokens": len(tokens),
+            "generated_tokens": len(request.result) - len(tokens),
+            "batch_size": request.batch_size,
+            "queue_ms": round((request.started_at - request.submitted_at) * 1000, 1),
+            "latency_ms": round((request.finished_at - request.submitted_at) * 1000, 1),
+        })
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Per-request numbers are in /metrics.
+
+
+def create_server(tokenizer, model, host = "127.0.0.1", port = 8000, max_batch_size = SERVER_MAX_BATCH_SIZE,
+                  max_wait_ms = SERVER_MAX_WAIT_MS, jit_compile = GENERATE_JIT_COMPILE, request_timeout = 120.0):
+    """
+    Build the HTTP server and its batcher (call .batcher.start() before serving).
+    """
+
+    decode = compile_decoder(model, MAX_SEQUENCE_LENGTH, jit_compile=jit_compile)
+    decode([[tokenizer.pad_id()]], 1)  # Trace the decoder before the first request.
+
+    server = ThreadingHTTPServer((host, port), InferenceHandler)
+    server.daemon_threads = True
+    server.tokenizer = tokenizer
+    server.request_timeout = request_timeout
+    server.batcher = DynamicBatcher(decode, tokenizer.eos_id(), tokenizer.pad_id(),
+                                    max_batch_size=max_batch_size, max_wait=max_wait_ms / 1000)
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="LLMini HTTP inference server with dynamic batching.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--tokenizer", default="tokenizer.json")
+    parser.add_argument("--weights", default=WEIGHTS_PATH)
+    parser.add_argument("--max-batch-size", type=int, default=SERVER_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=SERVER_MAX_WAIT_MS)
+    parser.add_argument("--jit-compile", action="store_true", default=GENERATE_JIT_COMPILE)
+    args = parser.parse_args()
+
+    # === Load Tokenizer and Model (once) ===
+    tokenizer = BPETokenizer()
+    tokenizer.load(args.tokenizer)
+    model = load_model(args.weights)
+
+    server = create_server(tokenizer, model, args.host, args.port, args.max_batch_size, args.max_wait_ms, args.jit_compile)
+    server.batcher.start()
+    print(f"Serving on http://{args.host}:{args.port} (batches of up to {args.max_batch_size}, {args.max_wait_ms:g} ms wait)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.batcher.stop()
+
+if __name__ == "__main__":
+    main()
@@ -8,8 +8,10 @@ class TokenAndPositionEmbedding(layers.Layer):
         self.token_embed = layers.Embedding(input_dim=vocab_size, output_dim=embed_dim)
         self.pos_embed = layers.Embedding(input_dim=context_size, output_dim=embed_dim)
 
-    def call(self, x):
-        positions = tf.range(start=0, limit=tf.shape(x)[-1], delta=1)
+    def call(self, x, start=0):
+        # `start` offsets positions when x continues an already-processed sequence
+        # (a scalar, or one offset per batch row).
+        positions = tf.range(tf.shape(x)[-1]) + tf.reshape(start, [-1, 1])
         embedded_tokens = self.token_embed(x)
         embedded_positions = self.pos_embed(positions)
         return embedded_tokens + embedded_positions
@@ -21,9 +23,10 @@ class CausalSelfAttention(layers.Layer):
         self.dropout = layers.Dropout(0.1)
         self.norm = layers.LayerNormalization()
 
-    def causal_mask(self, x):
+    def causal_mask(self, x, past_length=0):
+        # Query i (at position past_length + i) may attend to keys 0..past_length + i.
         seq_len = tf.shape(x)[1]
-        return tf.linalg.band_part(tf.ones((seq_len, seq_len)), -1, 0)
+        return tf.linalg.band_part(tf.ones((seq_len, past_length + seq_len)), -1, past_length)
 
     def call(self, x, training=False):
         mask = self.causal_mask(x)
@@ -31,6 +34,67 @@ class CausalSelfAttention(layers.Layer):
         x = self.norm(x + self.dropout(attn_out, training=training))
         return x
 
+    def call_with_cache(self, x, past=None):
+        """
+        Inference-only attention over cached keys and values.
+
+        Only the new positions in x are projected; their keys and values are
+        appended to `past` so the next step can reuse them.
+
+        Args:
+            x: hidden states of the new positions, (batch, new, embed_dim).
+            past: (keys, values) from earlier positions, or None.
+
+        Returns:
+            (output for the new positions, (keys, values) for all positions).
+        """
+
+        if not self.attn.built:
+            self.attn(query=x, value=x, key=x)
+
+        key = self.attn._key_dense(x)
+        value = self.attn._value_dense(x)
+        past_length = 0
+        if past is not None:
+            past_length = tf.shape(past[0])[1]
+            key = tf.concat([past[0], key], axis=1)
+            value = tf.concat([past[1], value], axis=1)
+
+        query = self.attn._query_dense(x)
+        mask = self.causal_mask(x, past_length)
+        attn_out, _ = self.attn._compute_attention(query, key, value, attention_mask=mask)
+        attn_out = self.attn._output_dense(attn_out)
+        return self.norm(x + attn_out), (key, value)
+
+    def call_at_position(self, x, cache, positions):
+        """
+        Inference-only attention for one new token per row, using a
+        fixed-size cache so every step has the same shapes (graph/XLA friendly).
+
+        Args:
+            x: hidden state of the new token, (batch, 1, embed_dim).
+            cache: (keys, values), each (batch, max_length, heads, key_dim).
+            positions: position of the new token in each row, (batch,).
+
+        Returns:
+            (output for the new token, cache with its key and value written in).
+        """
+
+        max_length = tf.shape(cache[0])[1]
+        slot = tf.equal(tf.range(max_length)[tf.newaxis, :], positions[:, tf.newaxis])
+        write = slot[:, :, tf.newaxis, tf.newaxis]
+        key = tf.where(write, self.attn._key_dense(x), cache[0])
+        value = tf.where(write, self.attn._value_dense(x), cache[1])
+
+        # Each row attends to its own positions 0..position; later slots are empty or stale.
+        visible = tf.range(max_length)[tf.newaxis, :] <= positions[:, tf.newaxis]
+        mask = tf.cast(visible[:, tf.newaxis, :], x.dtype)
+
+        query = self.attn._query_dense(x)
+        attn_out, _ = self.attn._compute_attention(query, key, value, attention_mask=mask)
+        attn_out = self.attn._output_dense(attn_out)
+        return self.norm(x + attn_out), (key, value)
+
 class TransformerBlock(layers.Layer):
     def __init__(self, embed_dim, num_heads, ff_dim):
         super().__init__()
@@ -46,10 +110,19 @@ class TransformerBlock(layers.Layer):
         ffn_out = self.ffn(x)
         return self.norm(x + self.dropout(ffn_out, training=training))
 
+    def call_with_cache(self, x, past=None):
+        x, present = self.attn.call_with_cache(x, past)
+        return self.norm(x + self.ffn(x)), present
+
+    def call_at_position(self, x, cache, positions):
+        x, cache = self.attn.call_at_position(x, cache, positions)
+        return self.norm(x + self.ffn(x)), cache
+
 
 class MiniGPT(tf.keras.Model):
     def __init__(self, vocab_size, context_size, embed_dim, num_heads, ff_dim, num_layers):
         super().__init__()
+        self.context_size = context_size
         self.embed = TokenAndPositionEmbedding(context_size, vocab_size, embed_dim)
         self.blocks = [TransformerBlock(embed_dim, num_heads, ff_dim) for _ in range(num_layers)]
         self.norm = layers.LayerNormalization()
@@ -61,3 +134,49 @@ class MiniGPT(tf.keras.Model):
             x = block(x, training=training)
         x = self.norm(x)
         return self.out(x)
+
+    def call_with_cache(self, x, past=None):
+        """
+        Incremental forward pass for generation.
+
+        Pass the prompt with past=None, then only the newest token together
+        with the cache returned by the previous call.
+
+        Args:
+            x: token ids of the new positions, (batch, new).
+            past: per-block (keys, values) from earlier calls, or None.
+
+        Returns:
+            (logits for the new positions, per-block cache covering all positions).
+        """
+
+        past_length = 0 if past is None else tf.shape(past[0][0])[1]
+        x = self.embed(x, start=past_length)
+        presents = []
+        for i, block in enumerate(self.blocks):
+            x, present = block.call_with_cache(x, None if past is None else past[i])
+            presents.append(present)
+        x = self.norm(x)
+        return self.out(x), presents
+
+    def call_at_position(self, x, cache, positions):
+        """
+        Fixed-shape decode step: one new token per row at its own position.
+
+        Args:
+            x: the new token ids, (batch, 1).
+            cache: per-block (keys, values) of length max_length, e.g. from
+                call_with_cache() on a full-length padded buffer.
+            positions: position of the new token in each row, (batch,).
+
+        Returns:
+            (logits for the new token, updated cache).
+        """
+
+        x = self.embed(x, start=positions)
+        updated = []
+        for block, block_cache in zip(self.blocks, cache):
+            x, block_cache = block.call_at_position(x, block_cache, positions)
+            updated.append(block_cache)
+        x = self.norm(x)
+        return self.out(x), updated
@@ -0,0 +1,83 @@
+# scripts/benchmark_data_pipeline.py
+
+import sys
+import time
+import resource
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from utils.config import *
+
+def memory_mb():
+    """
+    Anonymous (heap) memory on Linux; pages of the mapped token file are
+    page cache the kernel can drop, so they are left out. Peak RSS elsewhere.
+    """
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def measure(mode, tokens_path, batches):
+    """ Run one loader in this process and print its peak memory and speed. """
+    import tensorflow as tf
+    from training.data import window_dataset
+    baseline = memory_mb()
+
+    start = time.perf_counter()
+    if mode == "materialized":
+        # What train.py used to do: every overlapping window as a full array.
+        tokens = np.fromfile(tokens_path, dtype=np.uint16).astype(np.int32)
+        windows = np.lib.stride_tricks.sliding_window_view(tokens, CONTEXT_SIZE + 1)
+        X, y = windows[:, :-1].copy(), windows[:, 1:].copy()
+        dataset = tf.data.Dataset.from_tensor_slices((X, y)).shuffle(2048).batch(BATCH_SIZE)
+    else:
+        dataset, _ = window_dataset(tokens_path, CONTEXT_SIZE, BATCH_SIZE, seed=0)
+
+    for x, y in dataset.take(batches):
+        pass
+    seconds = time.perf_counter() - start
+    # Measured while the dataset (and any materialized arrays) are still alive.
+    print(f"{memory_mb() - baseline:.0f} {batches * BATCH_SIZE * CONTEXT_SIZE / seconds:.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of the memory-mapped window pipeline vs. materialized windows.")
+    parser.add_argument("--sizes", default="1,2,10,100", help="Corpus sizes in millions of tokens.")
+    parser.add_argument("--batches", type=int, default=200)
+    parser.add_argument("--materialized-limit", type=float, default=2, help="Skip materializing corpora above this many million tokens.")
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "TOKENS_PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure, args.batches)
+        return
+
+    workdir = Path(tempfile.mkdtemp())
+    rng = np.random.default_rng(0)
+    print(f"context {CONTEXT_SIZE}, batch {BATCH_SIZE}, {args.batches} batches; memory is heap growth after importing TensorFlow\n")
+    for millions in (float(size) for size in args.sizes.split(",")):
+        tokens_path = workdir / f"{millions:g}M.tokens"
+        rng.integers(0, VOCAB_SIZE, size=int(millions * 1e6), dtype=np.uint16).tofile(tokens_path)
+
+        for mode in ("memmap", "materialized"):
+            if mode == "materialized" and millions > args.materialized_limit:
+                print(f"{millions:6g}M tokens  {mode:<13} skipped (above --materialized-limit)")
+                continue
+            # A fresh process per run so peak memory is not shared between runs.
+            run = subprocess.run([sys.executable, __file__, "--measure", mode, str(tokens_path), "--batches", str(args.batches)],
+                                 capture_output=True, text=True)
+            if run.returncode != 0:
+                print(f"{millions:6g}M tokens  {mode:<13} failed (exit {run.returncode}, likely out of memory)")
+                continue
+            memory, speed = run.stdout.split()[-2:]
+            print(f"{millions:6g}M tokens  {mode:<13} {float(memory):8.0f} MB  {float(speed):12,.0f} tokens/s")
+        tokens_path.unlink()
+
+if __name__ == "__main__":
+    main()
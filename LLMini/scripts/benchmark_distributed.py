@@ -0,0 +1,102 @@
+# scripts/benchmark_distributed.py
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from utils.config import *
+from training.distributed import worker_environments
+
+def measure(distribution, replicas, tokens_path, per_replica_batch, steps, warmup):
+    """ Time training steps under one strategy in this process; the chief prints tokens/s. """
+    from training.distributed import make_strategy
+    strategy = make_strategy(distribution, replicas)
+
+    import tensorflow as tf
+    from model.transformer import MiniGPT
+    from training.trainer import distributed_batches, make_optimizer, make_train_step
+
+    with strategy.scope():
+        model = MiniGPT(vocab_size=VOCAB_SIZE, context_size=CONTEXT_SIZE, embed_dim=EMBED_DIM,
+                        num_heads=NUM_HEADS, ff_dim=FFN_DIM, num_layers=NUM_LAYERS)
+        model(tf.zeros((1, CONTEXT_SIZE), dtype=tf.int32))
+        optimizer = make_optimizer()
+        optimizer.build(model.trainable_variables)
+
+    # Weak scaling: each replica keeps its batch, so the global batch grows with the replicas.
+    batch_size = per_replica_batch * strategy.num_replicas_in_sync
+    batches = iter(distributed_batches(strategy, tokens_path, CONTEXT_SIZE, batch_size, GRAD_ACCUM_STEPS, seed=0))
+    train_step = make_train_step(model, optimizer, GRAD_ACCUM_STEPS, jit_compile=TRAIN_JIT_COMPILE, strategy=strategy)
+
+    for _ in range(warmup):
+        loss, _ = train_step(*next(batches))
+    float(loss)
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        loss, _ = train_step(*next(batches))
+    float(loss)  # Waits for the last step.
+    seconds = time.perf_counter() - start
+
+    if strategy.extended.should_checkpoint:
+        print(f"{steps * GRAD_ACCUM_STEPS * batch_size * CONTEXT_SIZE / seconds:.0f}")
+
+def run(distribution, replicas, tokens_path, args):
+    """ Run measure() in fresh processes (one per worker) and return the chief's tokens/s. """
+    command = [sys.executable, __file__, "--measure", str(distribution), str(replicas), str(tokens_path),
+               "--per-replica-batch", str(args.per_replica_batch), "--steps", str(args.steps), "--warmup", str(args.warmup)]
+    environments = worker_environments(replicas) if distribution == "multi_worker" else [dict(os.environ)]
+    workers = [subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+               for env in environments]
+    outputs = [worker.communicate()[0] for worker in workers]
+    if any(worker.returncode != 0 for worker in workers):
+        return None
+    return float(outputs[0].split()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Data-parallel training throughput at different replica counts.")
+    parser.add_argument("--replicas", default=None, help="Comma-separated replica counts (default 1,2,4 and the core count).")
+    parser.add_argument("--distributions", default="mirrored,multi_worker")
+    parser.add_argument("--per-replica-batch", type=int, default=BATCH_SIZE)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--tokens", default=None, help="Token file to train on (default: random tokens).")
+    parser.add_argument("--measure", nargs=3, metavar=("DISTRIBUTION", "REPLICAS", "TOKENS_PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        distribution, replicas, tokens_path = args.measure
+        measure(distribution, int(replicas), tokens_path, args.per_replica_batch, args.steps, args.warmup)
+        return
+
+    tokens_path = args.tokens
+    if tokens_path is None:
+        tokens_path = Path(tempfile.mkdtemp()) / "random.tokens"
+        np.random.default_rng(0).integers(0, VOCAB_SIZE, size=1_000_000, dtype=np.uint16).tofile(tokens_path)
+
+    cores = os.cpu_count() or 1
+    counts = sorted({int(count) for count in args.replicas.split(",")} if args.replicas else {1, 2, 4, cores})
+    print(f"{cores} cores; {args.per_replica_batch} x {CONTEXT_SIZE} tokens per replica per micro-batch, "
+          f"{GRAD_ACCUM_STEPS} micro-batch(es) per step, {args.steps} timed steps\n")
+    print(f"{'distribution':<13} {'replicas':>8} {'tokens/s':>10} {'speedup':>8} {'efficiency':>10}")
+
+    for distribution in args.distributions.split(","):
+        single = None
+        for replicas in counts:
+            speed = run(distribution, replicas, tokens_path, args)
+            if speed is None:
+                print(f"{distribution:<13} {replicas:>8} {'failed':>10}")
+                continue
+            single = single or (speed if replicas == 1 else None)
+            speedup = f"{speed / single:7.2f}x" if single else ""
+            efficiency = f"{speed / single / replicas:10.0%}" if single else ""
+            print(f"{distribution:<13} {replicas:>8} {speed:10,.0f} {speedup:>8} {efficiency:>10}")
+
+if __name__ == "__main__":
+    main()
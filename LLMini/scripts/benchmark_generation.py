@@ -0,0 +1,73 @@
+# scripts/benchmark_generation.py
+
+import sys
+import time
+import argparse
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import tensorflow as tf
+from model.transformer import MiniGPT
+from inference.decoding import compile_decoder, greedy_decode, greedy_decode_cached
+from utils.config import *
+
+def timed(decode, repeats):
+    """ Median wall time of `repeats` runs, and the tokens produced. """
+    times, tokens = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        tokens = decode()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), tokens
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and tokens/sec of eager vs. compiled greedy decoding (random weights).")
+    parser.add_argument("--context", type=int, default=256, help="Model context size (MAX_SEQUENCE_LENGTH in config is %d)." % MAX_SEQUENCE_LENGTH)
+    parser.add_argument("--prompt-tokens", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, default=None, help="New tokens per run (default: fill the context).")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--device", default="/CPU:0")
+    parser.add_argument("--xla", action="store_true", help="Also time the XLA-compiled loop.")
+    parser.add_argument("--skip-full", action="store_true", help="Skip the slow full-recompute loop.")
+    args = parser.parse_args()
+
+    max_tokens = args.max_tokens or args.context - args.prompt_tokens
+    prompt = np.random.default_rng(0).integers(4, VOCAB_SIZE, size=args.prompt_tokens).tolist()
+
+    with tf.device(args.device):
+        model = MiniGPT(VOCAB_SIZE, args.context, EMBED_DIM, NUM_HEADS, FFN_DIM, NUM_LAYERS)
+        model(tf.zeros((1, 1), dtype=tf.int32))  # Build the weights.
+
+        decoders = []
+        if not args.skip_full:
+            decoders.append(("eager, full recompute", lambda: greedy_decode(model, prompt, max_tokens, args.context)))
+        decoders.append(("eager, kv cache", lambda: greedy_decode_cached(model, prompt, max_tokens, args.context)))
+        for label, jit_compile in (("compiled", False), ("compiled + xla", True))[:2 if args.xla else 1]:
+            compiled = compile_decoder(model, args.context, jit_compile=jit_compile)
+            decoders.append((label, lambda compiled=compiled: compiled([prompt], max_tokens)[0]))
+
+        print(f"{NUM_LAYERS} layers, embed {EMBED_DIM}, context {args.context}, "
+              f"{args.prompt_tokens} prompt + {max_tokens} new tokens on {args.device}\n")
+        results = {}
+        for label, decode in decoders:
+            # The first call pays tracing/compilation (and eager warm-up); report it separately.
+            start = time.perf_counter()
+            decode()
+            first = time.perf_counter() - start
+
+            seconds, tokens = timed(decode, args.repeats)
+            results[label] = (seconds, tokens)
+            generated = len(tokens) - len(prompt)
+            print(f"{label:<22} {seconds * 1000:8.0f} ms  {generated / seconds:8.1f} tokens/s  (first call {first * 1000:.0f} ms)")
+
+    # Speedups are relative to the first (slowest, eager) loop that ran.
+    baseline_label = next(iter(results))
+    baseline_s, baseline_tokens = results[baseline_label]
+    print()
+    for label, (seconds, tokens) in results.items():
+        if label != baseline_label:
+            print(f"{label:<22} {baseline_s / seconds:5.1f}x vs {baseline_label}, same tokens: {tokens == baseline_tokens}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# scripts/benchmark_sampling.py
+
+import sys
+import time
+import argparse
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import tensorflow as tf
+from model.transformer import MiniGPT
+from inference.decoding import compile_beam_search, compile_decoder
+from utils.config import *
+
+# name -> sampling settings passed to the compiled decoder
+STRATEGIES = {
+    "greedy": {},
+    "temperature 0.8": {"temperature": 0.8},
+    "top-k 40": {"temperature": 0.8, "top_k": 40},
+    "top-p 0.9": {"temperature": 0.8, "top_p": 0.9},
+    "top-k + top-p + rep": {"temperature": 0.8, "top_k": 40, "top_p": 0.9, "repetition_penalty": 1.2},
+}
+
+def timed(decode, repeats):
+    """ Median wall time of `repeats` runs, and the tokens produced. """
+    times, tokens = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        tokens = decode()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)), tokens
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens/sec of each decoding strategy on a batch of prompts (random weights).")
+    parser.add_argument("--context", type=int, default=256, help="Model context size (MAX_SEQUENCE_LENGTH in config is %d)." % MAX_SEQUENCE_LENGTH)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--prompt-tokens", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--num-beams", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--device", default="/CPU:0")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    prompts = rng.integers(4, VOCAB_SIZE, size=(args.batch_size, args.prompt_tokens)).tolist()
+
+    with tf.device(args.device):
+        model = MiniGPT(VOCAB_SIZE, args.context, EMBED_DIM, NUM_HEADS, FFN_DIM, NUM_LAYERS)
+        model(tf.zeros((1, 1), dtype=tf.int32))  # Build the weights.
+
+        sample = compile_decoder(model, args.context)
+        beam = compile_beam_search(model, args.context, num_beams=args.num_beams)
+        decoders = [(name, lambda settings=settings: sample(prompts, args.max_tokens, seed=args.seed, **settings))
+                    for name, settings in STRATEGIES.items()]
+        decoders.append((f"beam search ({args.num_beams})", lambda: beam(prompts, args.max_tokens)))
+
+        print(f"{NUM_LAYERS} layers, embed {EMBED_DIM}, context {args.context}, batch {args.batch_size} x "
+              f"({args.prompt_tokens} prompt + {args.max_tokens} new tokens) on {args.device}\n")
+        for name, decode in decoders:
+            first = decode()  # Tracing; also the reference for the reproducibility check.
+            seconds, tokens = timed(decode, args.repeats)
+            generated = sum(len(row) - len(prompt) for row, prompt in zip(tokens, prompts))
+            distinct = np.mean([len(set(row[len(prompt):])) / max(1, len(row) - len(prompt)) for row, prompt in zip(tokens, prompts)])
+            print(f"{name:<22} {seconds * 1000:8.0f} ms  {generated / seconds:8.1f} tokens/s  "
+                  f"distinct {distinct:4.2f}  same tokens with same seed: {tokens == first}")
+
+if __name__ == "__main__":
+    main()
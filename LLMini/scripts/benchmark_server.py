@@ -0,0 +1,85 @@
+# scripts/benchmark_server.py
+
+import sys
+import json
+import time
+import tempfile
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from tokenizer.tokenization import BPETokenizer
+from inference.decoding import load_model
+from inference.server import create_server
+from utils.config import *
+
+WORDS = "the whale ship captain sea storm harbor night letter monster creature castle garden ball".split()
+
+def build_tokenizer(path):
+    """ Use tokenizer.json if present, else train a small throwaway one. """
+    tokenizer = BPETokenizer(vocab_size=VOCAB_SIZE)
+    if path and Path(path).exists():
+        tokenizer.load(path)
+        return tokenizer
+
+    rng = np.random.default_rng(0)
+    corpus = Path(tempfile.mkdtemp()) / "corpus.txt"
+    corpus.write_text("\n".join(" ".join(rng.choice(WORDS, size=12)) for _ in range(2000)), encoding="utf-8")
+    tokenizer.train([str(corpus)], output_path=str(corpus.with_suffix(".json")))
+    return tokenizer
+
+def post(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+def run(tokenizer, model, args, max_batch_size):
+    server = create_server(tokenizer, model, port=0, max_batch_size=max_batch_size, max_wait_ms=args.max_wait_ms)
+    server.batcher.start()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    rng = np.random.default_rng(1)
+    prompts = [" ".join(rng.choice(WORDS, size=rng.integers(3, 12))) for _ in range(args.requests)]
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            responses = list(pool.map(lambda prompt: post(f"{url}/generate", {"prompt": prompt, "max_tokens": args.max_tokens}), prompts))
+        wall = time.perf_counter() - start
+        with urllib.request.urlopen(f"{url}/metrics") as response:
+            metrics = json.loads(response.read())
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.batcher.stop()
+
+    tokens = sum(response["generated_tokens"] for response in responses)
+    latency = metrics["latency_ms"]
+    print(f"max batch {max_batch_size:>3}: {args.requests / wall:7.1f} req/s  {tokens / wall:8.1f} tokens/s  "
+          f"p50 {latency['p50']:7.1f} ms  p95 {latency['p95']:7.1f} ms  mean batch {metrics['mean_batch_size']:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and latency of the LLMini server, unbatched vs. dynamically batched.")
+    parser.add_argument("--tokenizer", default="tokenizer.json")
+    parser.add_argument("--weights", default=WEIGHTS_PATH)
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=SERVER_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=SERVER_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    tokenizer = build_tokenizer(args.tokenizer)
+    model = load_model(args.weights)
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.max_tokens} new tokens each\n")
+    for max_batch_size in (1, args.max_batch_size):
+        run(tokenizer, model, args, max_batch_size)
+
+if __name__ == "__main__":
+    main()
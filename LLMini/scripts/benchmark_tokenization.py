@@ -0,0 +1,55 @@
+# scripts/benchmark_tokenization.py
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from tokenizer.tokenization import BPETokenizer
+from training.data import TOKEN_DTYPE, tokenize_corpus, tokens_are_stale
+from utils.config import *
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-string encode vs. batched, sharded corpus tokenization.")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--tokenizer", default="tokenizer.json")
+    parser.add_argument("--skip-whole", action="store_true", help="Skip encoding the corpus as one string (needs it all in memory).")
+    args = parser.parse_args()
+
+    tokenizer = BPETokenizer()
+    tokenizer.load(args.tokenizer)
+    megabytes = Path(args.corpus).stat().st_size / 1e6
+    workdir = Path(tempfile.mkdtemp())
+    tokens_path, shards_dir = workdir / "corpus.tokens", workdir / "shards"
+
+    def report(name, seconds, note = ""):
+        print(f"{name:<34} {seconds:8.2f}s {megabytes / seconds:8.1f} MB/s  {note}")
+
+    print(f"{args.corpus}: {megabytes:.1f} MB\n")
+
+    # What train.py used to do: one encode() call over the whole text.
+    whole = None
+    if not args.skip_whole:
+        start = time.perf_counter()
+        whole = tokenizer.encode(Path(args.corpus).read_text(encoding="utf-8"))
+        report("encode(whole corpus)", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    count, tokenized, _ = tokenize_corpus(tokenizer, args.corpus, tokens_path, shards_dir)
+    same = "" if whole is None else f"(same ids: {np.array_equal(np.fromfile(tokens_path, dtype=TOKEN_DTYPE), whole)})"
+    report("tokenize_corpus, empty cache", time.perf_counter() - start, f"{count:,} tokens, {tokenized} documents {same}")
+
+    tokens_path.unlink()
+    start = time.perf_counter()
+    _, tokenized, reused = tokenize_corpus(tokenizer, args.corpus, tokens_path, shards_dir)
+    report("tokenize_corpus, warm cache", time.perf_counter() - start, f"{tokenized} tokenized, {reused} reused")
+
+    start = time.perf_counter()
+    stale = tokens_are_stale(tokenizer, args.corpus, tokens_path)
+    report("tokens_are_stale, unchanged corpus", time.perf_counter() - start, f"stale: {stale}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# scripts/launch_workers.py
+
+import sys
+import argparse
+import subprocess
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from training.distributed import worker_environments
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a training script as N multi-worker processes on this host "
+                                                 "(set DISTRIBUTION = \"multi_worker\" in utils/config.py).")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=None, help="Op threads per worker (default: cores / workers).")
+    parser.add_argument("script", nargs="?", default=str(Path(__file__).resolve().parent.parent / "training" / "train.py"))
+    args = parser.parse_args()
+
+    # Only the chief (worker 0) prints progress; the others' output is dropped.
+    workers = [subprocess.Popen([sys.executable, args.script], env=env,
+                                stdout=None if index == 0 else subprocess.DEVNULL,
+                                stderr=None if index == 0 else subprocess.DEVNULL)
+               for index, env in enumerate(worker_environments(args.workers, args.threads))]
+    try:
+        codes = [worker.wait() for worker in workers]
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+        codes = [worker.wait() for worker in workers]
+    sys.exit(max(codes, key=abs))
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,25 @@
 # utils/prepare_corpus.py
 
+import io
 import os
 import re
+import json
+import time
+import hashlib
+import tarfile
+import zipfile
+import argparse
+import itertools
 import urllib.request
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, TextIO, Tuple
 
 # === Paths ===
 input_dir  = Path("data/raw_books")
 output_file = Path("data/corpus.txt")
+cache_dir = Path("data/cleaned")
 
 # === List of (filename, URL) pairs ===
 books = [
@@ -24,6 +35,30 @@ books = [
     ("dracula.txt", "https://www.gutenberg.org/files/345/345-0.txt"),
 ]
 
+# Bump when the cleaning rules change, so cached cleaned books are redone.
+CLEANER_VERSION = 1
+
+START_MARKER = '*** START OF THE PROJECT GUTENBERG EBOOK'
+END_MARKER = '*** END OF THE PROJECT GUTENBERG EBOOK'
+
+JUNK_LINES = re.compile(r'^[\s\*\-_=]{3,}$', flags=re.MULTILINE)
+BLANK_LINES = re.compile(r'\n{3,}')
+
+# A character that no cleaning step removes.
+TEXT_CHAR = re.compile(r'[^\s\*\-_=Â]')
+
+UNICODE_FIXES = {
+    "â€”": "—",  # em dash
+    "â€“": "–",  # en dash
+    "â€˜": "‘",  # left single quote
+    "â€™": "’",  # right single quote
+    "â€œ": "“",  # left double quote
+    "â€�": "”", # right double quote
+    "â€¦": "…",  # ellipsis
+    "Â ": "",    # stray non-breaking space
+}
+UNICODE_PATTERN = re.compile("|".join(map(re.escape, UNICODE_FIXES)))
+
 def get_books(input_dir: Path, books: List[Tuple[str, str]]) -> None:
     """
     Downloads books from Project Gutenberg if they are not already present.
@@ -40,94 +75,309 @@ def get_books(input_dir: Path, books: List[Tuple[str, str]]) -> None:
         print("Done")
     print("Book downloads complete.")
 
-def clean_gutenberg_text(file_path: str) -> str:
+# === Sources: a directory or an archive of .txt books ===
+
+def list_books(source: Path) -> List[str]:
     """
-    Cleans up Project Gutenberg etexts for use from the given file.
-    
+    Names of the .txt books in a directory, .zip or tar archive, sorted.
+    """
+
+    if source.is_dir():
+        return sorted(path.name for path in source.glob("*.txt"))
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            return sorted(name for name in archive.namelist() if name.endswith(".txt"))
+    if tarfile.is_tarfile(source):
+        with tarfile.open(source) as archive:
+            return sorted(member.name for member in archive.getmembers() if member.isfile() and member.name.endswith(".txt"))
+    raise ValueError(f"{source} is not a directory, .zip or tar archive.")
+
+@contextmanager
+def open_book(source: Path, name: str) -> Iterator[io.BufferedIOBase]:
+    """
+    Open one book of a source (see list_books) as a binary stream.
+    """
+
+    if source.is_dir():
+        with open(source / name, "rb") as f:
+            yield f
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive, archive.open(name) as f:
+            yield f
+    else:
+        with tarfile.open(source) as archive, archive.extractfile(name) as f:
+            yield f
+
+@contextmanager
+def open_book_text(source: Path, name: str) -> Iterator[TextIO]:
+    """
+    Open one book as UTF-8 text, with universal newlines like open(..., 'r').
+    """
+
+    with open_book(source, name) as f:
+        yield io.TextIOWrapper(f, encoding="utf-8")
+
+def hash_book(source: Path, name: str) -> Tuple[str, int]:
+    """
+    SHA-256 of a book's bytes, and its size.
+    """
+
+    digest, size = hashlib.sha256(), 0
+    with open_book(source, name) as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+# === Cleaning, one block of lines at a time ===
+
+def fix_unicode(text: str) -> str:
+    """
+    Fix common Unicode artifacts from poorly encoded sources.
+
     Args:
-        file_path: the books location on the disk.
+        text: String to fix.
 
     Returns:
-        A cleaned text string.
+        Cleaned text with corrected Unicode characters.
     """
 
-    with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    # One pass over the text for all replacements.
+    return UNICODE_PATTERN.sub(lambda match: UNICODE_FIXES[match.group()], text)
+
+def find_body(lines: Iterable[str]) -> Tuple[int, int]:
+    """
+    Line range of the book between the Gutenberg START and END markers
+    (the whole file if they are missing).
+    """
 
-    start = 0
-    end = len(lines)
+    start, end = 0, None
     for i, line in enumerate(lines):
-        if '*** START OF THE PROJECT GUTENBERG EBOOK' in line:
+        if START_MARKER in line:
             start = i + 1
-        elif '*** END OF THE PROJECT GUTENBERG EBOOK' in line:
+        elif END_MARKER in line:
             end = i
             break
-    
-    text = ''.join(lines[start:end])
+    return start, end
+
+def safe_split(lines: List[str]) -> int:
+    """
+    Index to split `lines` at so no cleaning rule spans the cut, or 0.
+
+    The cut goes after a line with text, when the next line has text too,
+    or is empty with text after it: runs of separator lines and of newlines
+    can then not cross it. (Only 'Â ' is ever removed by fix_unicode, so
+    any other character counts as text.)
+    """
+
+    for i in range(len(lines) - 3, -1, -1):
+        if TEXT_CHAR.search(lines[i]) and (TEXT_CHAR.search(lines[i + 1])
+                                            or (lines[i + 1] == "\n" and TEXT_CHAR.search(lines[i + 2]))):
+            return i + 1
+    return 0
+
+def text_blocks(lines: Iterable[str], block_chars: int) -> Iterator[str]:
+    """
+    The text of `lines` in blocks of about `block_chars`, such that the
+    text is '\n'.join(blocks) and each block can be cleaned on its own.
+    """
+
+    pending, size = [], 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= block_chars:
+            split = safe_split(pending)
+            if split:
+                yield "".join(pending[:split])[:-1]  # The newline at the cut joins the blocks.
+                pending = pending[split:]
+                size = sum(map(len, pending))
+    yield "".join(pending)
+
+def clean_block(text: str) -> str:
+    """
+    Clean a block of text (everything but the final strip).
+    """
 
     # Fix any unicode artefacts.
     text = fix_unicode(text)
-    
+
     # Remove lines that are mostly special chars.
-    text = re.sub(r'^[\s\*\-_=]{3,}$', '', text, flags=re.MULTILINE)
+    text = JUNK_LINES.sub('', text)
 
     # Remove excessive newlines.
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    
-    # Remove any trailing whitespace
-    text = text.strip()
+    return BLANK_LINES.sub('\n\n', text)
 
-    return text
-	
-def fix_unicode(text: str) -> str:
+def strip_pieces(pieces: Iterable[str]) -> Iterator[str]:
     """
-    Fix common Unicode artifacts from poorly encoded sources.
-    
+    Join pieces with newlines, dropping leading and trailing whitespace of
+    the whole text. Whitespace is held back until text follows it.
+    """
+
+    held = None
+    for piece in pieces:
+        if held is None:
+            piece = piece.lstrip()
+            if not piece:
+                continue
+            held = ""
+        else:
+            held += "\n"
+        body = piece.rstrip()
+        if body:
+            yield held + body
+            held = piece[len(body):]
+        else:
+            held += piece
+
+def clean_book_lines(source: Path, name: str, block_chars: int = 1 << 20) -> Iterator[str]:
+    """
+    Stream the cleaned text of one book in pieces, holding about one block
+    in memory. The file is read twice: once to find the markers, then to clean.
+    """
+
+    with open_book_text(source, name) as f:
+        start, end = find_body(f)
+    with open_book_text(source, name) as f:
+        blocks = text_blocks(itertools.islice(f, start, end), block_chars)
+        yield from strip_pieces(clean_block(block) for block in blocks)
+
+def clean_gutenberg_text(file_path: str) -> str:
+    """
+    Cleans up Project Gutenberg etexts for use from the given file.
+
     Args:
-        text: String to fix.
-    
+        file_path: the books location on the disk.
+
     Returns:
-        Cleaned text with corrected Unicode characters.
+        A cleaned text string.
+    """
+
+    file_path = Path(file_path)
+    return ''.join(clean_book_lines(file_path.parent, file_path.name))
+
+def clean_book(source: Path, name: str, dest: Path) -> None:
+    """
+    Clean one book into `dest` (run in a worker process).
     """
-    replacements = {
-        "â€”": "—",  # em dash
-        "â€“": "–",  # en dash
-        "â€˜": "‘",  # left single quote
-        "â€™": "’",  # right single quote
-        "â€œ": "“",  # left double quote
-        "â€�": "”", # right double quote
-        "â€¦": "…",  # ellipsis
-        "Â ": "",    # stray non-breaking space
-    }
-    for wrong, right in replacements.items():
-        text = text.replace(wrong, right)
-    return text
-
-def merge_books(input_dir: Path, output_file: Path) -> None:
+
+    partial = dest.with_name(dest.name + ".partial")
+    with open(partial, "w", encoding="utf-8") as out:
+        out.writelines(clean_book_lines(source, name))
+    # A cache entry only appears once it is complete.
+    partial.replace(dest)
+
+# === Incremental corpus ===
+
+def cleaned_path(cache_dir: Path, digest: str) -> Path:
+    return cache_dir / f"{digest}.v{CLEANER_VERSION}.txt"
+
+def book_title(name: str) -> str:
+    return Path(name).stem.replace("_", " ").title()
+
+def manifest_path(output_file: Path) -> Path:
+    return output_file.with_name(output_file.name + ".manifest.json")
+
+def load_manifest(manifest_file: Path) -> Dict:
+    if manifest_file.exists():
+        return json.loads(manifest_file.read_text(encoding="utf-8"))
+    return {}
+
+def prune_cache(cache_dir: Path, manifest_file: Path) -> None:
+    """
+    Register `manifest_file` as a user of `cache_dir`, then drop cleaned books
+    that no registered corpus refers to any more.
+    """
+
+    registry_file = cache_dir / "corpora.json"
+    registry = json.loads(registry_file.read_text(encoding="utf-8")) if registry_file.exists() else []
+    registry = sorted({str(manifest_file.resolve())} | {path for path in registry if Path(path).exists()})
+    registry_file.write_text(json.dumps(registry, indent=2), encoding="utf-8")
+
+    keep = set()
+    for path in registry:
+        manifest = load_manifest(Path(path))
+        if manifest.get("cleaner_version") == CLEANER_VERSION:
+            keep.update(cleaned_path(cache_dir, digest).name for digest in manifest["books"].values())
+    for path in cache_dir.glob("*.txt"):
+        if path.name not in keep:
+            path.unlink()
+
+def merge_books(source: Path, output_file: Path, cache_dir: Path = cache_dir, workers: int = None) -> None:
     """
     Cleans and merges all book files into a single corpus file.
+
+    Books are cleaned in parallel, one per process, into a cache keyed by
+    their content hash. A manifest of those hashes is saved next to the
+    corpus (`<output>.manifest.json`), so a re-run only cleans new or changed
+    books and leaves the corpus untouched when nothing changed. Several
+    corpora can share one cache; a cleaned book is kept while any of their
+    manifests refers to it.
     """
 
+    book_names = list_books(source)
+    if not book_names:
+        print("No books found. Cannot merge nothing.")
+        return
+
     output_file.parent.mkdir(parents=True, exist_ok=True)
-    book_files = sorted(input_dir.glob("*.txt"))
+    cache_dir.mkdir(parents=True, exist_ok=True)
 
-    if not book_files:
-        print("No books found. Cannot merge nothing.")
+    hashes = {name: hash_book(source, name) for name in book_names}
+    manifest = {"cleaner_version": CLEANER_VERSION, "books": {name: digest for name, (digest, _) in hashes.items()}}
+    manifest_file = manifest_path(output_file)
+    todo = [name for name in book_names if not cleaned_path(cache_dir, hashes[name][0]).exists()]
+
+    if not todo and load_manifest(manifest_file) == manifest and output_file.exists():
+        print(f"All {len(book_names)} books unchanged; {output_file} is up to date.")
         return
-			
-    with open(output_file, "w", encoding="utf-8") as out:
-    	for book_file in book_files:
-            title = book_file.stem.replace("_", " ").title()
-            print(f"   Processing: {title}")
-            cleaned_text = clean_gutenberg_text(book_file)
-            out.write(f"   [TITLE: {title}]\n")
-            out.write(cleaned_text + "\n\n")
-    print(f"Books cleaned and merged into {output_file}")
-							
+
+    # === Clean new and changed books in parallel ===
+    if todo:
+        workers = min(workers or os.cpu_count() or 1, len(todo))
+        total_bytes = sum(hashes[name][1] for name in todo)
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            jobs = {pool.submit(clean_book, source, name, cleaned_path(cache_dir, hashes[name][0])): name for name in todo}
+            for job in as_completed(jobs):
+                job.result()
+                print(f"   Processed: {book_title(jobs[job])}")
+        seconds = time.perf_counter() - start
+        print(f"Cleaned {len(todo)} books ({total_bytes / 1e6:.1f} MB) in {seconds:.2f}s with {workers} workers: "
+              f"{total_bytes / 1e6 / seconds:.1f} MB/s. {len(book_names) - len(todo)} unchanged books reused.")
+
+    # === Concatenate the cleaned books in order ===
+    start = time.perf_counter()
+    partial = output_file.with_name(output_file.name + ".partial")
+    with open(partial, "w", encoding="utf-8") as out:
+        for name in book_names:
+            out.write(f"   [TITLE: {book_title(name)}]\n")
+            with open(cleaned_path(cache_dir, hashes[name][0]), "r", encoding="utf-8") as cleaned:
+                while block := cleaned.read(1 << 20):
+                    out.write(block)
+            out.write("\n\n")
+    partial.replace(output_file)
+    size = output_file.stat().st_size
+    print(f"Books cleaned and merged into {output_file} ({size / 1e6:.1f} MB, "
+          f"{size / 1e6 / (time.perf_counter() - start):.1f} MB/s)")
+
+    manifest_file.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    prune_cache(cache_dir, manifest_file)
+
 def main():
+    parser = argparse.ArgumentParser(description="Clean books into one training corpus, only redoing changed books.")
+    parser.add_argument("--source", type=Path, default=None,
+                        help="Directory, .zip or tar archive of .txt books (default: download into data/raw_books).")
+    parser.add_argument("--output", type=Path, default=output_file)
+    parser.add_argument("--workers", type=int, default=None, help="Processes cleaning books (default: one per core).")
+    args = parser.parse_args()
+
     print("Preparing corpus...")
-    get_books(input_dir, books)
-    merge_books(input_dir, output_file)
+    source = args.source
+    if source is None:
+        get_books(input_dir, books)
+        source = input_dir
+    merge_books(source, args.output, cache_dir, args.workers)
 
 if __name__ == "__main__":
     main()
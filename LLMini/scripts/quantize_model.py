@@ -0,0 +1,91 @@
+# scripts/quantize_model.py
+
+import sys
+import time
+import argparse
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from tokenizer.tokenization import BPETokenizer
+from inference.decoding import compile_decoder, load_model
+from inference.quantization import QuantizedModel, calibration_steps, calibration_windows, quantize_model
+from utils.config import *
+
+def evaluate(quantized, windows, prompts, max_tokens):
+    """ Perplexity over `windows` and greedy tokens/sec over `prompts`. """
+    log_likelihood, count = 0.0, 0
+    for window in windows:
+        total, predictions = quantized.log_likelihood(window)
+        log_likelihood += total
+        count += predictions
+
+    quantized.generate(prompts[0], 2)  # Warm up the interpreter.
+    start, generated = time.perf_counter(), 0
+    for prompt in prompts:
+        generated += len(quantized.generate(prompt, max_tokens)) - len(prompt)
+    return float(np.exp(-log_likelihood / count)), generated / (time.perf_counter() - start)
+
+def compiled_speed(model, prompts, max_tokens):
+    """ Greedy tokens/sec of the float32 TensorFlow decoder that generate.py uses by default. """
+    decode = compile_decoder(model, MAX_SEQUENCE_LENGTH)
+    decode([prompts[0]], 2)  # Trace the graph.
+    start, generated = time.perf_counter(), 0
+    for prompt in prompts:
+        generated += len(decode([prompt], max_tokens)[0]) - len(prompt)
+    return generated / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize trained MiniGPT weights for CPU inference and report size, speed and perplexity.")
+    parser.add_argument("--mode", choices=("int8", "float16"), default="int8")
+    parser.add_argument("--weights", default=WEIGHTS_PATH)
+    parser.add_argument("--tokenizer", default="tokenizer.json")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="Text that calibration and evaluation windows are drawn from.")
+    parser.add_argument("--output", default=None, help="Defaults to QUANTIZED_MODEL_PATH for int8, else next to it.")
+    parser.add_argument("--calibration-windows", type=int, default=32)
+    parser.add_argument("--eval-windows", type=int, default=16)
+    parser.add_argument("--max-tokens", type=int, default=32, help="New tokens per prompt in the speed test.")
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    output = Path(args.output or (QUANTIZED_MODEL_PATH if args.mode == "int8" else
+                                  Path(QUANTIZED_MODEL_PATH).with_name(f"llmini_{args.mode}.tflite")))
+
+    # === Load Tokenizer, Model and Data ===
+    tokenizer = BPETokenizer()
+    tokenizer.load(args.tokenizer)
+    model = load_model(args.weights, MAX_SEQUENCE_LENGTH)
+
+    # Calibration and evaluation windows come from different offsets (different seeds).
+    calibration = calibration_windows(tokenizer, args.corpus, args.calibration_windows, MAX_SEQUENCE_LENGTH, seed=0)
+    windows = calibration_windows(tokenizer, args.corpus, args.eval_windows, MAX_SEQUENCE_LENGTH, seed=1)
+    prompts = [window[:MAX_SEQUENCE_LENGTH // 4] for window in windows[:4]]
+
+    # === Convert ===
+    baseline = quantize_model(model, MAX_SEQUENCE_LENGTH, "float32")
+    start = time.perf_counter()
+    quantized = quantize_model(model, MAX_SEQUENCE_LENGTH, args.mode,
+                               calibration=lambda: calibration_steps(model, calibration, MAX_SEQUENCE_LENGTH))
+    calibrated = f" ({len(calibration)} calibration windows from {args.corpus})" if args.mode == "int8" else ""
+    print(f"Converted to {args.mode} in {time.perf_counter() - start:.1f}s{calibrated}.")
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_bytes(quantized)
+    print(f"Quantized model saved to {output}\n")
+
+    # === Report against the float32 baseline (same runtime, so only the weights differ) ===
+    base_ppl, base_speed = evaluate(QuantizedModel(baseline, args.threads), windows, prompts, args.max_tokens)
+    ppl, speed = evaluate(QuantizedModel(quantized, args.threads), windows, prompts, args.max_tokens)
+    tf_speed = compiled_speed(model, prompts, args.max_tokens)
+
+    print(f"{'':<8} {'size':>9} {'tokens/s':>9} {'perplexity':>11}")
+    print(f"{'float32':<8} {len(baseline) / 2**20:7.1f}MB {base_speed:9.1f} {base_ppl:11.2f}")
+    print(f"{args.mode:<8} {len(quantized) / 2**20:7.1f}MB {speed:9.1f} {ppl:11.2f}")
+    print(f"\n{len(baseline) / len(quantized):.1f}x smaller, {speed / base_speed:.2f}x tokens/s, "
+          f"perplexity {ppl - base_ppl:+.2f} ({(ppl / base_ppl - 1) * 100:+.1f}%) vs float32 "
+          f"({sum(len(window) - 1 for window in windows)} predictions).")
+    print(f"For reference, the compiled float32 TensorFlow decoder runs at {tf_speed:.1f} tokens/s "
+          f"({speed / tf_speed:.2f}x for {args.mode}).")
+
+if __name__ == "__main__":
+    main()
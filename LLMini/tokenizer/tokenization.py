@@ -1,6 +1,7 @@
 # tokenizer/tokenization.py
 from tokenizers import Tokenizer, models, trainers, pre_tokenizers, normalizers
 from pathlib import Path
+import hashlib
 
 class BPETokenizer:
     def __init__(self, vocab_size = 8192):
@@ -58,6 +59,28 @@ class BPETokenizer:
         Decode a list of token IDs back into text.
         """
         return self.tokenizer.decode(ids)
+
+    def encode_batch(self, texts):
+        """
+        Encode a list of strings into lists of token IDs, spread over the
+        tokenizer's threads (one per core).
+        """
+        # The fast variant skips character offsets, which are never used here.
+        encode = getattr(self.tokenizer, "encode_batch_fast", self.tokenizer.encode_batch)
+        return [encoding.ids for encoding in encode(texts)]
+
+    def decode_batch(self, batch_ids):
+        """
+        Decode lists of token IDs back into texts, spread over the tokenizer's threads.
+        """
+        return self.tokenizer.decode_batch(batch_ids)
+
+    def fingerprint(self):
+        """
+        SHA-256 of the serialized tokenizer: the same vocabulary, merges and
+        settings always give the same hash.
+        """
+        return hashlib.sha256(self.tokenizer.to_str().encode("utf-8")).hexdigest()
     
     def get_vocab_size(self):
         return self.tokenizer.get_vocab_size()
@@ -0,0 +1,202 @@
+# training/data.py
+
+import os
+import sys
+import json
+import mmap
+import shutil
+import hashlib
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import tensorflow as tf
+from utils.config import *
+
+# Token ids are stored as uint16, so the vocabulary must fit in 16 bits.
+TOKEN_DTYPE = np.uint16
+
+# A line starting a new book in corpus.txt (written by scripts/prepare_corpus.py).
+DOCUMENT_MARKER = "   [TITLE: "
+
+def file_hash(path):
+    """ SHA-256 of a file's bytes, read in blocks. """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def corpus_documents(corpus_path = CORPUS_PATH, max_chars = 1 << 20):
+    """
+    Read a corpus in document-sized pieces that join back into the whole file.
+
+    A piece starts at every title line, and long documents are cut at line
+    ends every `max_chars`. A piece's boundaries only depend on its own
+    document, so editing one book leaves every other piece unchanged.
+    """
+
+    piece, size = [], 0
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if piece and (line.startswith(DOCUMENT_MARKER) or size >= max_chars):
+                yield "".join(piece)
+                piece, size = [], 0
+            piece.append(line)
+            size += len(line)
+    if piece:
+        yield "".join(piece)
+
+def encode_document(tokenizer, text, group_chars = 1 << 16):
+    """
+    Token ids of `text`, encoded as a batch of line groups so the
+    tokenizer's threads share the work. The tokenizer splits on whitespace,
+    so cutting at line ends gives the same ids as encoding the whole text.
+    """
+
+    groups, group, size = [], [], 0
+    for line in text.split("\n"):
+        group.append(line)
+        size += len(line)
+        if size >= group_chars:
+            groups.append("\n".join(group))
+            group, size = [], 0
+    groups.append("\n".join(group))
+    return np.fromiter((i for ids in tokenizer.encode_batch(groups) for i in ids), dtype=TOKEN_DTYPE)
+
+def token_file_key(tokenizer, corpus_path = CORPUS_PATH):
+    """ What a token file was built from: the tokenizer's and the corpus's hashes. """
+    return {"tokenizer": tokenizer.fingerprint(), "corpus": file_hash(corpus_path)}
+
+def tokenize_corpus(tokenizer, corpus_path = CORPUS_PATH, tokens_path = TOKENS_PATH, shards_dir = TOKEN_SHARDS_DIR,
+                    document_chars = 1 << 20):
+    """
+    Tokenize a text file into a flat uint16 token file, through a cache of
+    token shards.
+
+    The corpus is read one document at a time (see corpus_documents), so
+    memory stays at one document no matter how large the corpus is. Each
+    document becomes a shard named by the hash of its text, in a directory
+    named by the tokenizer's hash; documents that already have a shard are
+    not tokenized again. The shards are then joined into `tokens_path`, and
+    token_file_key is saved next to it (see tokens_are_stale).
+
+    Args:
+        tokenizer: a trained BPETokenizer.
+        corpus_path: the text file to tokenize.
+        tokens_path: where to write the token ids.
+        shards_dir: where token shards are cached.
+        document_chars: longest piece of a document tokenized at once.
+
+    Returns:
+        (tokens written, documents tokenized, documents reused from the cache).
+    """
+
+    if tokenizer.get_vocab_size() > np.iinfo(TOKEN_DTYPE).max + 1:
+        raise ValueError(f"Vocabulary of {tokenizer.get_vocab_size()} does not fit in {np.dtype(TOKEN_DTYPE).name}.")
+
+    tokens_path = Path(tokens_path)
+    tokens_path.parent.mkdir(parents=True, exist_ok=True)
+    shards_dir = Path(shards_dir) / tokenizer.fingerprint()[:16]
+    shards_dir.mkdir(parents=True, exist_ok=True)
+    # Per process, so workers preparing the same files at once do not collide.
+    suffix = f".{os.getpid()}.partial"
+
+    key = token_file_key(tokenizer, corpus_path)
+    shards, tokenized = [], 0
+    for text in corpus_documents(corpus_path, document_chars):
+        shard = shards_dir / f"{hashlib.sha256(text.encode('utf-8')).hexdigest()}.tokens"
+        if not shard.exists():
+            partial = shard.with_name(shard.name + suffix)
+            encode_document(tokenizer, text).tofile(partial)
+            partial.replace(shard)
+            tokenized += 1
+        shards.append(shard)
+
+    partial = tokens_path.with_name(tokens_path.name + suffix)
+    with open(partial, "wb") as out:
+        for shard in shards:
+            with open(shard, "rb") as f:
+                shutil.copyfileobj(f, out)
+    count = partial.stat().st_size // np.dtype(TOKEN_DTYPE).itemsize
+
+    # Only replace the old file once the new one is complete, and record what it was built from last.
+    partial.replace(tokens_path)
+    info = tokens_path.with_name(tokens_path.name + ".json")
+    info_partial = info.with_name(info.name + suffix)
+    info_partial.write_text(json.dumps(dict(key, tokens=count)), encoding="utf-8")
+    info_partial.replace(info)
+    return count, tokenized, len(shards) - tokenized
+
+def tokens_are_stale(tokenizer, corpus_path = CORPUS_PATH, tokens_path = TOKENS_PATH):
+    """ True unless the token file was built from this exact corpus with this exact tokenizer. """
+    info = Path(tokens_path).with_name(Path(tokens_path).name + ".json")
+    if not Path(tokens_path).exists() or not info.exists():
+        return True
+    built_from = json.loads(info.read_text(encoding="utf-8"))
+    return {name: built_from.get(name) for name in ("tokenizer", "corpus")} != token_file_key(tokenizer, corpus_path)
+
+def load_tokens(tokens_path = TOKENS_PATH):
+    """ Memory-map a token file; pages are read from disk only when sliced. """
+    with open(tokens_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # Windows are read at random offsets, so skip the kernel's read-ahead.
+    if hasattr(mapped, "madvise") and hasattr(mmap, "MADV_RANDOM"):
+        mapped.madvise(mmap.MADV_RANDOM)
+    return np.frombuffer(mapped, dtype=TOKEN_DTYPE)
+
+def window_dataset(tokens_path = TOKENS_PATH, context_size = CONTEXT_SIZE, batch_size = BATCH_SIZE, seed = None, start_batch = 0,
+                   shard = (0, 1)):
+    """
+    Build an endless tf.data pipeline of (input, target) windows.
+
+    Each batch draws `batch_size` random offsets and slices the windows
+    straight out of the memory-mapped token file; targets are the inputs
+    shifted by one token. Nothing is materialized up front, so memory does
+    not grow with the corpus.
+
+    Batch i's offsets depend only on (seed, i), so a resumed run that
+    passes the same seed and start_batch sees exactly the batches the
+    interrupted run would have seen next.
+
+    Args:
+        tokens_path: a file written by tokenize_corpus.
+        context_size: tokens per training window.
+        batch_size: windows per batch.
+        seed: seed for the offsets (None for a different order each run).
+        start_batch: index of the first batch to produce.
+        shard: (index, count) to produce only every count-th batch of the
+            stream, starting at `index` (one shard per data-parallel worker).
+
+    Returns:
+        (dataset, steps_per_epoch): steps_per_epoch covers about as many
+        windows as there are offsets in the file.
+    """
+
+    tokens = load_tokens(tokens_path)
+    num_windows = len(tokens) - context_size
+    if num_windows <= 0:
+        raise ValueError(f"{tokens_path} holds {len(tokens)} tokens, fewer than one window of {context_size + 1}.")
+    if seed is None:
+        seed = int(np.random.default_rng().integers(2**31))
+
+    span = np.arange(context_size + 1)
+
+    def read_windows(offsets):
+        windows = tokens[offsets[:, np.newaxis] + span].astype(np.int32)
+        return windows[:, :-1], windows[:, 1:]
+
+    def slice_batch(index):
+        offsets = tf.random.stateless_uniform((batch_size,), seed=tf.stack([tf.constant(seed, tf.int64), index]),
+                                              minval=0, maxval=num_windows, dtype=tf.int64)
+        x, y = tf.numpy_function(read_windows, [offsets], (tf.int32, tf.int32))
+        x.set_shape((batch_size, context_size))
+        y.set_shape((batch_size, context_size))
+        return x, y
+
+    index, count = shard
+    dataset = tf.data.Dataset.counter(start_batch * count + index, step=count)
+    dataset = dataset.map(slice_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.prefetch(tf.data.AUTOTUNE)
+
+    return dataset, max(1, num_windows // batch_size)
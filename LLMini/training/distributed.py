@@ -0,0 +1,72 @@
+# training/distributed.py
+
+import os
+import sys
+import json
+import socket
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import tensorflow as tf
+from utils.config import *
+
+DISTRIBUTIONS = (None, "mirrored", "multi_worker")
+
+def make_strategy(distribution = DISTRIBUTION, replicas = CPU_REPLICAS):
+    """
+    Create the tf.distribute strategy for training; call before any other
+    TensorFlow work (devices and collectives are fixed once TF starts).
+
+    Args:
+        distribution: None (one device), "mirrored" (one process, one
+            replica per GPU, or `replicas` logical CPU devices on CPU-only
+            hosts) or "multi_worker" (one replica per process, cluster from
+            the TF_CONFIG environment variable; see worker_tf_config).
+        replicas: logical CPU devices for "mirrored" without GPUs.
+    """
+
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution {distribution!r}; expected one of {DISTRIBUTIONS}.")
+
+    if distribution == "multi_worker":
+        return tf.distribute.MultiWorkerMirroredStrategy()
+
+    if distribution == "mirrored":
+        if tf.config.list_physical_devices("GPU"):
+            return tf.distribute.MirroredStrategy()
+        cpu = tf.config.list_physical_devices("CPU")[0]
+        tf.config.set_logical_device_configuration(cpu, [tf.config.LogicalDeviceConfiguration()] * replicas)
+        return tf.distribute.MirroredStrategy([device.name for device in tf.config.list_logical_devices("CPU")])
+
+    return tf.distribute.get_strategy()
+
+def free_ports(count):
+    """ `count` TCP ports that are free on localhost right now. """
+    sockets = [socket.socket() for _ in range(count)]
+    for sock in sockets:
+        sock.bind(("localhost", 0))
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+def worker_tf_config(ports, index):
+    """ TF_CONFIG for worker `index` of a cluster of localhost workers on `ports`. """
+    return json.dumps({
+        "cluster": {"worker": [f"localhost:{port}" for port in ports]},
+        "task": {"type": "worker", "index": index},
+    })
+
+def worker_environments(workers, threads = None):
+    """
+    Environment variables for `workers` training processes on this host.
+
+    Each gets its own TF_CONFIG and an equal share of the cores for its
+    op thread pool, so the processes do not oversubscribe the CPU.
+    """
+
+    ports = free_ports(workers)
+    threads = threads or max(1, (os.cpu_count() or 1) // workers)
+    return [dict(os.environ, TF_CONFIG=worker_tf_config(ports, index),
+                 TF_NUM_INTRAOP_THREADS=str(threads), TF_NUM_INTEROP_THREADS="2")
+            for index in range(workers)]
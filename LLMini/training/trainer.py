@@ -0,0 +1,221 @@
+# training/trainer.py
+
+import sys
+import time
+import shutil
+import tempfile
+from pathlib import Path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import tensorflow as tf
+from training.data import load_tokens, window_dataset
+from utils.config import *
+
+def set_precision(policy = MIXED_PRECISION):
+    """
+    Set the Keras precision policy; call before building the model.
+
+    Args:
+        policy: None (float32), "mixed_float16" or "mixed_bfloat16".
+    """
+
+    tf.keras.mixed_precision.set_global_policy(policy or "float32")
+
+def make_optimizer(learning_rate = 1e-3, policy = MIXED_PRECISION):
+    """ Adam, with dynamic loss scaling when float16 gradients could underflow. """
+    optimizer = tf.keras.optimizers.Adam(learning_rate)
+    if policy == "mixed_float16":
+        optimizer = tf.keras.optimizers.LossScaleOptimizer(optimizer)
+    return optimizer
+
+def make_train_step(model, optimizer, accum_steps = GRAD_ACCUM_STEPS, jit_compile = TRAIN_JIT_COMPILE, step = None,
+                    strategy = None):
+    """
+    Build the compiled training step: one optimizer update per call.
+
+    The step takes `accum_steps` micro-batches, (accum_steps, batch, context)
+    for inputs and targets, sums their gradients inside the graph and
+    applies them once, so the effective batch grows without the memory of
+    a larger batch.
+
+    Under a tf.distribute strategy every replica runs the step on its own
+    slice of the batch. Losses are averaged over the global batch (all
+    replicas and micro-batches), so the replicas' gradients, summed by the
+    optimizer's all-reduce, are the gradient of the global mean loss.
+
+    Args:
+        model: a MiniGPT model (created under strategy.scope()).
+        optimizer: from make_optimizer (created under strategy.scope()).
+        accum_steps: micro-batches per update.
+        jit_compile: compile the forward/backward pass with XLA.
+        step: optional int64 variable counted up inside the step, so it
+            always matches the weights (unlike optimizer.iterations, which
+            skips updates that loss scaling drops).
+        strategy: the tf.distribute strategy (None for the default one).
+
+    Returns:
+        train_step(x, y) -> (mean loss, mean token accuracy) over the global batch.
+    """
+
+    strategy = strategy or tf.distribute.get_strategy()
+    loss_fn = tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True, reduction="none")
+
+    def gradients(x, y, global_batch):
+        with tf.GradientTape() as tape:
+            # Logits are cast up so the softmax and loss stay in float32 under mixed precision.
+            logits = tf.cast(model(x, training=True), tf.float32)
+            loss = tf.nn.compute_average_loss(tf.reduce_mean(loss_fn(y, logits), axis=-1), global_batch_size=global_batch)
+            scaled_loss = optimizer.scale_loss(loss)
+        # Embedding gradients come back sparse; make them dense so they can be summed.
+        grads = [tf.convert_to_tensor(grad) for grad in tape.gradient(scaled_loss, model.trainable_variables)]
+        hits = tf.reduce_mean(tf.cast(tf.equal(tf.argmax(logits, axis=-1, output_type=tf.int32), y), tf.float32), axis=-1)
+        return loss, tf.nn.compute_average_loss(hits, global_batch_size=global_batch), grads
+
+    @tf.function(jit_compile=jit_compile)
+    def accumulate(x, y):
+        global_batch = x.shape[1] * strategy.num_replicas_in_sync * accum_steps
+        loss, accuracy, grads = gradients(x[0], y[0], global_batch)
+        for i in tf.range(1, accum_steps):
+            micro_loss, micro_accuracy, micro_grads = gradients(x[i], y[i], global_batch)
+            loss += micro_loss
+            accuracy += micro_accuracy
+            grads = [grad + micro_grad for grad, micro_grad in zip(grads, micro_grads)]
+        return loss, accuracy, grads
+
+    def replica_step(x, y):
+        loss, accuracy, grads = accumulate(x, y)
+        # Gradients are all-reduced across replicas here; loss scaling (if any) is undone too.
+        optimizer.apply_gradients(zip(grads, model.trainable_variables))
+        if step is not None:
+            step.assign_add(1)
+        return loss, accuracy
+
+    @tf.function
+    def train_step(x, y):
+        loss, accuracy = strategy.run(replica_step, args=(x, y))
+        return strategy.reduce("SUM", loss, axis=None), strategy.reduce("SUM", accuracy, axis=None)
+
+    return train_step
+
+def distributed_batches(strategy, tokens_path, context_size, batch_size, accum_steps, seed, start_step = 0):
+    """
+    Per-replica batches for `strategy`, starting at optimizer step `start_step`.
+
+    Every input pipeline (one per worker) reads its own shard of the batch
+    stream, at the per-replica batch size, grouped into (accum_steps, batch,
+    context) elements; each replica takes one element per step.
+
+    Args:
+        batch_size: global windows per micro-batch, split over the replicas.
+        (others as for train)
+    """
+
+    def dataset_fn(input_context):
+        per_replica = input_context.get_per_replica_batch_size(batch_size)
+        local_replicas = input_context.num_replicas_in_sync // input_context.num_input_pipelines
+        dataset, _ = window_dataset(tokens_path, context_size, per_replica, seed=seed,
+                                    start_batch=start_step * accum_steps * local_replicas,
+                                    shard=(input_context.input_pipeline_id, input_context.num_input_pipelines))
+        return dataset.batch(accum_steps, drop_remainder=True)
+
+    return strategy.distribute_datasets_from_function(dataset_fn)
+
+def train(model, optimizer, tokens_path = TOKENS_PATH, epochs = EPOCHS, batch_size = BATCH_SIZE,
+          accum_steps = GRAD_ACCUM_STEPS, checkpoint_dir = CHECKPOINT_DIR, checkpoint_every = CHECKPOINT_EVERY,
+          log_every = LOG_EVERY, jit_compile = TRAIN_JIT_COMPILE, seed = None, strategy = None):
+    """
+    Train with the custom step, resuming from the latest checkpoint if any.
+
+    Checkpoints hold the model, the optimizer (including its slots), the
+    step and the data seed. Batches are a pure function of (seed, index),
+    so a resumed run with the same replica count continues with exactly the
+    batches the interrupted run would have seen next.
+
+    Args:
+        model: a MiniGPT model (created under strategy.scope()).
+        optimizer: from make_optimizer (created under strategy.scope()).
+        tokens_path: token file from training/data.tokenize_corpus.
+        epochs: passes over the data (an epoch is about one window per token offset).
+        batch_size: global windows per micro-batch (divisible by the replica count).
+        accum_steps: micro-batches per optimizer update.
+        checkpoint_dir: where checkpoints are written and resumed from.
+        checkpoint_every: optimizer steps between checkpoints.
+        log_every: optimizer steps between log lines.
+        jit_compile: compile the step with XLA.
+        seed: data order seed for a fresh run (None picks one; a resumed run keeps its own).
+        strategy: the tf.distribute strategy (None for the default one).
+
+    Returns:
+        The number of optimizer steps completed.
+    """
+
+    strategy = strategy or tf.distribute.get_strategy()
+    # Only the chief writes checkpoints and logs; other workers save to scratch space.
+    chief = strategy.extended.should_checkpoint
+    context_size = model.context_size
+
+    with strategy.scope():
+        step = tf.Variable(0, dtype=tf.int64, trainable=False, aggregation=tf.VariableAggregation.ONLY_FIRST_REPLICA)
+        data_seed = tf.Variable(np.random.default_rng().integers(2**31) if seed is None else seed, dtype=tf.int64,
+                                trainable=False, aggregation=tf.VariableAggregation.ONLY_FIRST_REPLICA)
+
+        # Create the weights and optimizer slots up front so a checkpoint restores into them, not lazily.
+        model(tf.zeros((1, context_size), dtype=tf.int32))
+        optimizer.build(model.trainable_variables)
+
+    # Dropout's RNG state is not tracked through the model, so list the non-trainable variables too.
+    checkpoint = tf.train.Checkpoint(model=model, model_state=list(model.non_trainable_variables),
+                                     optimizer=optimizer, step=step, data_seed=data_seed)
+    write_dir = checkpoint_dir if chief else tempfile.mkdtemp()
+    manager = tf.train.CheckpointManager(checkpoint, write_dir, max_to_keep=CHECKPOINTS_TO_KEEP if chief else 1,
+                                         step_counter=step)
+    latest = tf.train.latest_checkpoint(checkpoint_dir)
+    if latest:
+        checkpoint.restore(latest).assert_existing_objects_matched()
+        if chief:
+            print(f"Resumed from {latest} at step {step.numpy()}.")
+
+    batches = iter(distributed_batches(strategy, tokens_path, context_size, batch_size, accum_steps,
+                                       int(data_seed.numpy()), start_step=int(step.numpy())))
+    steps_per_epoch = max(1, (len(load_tokens(tokens_path)) - context_size) // (batch_size * accum_steps))
+    total_steps = epochs * steps_per_epoch
+    tokens_per_step = accum_steps * batch_size * context_size
+    if chief:
+        print(f"{total_steps:,} steps ({epochs} epochs of {steps_per_epoch:,}), {accum_steps} x {batch_size} windows "
+              f"of {context_size} tokens per step over {strategy.num_replicas_in_sync} replica(s).")
+
+    train_step = make_train_step(model, optimizer, accum_steps, jit_compile, step, strategy)
+    # Counted in Python too, so the loop never waits on the device to read `step`.
+    current = saved_step = int(step.numpy())
+    interval_start, interval_steps = time.perf_counter(), 0
+    try:
+        while current < total_steps:
+            x, y = next(batches)
+            loss, accuracy = train_step(x, y)
+            current += 1
+            interval_steps += 1
+
+            if chief and (current % log_every == 0 or current == total_steps):
+                loss, accuracy = float(loss), float(accuracy)  # Waits for the step to finish.
+                elapsed = time.perf_counter() - interval_start
+                print(f"epoch {(current - 1) // steps_per_epoch + 1} step {current:,}/{total_steps:,}  "
+                      f"loss {loss:.4f}  accuracy {accuracy:.4f}  {elapsed / interval_steps * 1000:.0f} ms/step  "
+                      f"{tokens_per_step * interval_steps / elapsed:,.0f} tokens/s")
+                interval_start, interval_steps = time.perf_counter(), 0
+
+            if current % checkpoint_every == 0:
+                manager.save()
+                saved_step = current
+                if chief:
+                    print(f"Saved checkpoint {manager.latest_checkpoint}")
+    finally:
+        # Keep the progress made since the last periodic checkpoint, also on Ctrl+C or an error.
+        if int(step.numpy()) > saved_step:
+            manager.save()
+            if chief:
+                print(f"Saved checkpoint {manager.latest_checkpoint}")
+        if not chief:
+            shutil.rmtree(write_dir, ignore_errors=True)
+
+    return current
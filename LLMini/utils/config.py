@@ -32,6 +32,71 @@ BATCH_SIZE = 32
 # WHY?: Number of times the model sees all the training data.
 EPOCHS = 10
 
+# What: The cleaned text corpus written by scripts/prepare_corpus.py.
+# Why?: train.py tokenizes it once into TOKENS_PATH.
+CORPUS_PATH = "data/corpus.txt"
+
+# What: Flat uint16 file of the tokenized corpus.
+# Why?: Training memory-maps it and slices windows lazily, so memory stays flat as the corpus grows.
+TOKENS_PATH = "data/corpus.tokens"
+
+# What: Cache of tokenized corpus documents, one directory per tokenizer hash.
+# Why?: Documents whose text and tokenizer are unchanged are never tokenized again.
+TOKEN_SHARDS_DIR = "data/token_shards"
+
+# What: Micro-batches whose gradients are summed before each optimizer update.
+# Why?: Effective batch is BATCH_SIZE * GRAD_ACCUM_STEPS without holding it all in memory at once.
+GRAD_ACCUM_STEPS = 1
+
+# What: Keras precision policy for training: None, "mixed_float16" (GPU) or "mixed_bfloat16" (TPU/new CPUs).
+# Why?: Half-precision math is faster and lighter; weights stay float32 and float16 losses are scaled.
+MIXED_PRECISION = None
+
+# What: Compile the training step with XLA.
+# Why?: Fuses the forward, backward and update ops; pays a one-off compile at the first step.
+TRAIN_JIT_COMPILE = False
+
+# What: Where training checkpoints (model, optimizer, step and data order) are written.
+# Why?: train.py resumes from the latest one, so a crash only loses the steps since it.
+CHECKPOINT_DIR = "checkpoints/train"
+
+# What: Optimizer steps between checkpoints, and how many checkpoints to keep.
+# Why?: More often loses less work on a crash; each save costs a moment and disk space.
+CHECKPOINT_EVERY = 500
+CHECKPOINTS_TO_KEEP = 3
+
+# What: Optimizer steps between training log lines (loss, step time, tokens/sec).
+# Why?: Logging syncs with the device, so doing it every step would slow training.
+LOG_EVERY = 50
+
+# What: Data-parallel training: None (one device), "mirrored" (one process) or "multi_worker" (TF_CONFIG cluster).
+# Why?: Replicas each take a slice of every batch and average their gradients, using more cores/devices.
+DISTRIBUTION = None
+
+# What: Replicas (logical CPU devices) for "mirrored" training on hosts without GPUs.
+# Why?: Splits the CPU into devices that run replica steps side by side.
+CPU_REPLICAS = 2
+
 # What: Max number of tokens model can handle in input or generated sequence.
 # Why?: The longest sentence/chunk the model can understand at once.
 MAX_SEQUENCE_LENGTH = 64
+
+# What: Compile the generation loop with XLA.
+# Why?: Fuses each decode step into fewer kernels; pays a one-off compile per batch size.
+GENERATE_JIT_COMPILE = False
+
+# What: Most requests the inference server decodes together.
+# Why?: Bigger batches share each decode step; memory grows with the batch.
+SERVER_MAX_BATCH_SIZE = 16
+
+# What: How long (ms) the server waits for more requests before starting a batch.
+# Why?: Trades a little latency for fuller batches under concurrent load.
+SERVER_MAX_WAIT_MS = 10
+
+# What: Where train.py saves the model weights.
+# Why?: Generation and the inference server load them from here.
+WEIGHTS_PATH = "checkpoints/llmini.weights.h5"
+
+# What: Where scripts/quantize_model.py saves the int8 model for CPU inference.
+# Why?: generate_text(..., quantized=True) runs it instead of the float32 weights.
+QUANTIZED_MODEL_PATH = "checkpoints/llmini_int8.tflite"